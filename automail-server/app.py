@@ -2,44 +2,277 @@
 Automail AI Server - Flask Application
 Provides AI-powered email classification endpoints for the Automail Chrome extension
 """
+import json
 import time
 import logging
-from flask import Flask, request, jsonify
-from flask_cors import CORS
+import argparse
+import queue
+import threading
+from collections import deque
+from utils.startup import track_import, mark, get_startup_report
+with track_import('flask'):
+    from flask import Flask, Response, request, jsonify, stream_with_context
+    from flask_cors import CORS
 import os
 
-# Import utilities
-from config.config import get_config
-from utils.classifier import get_classifier
-from utils.security import require_api_key, validate_request_data, get_rate_limit_status
-from utils.logging_config import log_request_info, log_classification_result, log_model_status
+# Import utilities (the model backend is imported when the model is first loaded)
+with track_import('utils'):
+    from config.config import get_config
+    from utils.classifier import get_classifier
+    from utils.result_store import get_result_store, compute_content_hash
+    from utils.job_queue import get_job_queue, JobConflictError
+    from utils.autotune import AutoTuner
+    from utils.idle_policy import IdlePolicy
+    from utils.shadow import get_shadow_evaluator
+    from utils.corrections import get_correction_index, CORRECTION_MODEL_VERSION, ADAPTER_MODEL_VERSION
+    from utils.corrections_log import get_corrections_log
+    from utils.finetune import get_finetune_runner
+    from utils.sender_index import get_sender_index, SENDER_MODEL_VERSION
+    from utils.spam_filter import get_spam_prescreen, SPAM_FILTER_MODEL_VERSION
+    from utils.thread_state import get_thread_state, THREAD_MODEL_VERSION
+    from utils.link_domains import LINK_MODEL_VERSION
+    from utils.security import (
+        require_api_key, require_admin_key, validate_request_data, validate_email_object, get_rate_limit_status,
+        get_api_key_id, sanitize_input
+    )
+    from utils.logging_config import setup_logging, log_request_info, log_classification_result, log_model_status
 
 # Get configuration
 config = get_config()
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # Create Flask app
 app = Flask(__name__)
 app.config.from_object(config)
 
+# MAX_CONTENT_LENGTH bounds individual text fields (see sanitize_input);
+# whole request bodies get their own, larger limit so bulk jobs fit
+app.config['MAX_CONTENT_LENGTH'] = config.MAX_REQUEST_SIZE
+
 # Enable CORS for Chrome extension
 CORS(app, origins=config.CORS_ORIGINS)
 
 # Global classifier instance
 classifier = get_classifier()
 
+# Inference settings calibration
+autotuner = AutoTuner(classifier)
+
+# Releases the model after IDLE_UNLOAD_SECONDS without model traffic
+idle_policy = IdlePolicy(classifier)
+
+# Candidate model evaluation on sampled /classify traffic
+shadow = get_shadow_evaluator(classifier)
+
+# Nearest-neighbour lookup over /train corrections
+corrections = get_correction_index(classifier)
+
+# Durable log of every /train correction
+corrections_log = get_corrections_log()
+
+# Background fine-tuning jobs on the corrections log
+finetuner = get_finetune_runner(classifier)
+
+# Label distributions of known senders and domains
+senders = get_sender_index()
+
+# Bloom filters of known spam content and blocked sender domains
+spam_filter = get_spam_prescreen(classifier)
+
+# Last label of each email thread
+thread_state = get_thread_state(classifier)
+
+# Content type for streamed batch requests and responses
+NDJSON_MIMETYPE = 'application/x-ndjson'
+_STREAM_END = object()
+
+# Persistent result store for delta sync
+result_store = get_result_store()
+
+# Tiers that answer ahead of the model; /sync keeps their results until the serving model changes
+SHORT_CIRCUIT_MODEL_VERSIONS = {
+    CORRECTION_MODEL_VERSION, ADAPTER_MODEL_VERSION, SPAM_FILTER_MODEL_VERSION,
+    THREAD_MODEL_VERSION, SENDER_MODEL_VERSION, LINK_MODEL_VERSION
+}
+
 def initialize_model():
-    """Initialize AI model on startup"""
+    """
+    Initialize AI model on startup
+    Loads the model, applies tuned inference settings and warms it up
+    before readiness is reported
+    """
     try:
         log_model_status('loading')
         success = classifier.load_model()
         if success:
             log_model_status('loaded')
+            
+            # Reuse tuned settings for this machine type, calibrating if asked to
+            saved_tuning = autotuner.load()
+            if config.AUTOTUNE_ON_STARTUP:
+                autotuner.load_or_run()
+            elif saved_tuning:
+                autotuner.apply(saved_tuning['settings'])
+            
+            if config.WARMUP_ENABLED:
+                classifier.warm_up()
+            mark('model_ready')
+            idle_policy.start()
+            
+            if config.SHADOW_MODEL_VERSION:
+                shadow.start(config.SHADOW_MODEL_VERSION)
         else:
-            log_model_status('error', 'Failed to load model on startup')
+            log_model_status('error', 'Failed to load model - will use fallback')
     except Exception as e:
         log_model_status('error', str(e))
 
+def store_results(emails, results, api_key_id=None):
+    """
+    Remember results for emails that carry a message_id, count them in the
+    sender index for emails that carry a sender, and make them the state of
+    their thread for emails that carry a thread_id
+    Failures are logged and never affect the classification response
+    """
+    try:
+        if api_key_id is None:
+            api_key_id = get_api_key_id()
+        
+        if config.SENDER_INDEX_ENABLED:
+            senders.update_from_results(api_key_id, emails, results)
+        if config.THREAD_STATE_ENABLED:
+            thread_state.update_from_results(api_key_id, emails, results)
+        
+        entries = []
+        serving_model = classifier.active_model_version
+        for email, result in zip(emails, results):
+            message_id = email.get('message_id')
+            if not isinstance(message_id, str) or not message_id:
+                continue
+            
+            content_hash = email.get('content_hash')
+            if not isinstance(content_hash, str) or not content_hash:
+                content_hash = compute_content_hash(email.get('content', ''), email.get('subject', ''))
+            
+            short_circuit = result.get('model_version') in SHORT_CIRCUIT_MODEL_VERSIONS
+            entries.append((message_id, content_hash, result, serving_model if short_circuit else None))
+        
+        result_store.put_many(api_key_id, entries)
+    except Exception as e:
+        logger.error(f"Failed to store classification results: {str(e)}")
+
+def corrected_results(emails, api_key_id=None):
+    """
+    Labels for emails that closely match a /train correction
+    
+    Returns:
+        One result per email, None where the model has to answer
+    """
+    if not config.KNN_CORRECTIONS_ENABLED:
+        return [None] * len(emails)
+    
+    try:
+        texts = [
+            classifier.preprocess_email_content(email.get('content', ''), email.get('subject', ''))
+            for email in emails
+        ]
+        return corrections.lookup(api_key_id or get_api_key_id(), texts)
+    except Exception as e:
+        logger.error(f"Correction lookup failed: {str(e)}")
+        return [None] * len(emails)
+
+def spam_results(emails, matches=None):
+    """
+    Spam labels for emails matching a confirmed spam fingerprint or a blocked sender
+    
+    Args:
+        matches: Results already found for the emails (kept as they are)
+        
+    Returns:
+        One result per email, None where the model has to answer
+    """
+    matches = list(matches) if matches is not None else [None] * len(emails)
+    pending = [i for i, match in enumerate(matches) if match is None]
+    if not config.SPAM_FILTER_ENABLED or not pending:
+        return matches
+    
+    try:
+        for i, result in zip(pending, spam_filter.check([emails[i] for i in pending])):
+            matches[i] = result
+    except Exception as e:
+        logger.error(f"Spam pre-screen failed: {str(e)}")
+    return matches
+
+def prescreen_results(emails, matches=None, api_key_id=None):
+    """Answers that need no model: known spam first, then known threads, then known senders"""
+    matches = thread_results(emails, spam_results(emails, matches), api_key_id)
+    return sender_results(emails, matches, api_key_id)
+
+def thread_results(emails, matches=None, api_key_id=None):
+    """
+    Labels for replies that continue a known thread without diverging from it
+    
+    Args:
+        matches: Results already found for the emails (kept as they are)
+        
+    Returns:
+        One result per email, None where the model has to answer
+    """
+    matches = list(matches) if matches is not None else [None] * len(emails)
+    pending = [i for i, match in enumerate(matches) if match is None and emails[i].get('thread_id')]
+    if not config.THREAD_STATE_ENABLED or not pending:
+        return matches
+    
+    try:
+        results = thread_state.check(api_key_id or get_api_key_id(), [emails[i] for i in pending])
+        for i, result in zip(pending, results):
+            matches[i] = result
+    except Exception as e:
+        logger.error(f"Thread state lookup failed: {str(e)}")
+    return matches
+
+def sender_results(emails, matches=None, api_key_id=None):
+    """
+    Labels for emails from senders that always get the same label
+    
+    Args:
+        matches: Results already found for the emails (kept as they are)
+        
+    Returns:
+        One result per email, None where the model has to answer
+    """
+    matches = list(matches) if matches is not None else [None] * len(emails)
+    if not config.SENDER_INDEX_ENABLED:
+        return matches
+    
+    try:
+        api_key_id = api_key_id or get_api_key_id()
+        return [
+            match or senders.lookup(api_key_id, email.get('sender'))
+            for email, match in zip(emails, matches)
+        ]
+    except Exception as e:
+        logger.error(f"Sender lookup failed: {str(e)}")
+        return matches
+
+def process_job_batch(api_key_id, emails):
+    """Classify one chunk of a bulk job through the batched inference path"""
+    matches = prescreen_results(emails, corrected_results(emails, api_key_id), api_key_id)
+    model_emails = [email for email, match in zip(emails, matches) if match is None]
+    model_results = iter([])
+    if model_emails:
+        # Bulk jobs wait for a model that is still loading instead of taking the rule-based fast path
+        classifier.load_model()
+        model_results = iter(classifier.batch_classify(model_emails))
+    results = [match or next(model_results) for match in matches]
+    store_results(emails, results, api_key_id)
+    return results
+
+# Durable queue for bulk classification jobs
+job_queue = get_job_queue(process_job_batch)
+
+mark('app_imported')
+
 @app.before_request
 def before_request():
     """Log request information"""
@@ -61,6 +294,9 @@ def after_request(response):
         
         log_request_info(request, response_data, processing_time)
         
+        # Results carry their own model_version; the header names the active model
+        response.headers['X-Model-Version'] = classifier.active_model_version
+        
         # Add rate limit headers
         try:
             rate_limit_info = get_rate_limit_status()
@@ -89,7 +325,14 @@ def health_check():
             'server': 'Automail AI Server',
             'version': '1.0.0',
             'model_loaded': model_info['is_loaded'],
+            'ready': model_info['is_ready'],
             'model_info': model_info,
+            'startup': get_startup_report(),
+            'idle': idle_policy.get_status(),
+            'corrections': corrections.get_status(),
+            'senders': senders.get_status(),
+            'threads': thread_state.get_status(),
+            'spam_filter': spam_filter.get_status(),
             'timestamp': time.time()
         }), 200
         
@@ -101,6 +344,25 @@ def health_check():
             'timestamp': time.time()
         }), 500
 
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """
+    Readiness probe
+    Returns 503 until the model is loaded and warmed up
+    """
+    if not classifier.is_ready:
+        return jsonify({
+            'ready': False,
+            'model_loaded': classifier.is_loaded,
+            'timestamp': time.time()
+        }), 503
+    
+    return jsonify({
+        'ready': True,
+        'warmup': classifier.warmup_info,
+        'timestamp': time.time()
+    }), 200
+
 @app.route('/classify', methods=['POST'])
 @require_api_key
 @validate_request_data(['content'])
@@ -111,7 +373,11 @@ def classify_email():
     Expected JSON payload:
     {
         "content": "email body content",
-        "subject": "email subject (optional)"
+        "subject": "email subject (optional)",
+        "message_id": "Gmail message ID (optional, enables /sync)",
+        "content_hash": "client content hash (optional)",
+        "sender": "From header (optional, enables the sender index)",
+        "thread_id": "Gmail thread ID (optional, replies may reuse the thread's label)"
     }
     
     Returns:
@@ -131,14 +397,22 @@ def classify_email():
         
         logger.debug(f"Classifying email with content length: {len(content)}")
         
-        # Perform classification
-        result = classifier.classify_email(content, subject)
+        # A near-identical corrected email, known spam, a known thread or a known sender answers without the model
+        known = prescreen_results([data], corrected_results([data]))[0]
+        result = known or classifier.classify_email(content, subject)
         
         processing_time = time.time() - start_time
         
         # Log classification result
         log_classification_result(content, result, processing_time)
         
+        # Remember the answer so later scans can skip this message
+        store_results([data], [result])
+        
+        # Copy a sample of model answers to the candidate model, if one is being evaluated
+        if known is None:
+            shadow.submit(content, subject, result)
+        
         # Add metadata to response
         result['processing_time'] = round(processing_time, 3)
         result['timestamp'] = time.time()
@@ -158,15 +432,24 @@ def classify_email():
 
 @app.route('/batch-classify', methods=['POST'])
 @require_api_key
-@validate_request_data(['emails'])
 def batch_classify_emails():
     """
     Classify multiple emails in a single request
+    Requests sent as application/x-ndjson are streamed (see stream_batch_classify)
+    """
+    if request.mimetype == NDJSON_MIMETYPE:
+        return stream_batch_classify()
+    return batch_classify_json()
+
+@validate_request_data(['emails'])
+def batch_classify_json():
+    """
+    Classify a JSON array of emails
     
     Expected JSON payload:
     {
         "emails": [
-            {"content": "email 1 content", "subject": "email 1 subject"},
+            {"content": "email 1 content", "subject": "email 1 subject", "sender": "optional", "thread_id": "optional"},
             {"content": "email 2 content", "subject": "email 2 subject"}
         ]
     }
@@ -202,8 +485,13 @@ def batch_classify_emails():
         
         logger.debug(f"Batch classifying {len(emails)} emails")
         
-        # Perform batch classification
-        results = classifier.batch_classify(emails)
+        # Perform batch classification, skipping emails answered by corrections, spam filters, threads or known senders
+        matches = prescreen_results(emails, corrected_results(emails))
+        model_results = iter(classifier.batch_classify([
+            email for email, match in zip(emails, matches) if match is None
+        ]))
+        results = [match or next(model_results) for match in matches]
+        store_results(emails, results)
         
         processing_time = time.time() - start_time
         
@@ -225,6 +513,354 @@ def batch_classify_emails():
             'results': []
         }), 500
 
+def iter_ndjson_emails(stream):
+    """
+    Parse an NDJSON request body one line at a time
+    
+    Yields:
+        (index, email, error) tuples; email is None when the line is invalid
+    """
+    index = 0
+    for line in iter(stream.readline, b''):
+        line = line.strip()
+        if not line:
+            continue
+        
+        try:
+            email = json.loads(line)
+            error_message = validate_email_object(email, index + 1)
+        except ValueError:
+            email, error_message = None, f"Email {index + 1} is not valid JSON"
+        
+        if error_message:
+            yield index, None, error_message
+        else:
+            yield index, {
+                'content': sanitize_input(email['content']),
+                'subject': sanitize_input(email.get('subject', '')),
+                **{
+                    key: email[key] for key in ('message_id', 'content_hash', 'sender', 'thread_id')
+                    if isinstance(email.get(key), str)
+                }
+            }, None
+        index += 1
+
+def stream_batch_classify():
+    """
+    Classify an NDJSON stream of emails, writing each result as soon as it is ready
+    
+    Request body (application/x-ndjson), one email per line:
+        {"content": "email 1 content", "subject": "email 1 subject", "message_id": "optional", "sender": "optional",
+         "thread_id": "optional"}
+    
+    Response body (application/x-ndjson, chunked), one result per line in input order:
+        {"index": 0, "label": "Work", "confidence": 0.85, ...}
+    followed by a final {"done": true, "total_emails": N, "processing_time": ...} line.
+    
+    Corrections, known spam, threads and senders are answered while the
+    request is read, and a result is written as soon as it and every result
+    before it are ready. Emails that need the model go to the staged
+    inference pipeline as they are parsed; its first batches are small so
+    the first results come back quickly, later ones grow to the tuned
+    batch size. Reading pauses while too many emails wait for the model,
+    which bounds memory.
+    """
+    api_key_id = get_api_key_id()
+    stream = request.stream
+    
+    def generate():
+        start_time = time.time()
+        total = 0
+        order = deque()     # [index, email, error_message, result] per line, in input order
+        waiting = deque()   # entries of order whose result comes from the model
+        unstored = []
+        model = classifier.model_available()
+        batch_size = classifier.batch_size
+        # Enough to keep every pipeline stage busy; more than a batch, so the
+        # oldest waiting email is never in the partial batch the pipeline holds back
+        max_waiting = 4 * batch_size
+        to_model, from_model = queue.Queue(), queue.Queue()
+        stopped = threading.Event()
+        pump = None
+        
+        def model_inputs():
+            while True:
+                email = to_model.get()
+                if email is _STREAM_END:
+                    return
+                yield email
+        
+        def run_model():
+            results = None
+            try:
+                results = classifier.classify_stream(model_inputs(), batch_size, ramp_up=True)
+                for result in results:
+                    if stopped.is_set():
+                        break
+                    from_model.put(result)
+                from_model.put(_STREAM_END)
+            except Exception as e:
+                from_model.put(e)
+            finally:
+                if results is not None:
+                    results.close()
+        
+        def collect(max_left):
+            # Attach finished model results to their lines, one at a time,
+            # waiting only while more than max_left lines still need one
+            while waiting:
+                try:
+                    result = from_model.get(block=len(waiting) > max_left)
+                except queue.Empty:
+                    return
+                if isinstance(result, Exception):
+                    raise result
+                if result is _STREAM_END:
+                    raise RuntimeError("Model stream ended early")
+                waiting.popleft()[3] = result
+        
+        def emit(index, email, result):
+            nonlocal total, unstored
+            total += 1
+            line = {'index': index, **result}
+            if 'message_id' in email:
+                line['message_id'] = email['message_id']
+            
+            unstored.append((email, result))
+            if len(unstored) >= config.INFERENCE_BATCH_SIZE:
+                store_results(*zip(*unstored), api_key_id)
+                unstored = []
+            return json.dumps(line) + '\n'
+        
+        def drain_ready():
+            while order and (order[0][1] is None or order[0][3] is not None):
+                index, email, error_message, result = order.popleft()
+                if email is None:
+                    yield json.dumps({'index': index, 'error': 'Invalid email', 'message': error_message}) + '\n'
+                else:
+                    yield emit(index, email, result)
+        
+        try:
+            for index, email, error_message in iter_ndjson_emails(stream):
+                entry = [index, email, error_message, None]
+                order.append(entry)
+                if email is not None:
+                    entry[3] = prescreen_results([email], corrected_results([email], api_key_id), api_key_id)[0]
+                    if entry[3] is None and not model:
+                        entry[3] = classifier.rule_based_classification(email['content'], email['subject'])
+                    elif entry[3] is None:
+                        if pump is None:
+                            pump = threading.Thread(target=run_model, name='stream-model', daemon=True)
+                            pump.start()
+                        waiting.append(entry)
+                        to_model.put(email)
+                
+                collect(max_left=max_waiting - 1)
+                yield from drain_ready()
+            
+            to_model.put(_STREAM_END)
+            collect(max_left=0)
+            yield from drain_ready()
+            if unstored:
+                store_results(*zip(*unstored), api_key_id)
+            
+            processing_time = time.time() - start_time
+            logger.info(f"📧 Stream classified {total} emails in {processing_time:.3f}s")
+            
+            yield json.dumps({
+                'done': True,
+                'total_emails': total,
+                'processing_time': round(processing_time, 3),
+                'timestamp': time.time(),
+                'server_version': '1.0.0'
+            }) + '\n'
+            
+        except Exception as e:
+            # Headers are already sent, so report the failure in-band
+            logger.error(f"Streaming batch classification error: {str(e)}")
+            yield json.dumps({
+                'error': 'Batch classification failed',
+                'message': 'Unable to process email stream',
+                'done': True
+            }) + '\n'
+        
+        finally:
+            # Also reached when the client disconnects: stop feeding the model
+            stopped.set()
+            to_model.put(_STREAM_END)
+    
+    response = Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
+    response.headers['X-Accel-Buffering'] = 'no'  # Let proxies pass chunks through
+    return response
+
+@app.route('/jobs', methods=['POST'])
+@require_api_key
+@validate_request_data(['emails'])
+def submit_job():
+    """
+    Queue a bulk classification job
+    
+    Expected JSON payload (Idempotency-Key header or idempotency_key field optional):
+    {
+        "emails": [
+            {"content": "email 1 content", "subject": "email 1 subject", "message_id": "optional"}
+        ],
+        "idempotency_key": "client-generated-key"
+    }
+    
+    Returns 202 with the new job, or 200 with the existing job for a repeated key
+    """
+    try:
+        data = request.validated_data
+        emails = data['emails']
+        idempotency_key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+        
+        if idempotency_key is not None and not isinstance(idempotency_key, str):
+            return jsonify({
+                'error': 'Invalid idempotency key',
+                'message': 'idempotency_key must be a string'
+            }), 400
+        
+        if len(emails) > config.MAX_JOB_EMAILS:
+            return jsonify({
+                'error': 'Job size too large',
+                'message': f'Maximum {config.MAX_JOB_EMAILS} emails per job'
+            }), 400
+        
+        # Only keep the fields the workers need
+        items = []
+        for email in emails:
+            item = {
+                'content': sanitize_input(email['content']),
+                'subject': sanitize_input(email.get('subject', ''))
+            }
+            for key in ('message_id', 'content_hash', 'sender', 'thread_id'):
+                if isinstance(email.get(key), str):
+                    item[key] = email[key]
+            items.append(item)
+        
+        job, created = job_queue.submit(get_api_key_id(), items, idempotency_key)
+        job_queue.start()
+        
+        return jsonify(job), 202 if created else 200
+        
+    except JobConflictError as e:
+        return jsonify({
+            'error': 'Idempotency key conflict',
+            'message': str(e)
+        }), 409
+    except Exception as e:
+        logger.error(f"Job submission error: {str(e)}")
+        return jsonify({
+            'error': 'Job submission failed',
+            'message': 'Unable to queue classification job'
+        }), 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+@require_api_key
+def get_job_status(job_id):
+    """Get progress of a bulk classification job"""
+    job_queue.start()
+    job = job_queue.get_job(get_api_key_id(), job_id)
+    if job is None:
+        return jsonify({
+            'error': 'Job not found',
+            'message': f'No job with id {job_id}'
+        }), 404
+    
+    return jsonify(job), 200
+
+@app.route('/jobs/<job_id>/results', methods=['GET'])
+@require_api_key
+def get_job_results(job_id):
+    """
+    Get a page of job results in submission order
+    
+    Query parameters: offset (default 0), limit (default 100)
+    """
+    try:
+        offset = max(0, int(request.args.get('offset', 0)))
+        limit = min(config.MAX_JOB_RESULTS_PAGE, max(1, int(request.args.get('limit', 100))))
+    except ValueError:
+        return jsonify({
+            'error': 'Invalid pagination',
+            'message': 'offset and limit must be integers'
+        }), 400
+    
+    api_key_id = get_api_key_id()
+    results = job_queue.get_results(api_key_id, job_id, offset, limit)
+    if results is None:
+        return jsonify({
+            'error': 'Job not found',
+            'message': f'No job with id {job_id}'
+        }), 404
+    
+    job = job_queue.get_job(api_key_id, job_id)
+    next_offset = offset + len(results)
+    
+    return jsonify({
+        'job_id': job_id,
+        'status': job['status'],
+        'results': results,
+        'offset': offset,
+        'next_offset': next_offset if next_offset < job['total'] else None,
+        'total': job['total']
+    }), 200
+
+@app.route('/sync', methods=['POST'])
+@require_api_key
+@validate_request_data(['messages'])
+def sync_results():
+    """
+    Return stored results for known messages and list the ones that need classifying
+    
+    Expected JSON payload:
+    {
+        "messages": [
+            {"message_id": "18c2f...", "content_hash": "9f86d0..."}
+        ]
+    }
+    
+    Returns:
+    {
+        "results": [{"message_id": "18c2f...", "content_hash": "9f86d0...", "label": "Work", ...}],
+        "needs_classification": [{"message_id": "...", "content_hash": "..."}],
+        "model_version": "facebook/bart-large-mnli"
+    }
+    """
+    try:
+        start_time = time.time()
+        messages = request.validated_data['messages']
+        
+        if len(messages) > config.MAX_SYNC_MESSAGES:
+            return jsonify({
+                'error': 'Sync size too large',
+                'message': f'Maximum {config.MAX_SYNC_MESSAGES} messages per sync'
+            }), 400
+        
+        # Results from an older model are reported as needing classification
+        model_version = classifier.active_model_version
+        known, unknown = result_store.sync(get_api_key_id(), messages, model_version)
+        
+        processing_time = time.time() - start_time
+        logger.info(f"🔄 Synced {len(messages)} messages: {len(known)} known, {len(unknown)} to classify")
+        
+        return jsonify({
+            'results': known,
+            'needs_classification': unknown,
+            'model_version': model_version,
+            'processing_time': round(processing_time, 3),
+            'timestamp': time.time(),
+            'server_version': '1.0.0'
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Sync error: {str(e)}")
+        return jsonify({
+            'error': 'Sync failed',
+            'message': 'Unable to look up stored results'
+        }), 500
+
 @app.route('/compose', methods=['POST'])
 @require_api_key
 @validate_request_data(['prompt'])
@@ -338,34 +974,88 @@ Please let me know if you need any additional information."""
 @validate_request_data(['corrections'])
 def train_model():
     """
-    Accept training corrections (placeholder for future implementation)
+    Accept training corrections
+    Corrections that include the email content are embedded into the
+    caller's correction index (and the global one); later emails that
+    closely match one get its label without running the model. They are
+    also appended to the corrections log, which background fine-tuning
+    trains on every FINETUNE_MIN_CORRECTIONS corrections, count for
+    their sender in the sender index, and relabel their thread. While the
+    correction encoder is unavailable nothing is indexed and the response
+    reports corrections_indexed 0 with the encoder_status
     
     Expected JSON payload:
     {
         "corrections": [
-            {"email_id": "123", "correct_label": "Work", "original_label": "Personal"}
+            {"email_id": "123", "correct_label": "Work", "original_label": "Personal",
+             "content": "email body", "subject": "email subject", "sender": "optional", "thread_id": "optional"}
         ]
     }
     """
     try:
         data = request.validated_data
-        corrections = data['corrections']
+        corrections_data = data['corrections']
         
-        if not isinstance(corrections, list):
+        if not isinstance(corrections_data, list) or not all(isinstance(c, dict) for c in corrections_data):
             return jsonify({
                 'error': 'Invalid corrections format',
-                'message': 'corrections must be an array'
+                'message': 'corrections must be an array of objects'
             }), 400
         
-        logger.info(f"📚 Received {len(corrections)} training corrections")
+        logger.info(f"📚 Received {len(corrections_data)} training corrections")
+        
+        api_key_id = get_api_key_id()
+        corrections_data = [
+            {
+                **correction,
+                'content': sanitize_input(correction.get('content')),
+                'subject': sanitize_input(correction.get('subject'))
+            }
+            for correction in corrections_data
+        ]
+        
+        # Indexed first, so a failure here returns before anything is counted; an
+        # unavailable encoder only skips indexing, so retries do not count twice
+        indexed = {'indexed': 0, 'skipped': len(corrections_data)}
+        if config.KNN_CORRECTIONS_ENABLED:
+            try:
+                indexed = corrections.add(api_key_id, corrections_data)
+            except RuntimeError as e:
+                logger.error(f"Correction indexing skipped: {str(e)}")
+        
+        # Fine-tuning starts once enough corrections have been logged
+        logged = corrections_log.append(api_key_id, corrections_data)
+        finetune_job = finetuner.maybe_start() if config.FINETUNE_ENABLED else None
+        
+        # One correction says little about the rest of a domain, so only the address is updated
+        senders_updated = 0
+        if config.SENDER_INDEX_ENABLED:
+            senders_updated = sum(
+                senders.update(api_key_id, correction.get('sender'), correction.get('correct_label'),
+                               weight=config.SENDER_CORRECTION_WEIGHT, domain=False)
+                for correction in corrections_data
+            )
+        
+        # Later replies in a corrected thread get the corrected label
+        threads_updated = 0
+        if config.THREAD_STATE_ENABLED:
+            threads_updated = sum(
+                thread_state.update(api_key_id, correction, correction.get('correct_label'), 1.0)
+                for correction in corrections_data
+            )
         
-        # Placeholder implementation - in a real system, you'd retrain or fine-tune the model
         return jsonify({
             'status': 'success',
             'message': 'Training corrections received',
-            'corrections_processed': len(corrections),
-            'model_updated': False,  # Placeholder
-            'note': 'This is a placeholder implementation',
+            'corrections_processed': len(corrections_data),
+            'corrections_logged': logged,
+            'corrections_indexed': indexed['indexed'],
+            'corrections_skipped': indexed['skipped'],
+            'encoder_status': corrections.status if config.KNN_CORRECTIONS_ENABLED else 'disabled',
+            'senders_updated': senders_updated,
+            'threads_updated': threads_updated,
+            'model_updated': indexed['indexed'] > 0,
+            'finetune_job': finetune_job['job_id'] if finetune_job else None,
             'timestamp': time.time()
         }), 200
         
@@ -376,6 +1066,245 @@ def train_model():
             'message': 'Unable to process training corrections'
         }), 500
 
+@app.route('/admin/autotune', methods=['GET'])
+@require_admin_key
+def get_autotune_status():
+    """Get the current inference settings and the last calibration result"""
+    return jsonify({
+        **autotuner.get_status(),
+        'inference': classifier.get_model_info()['inference']
+    }), 200
+
+@app.route('/admin/autotune', methods=['POST'])
+@require_admin_key
+def run_autotune():
+    """
+    Start an inference calibration sweep in the background
+    The result replaces the persisted choice for this machine type
+    """
+    if not autotuner.run_in_background():
+        return jsonify({
+            'error': 'Autotune in progress',
+            'message': 'A calibration sweep is already running'
+        }), 409
+    
+    return jsonify({
+        'status': 'started',
+        'message': 'Calibration sweep running; poll GET /admin/autotune for the result'
+    }), 202
+
+@app.route('/admin/models', methods=['GET'])
+@require_admin_key
+def list_models():
+    """Get registered model versions, the activation history and swap progress"""
+    return jsonify({
+        'active_version': classifier.active_model_version,
+        'registry': classifier.registry.get_status(),
+        'swap': classifier.swap_status
+    }), 200
+
+@app.route('/admin/models', methods=['POST'])
+@require_admin_key
+def register_model():
+    """
+    Register a model version
+    
+    Expected JSON payload:
+    {
+        "version": "email-nli-2024-06",
+        "source": "/path/to/save_pretrained/dir or hub/model-id",
+        "metadata": {"notes": "optional"}
+    }
+    """
+    data = request.get_json(silent=True) or {}
+    version, source = data.get('version'), data.get('source')
+    if not isinstance(version, str) or not version or not isinstance(source, str) or not source:
+        return jsonify({
+            'error': 'Invalid model',
+            'message': 'version and source must be non-empty strings'
+        }), 400
+    
+    try:
+        manifest = classifier.registry.register(version, source, data.get('metadata'))
+    except ValueError as e:
+        return jsonify({
+            'error': 'Version exists',
+            'message': str(e)
+        }), 409
+    except OSError as e:
+        logger.error(f"Model registration error: {str(e)}")
+        return jsonify({
+            'error': 'Registration failed',
+            'message': 'Unable to copy the model into the registry'
+        }), 500
+    
+    return jsonify(manifest), 201
+
+@app.route('/admin/models/swap', methods=['POST'])
+@require_admin_key
+def swap_model():
+    """
+    Load and warm up a model version in the background, then swap it in
+    Requests in flight finish on the old model
+    
+    Expected JSON payload:
+    {"version": "email-nli-2024-06"}
+    """
+    data = request.get_json(silent=True) or {}
+    version = data.get('version')
+    if not isinstance(version, str) or not version:
+        return jsonify({
+            'error': 'Invalid version',
+            'message': 'version must be a non-empty string'
+        }), 400
+    
+    if not classifier.swap_in_background(version):
+        return jsonify({
+            'error': 'Swap in progress',
+            'message': 'A model swap is already running'
+        }), 409
+    
+    return jsonify({
+        'status': 'started',
+        'version': version,
+        'message': 'Swap running; poll GET /admin/models for progress'
+    }), 202
+
+@app.route('/admin/models/rollback', methods=['POST'])
+@require_admin_key
+def rollback_model():
+    """Swap back to the previously active model version"""
+    previous = classifier.registry.previous_version
+    if previous is None:
+        return jsonify({
+            'error': 'Nothing to roll back',
+            'message': 'No previous model version is recorded'
+        }), 400
+    
+    if not classifier.swap_in_background():
+        return jsonify({
+            'error': 'Swap in progress',
+            'message': 'A model swap is already running'
+        }), 409
+    
+    return jsonify({
+        'status': 'started',
+        'version': previous,
+        'message': 'Rollback running; poll GET /admin/models for progress'
+    }), 202
+
+@app.route('/admin/finetune', methods=['GET'])
+@require_admin_key
+def get_finetune_status():
+    """Get collected corrections and the progress of the latest fine-tuning job"""
+    return jsonify(finetuner.get_status()), 200
+
+@app.route('/admin/finetune', methods=['POST'])
+@require_admin_key
+def start_finetune():
+    """
+    Fine-tune the active model on all corrections collected so far
+    The result is registered as a new model version but not activated
+    """
+    try:
+        job = finetuner.start()
+    except RuntimeError as e:
+        return jsonify({
+            'error': 'Fine-tuning in progress',
+            'message': str(e)
+        }), 409
+    except ValueError as e:
+        return jsonify({
+            'error': 'Nothing to fine-tune',
+            'message': str(e)
+        }), 400
+    
+    return jsonify({
+        'status': 'started',
+        'job': job,
+        'message': 'Fine-tuning running; poll GET /admin/finetune for progress'
+    }), 202
+
+@app.route('/admin/spam-filter', methods=['GET'])
+@require_admin_key
+def get_spam_filter_status():
+    """Get the size and hit counts of the spam pre-screen filters"""
+    return jsonify(spam_filter.get_status()), 200
+
+@app.route('/admin/spam-filter/lists', methods=['POST'])
+@require_admin_key
+def import_spam_list():
+    """
+    Import (or replace) a named list of blocked senders and spam fingerprints
+    The filters are rebuilt in the background
+    
+    Expected JSON payload:
+    {"name": "vendor-feed", "domains": ["spam.example", "bad@mail.example"], "fingerprints": ["<sha256>"]}
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        counts = spam_filter.import_list(data.get('name'), data.get('domains'), data.get('fingerprints'))
+    except ValueError as e:
+        return jsonify({
+            'error': 'Invalid spam list',
+            'message': str(e)
+        }), 400
+    
+    return jsonify({
+        'status': 'imported',
+        'entries': counts,
+        'message': 'Filters are rebuilding; poll GET /admin/spam-filter for progress'
+    }), 202
+
+@app.route('/admin/shadow', methods=['GET'])
+@require_admin_key
+def get_shadow_report():
+    """Get agreement, confusion and latency of the shadow candidate against the primary"""
+    return jsonify(shadow.get_report()), 200
+
+@app.route('/admin/shadow', methods=['POST'])
+@require_admin_key
+def start_shadow():
+    """
+    Start shadow evaluation of a candidate model
+    
+    Expected JSON payload:
+    {"version": "email-nli-2024-06", "sample_rate": 0.05}
+    """
+    data = request.get_json(silent=True) or {}
+    version = data.get('version')
+    sample_rate = data.get('sample_rate')
+    if not isinstance(version, str) or not version:
+        return jsonify({
+            'error': 'Invalid version',
+            'message': 'version must be a non-empty string'
+        }), 400
+    if sample_rate is not None and (not isinstance(sample_rate, (int, float)) or not 0 < sample_rate <= 1):
+        return jsonify({
+            'error': 'Invalid sample rate',
+            'message': 'sample_rate must be between 0 and 1'
+        }), 400
+    
+    if not shadow.start(version, sample_rate):
+        return jsonify({
+            'error': 'Shadow loading',
+            'message': 'A shadow candidate is already loading'
+        }), 409
+    
+    return jsonify({
+        'status': 'started',
+        'version': version,
+        'message': 'Candidate loading; poll GET /admin/shadow for results'
+    }), 202
+
+@app.route('/admin/shadow', methods=['DELETE'])
+@require_admin_key
+def stop_shadow():
+    """Stop shadow evaluation and release the candidate model"""
+    report = shadow.get_report()
+    shadow.stop()
+    return jsonify(report), 200
+
 @app.errorhandler(404)
 def not_found(error):
     """Handle 404 errors"""
@@ -384,8 +1313,13 @@ def not_found(error):
         'message': 'The requested endpoint does not exist',
         'available_endpoints': [
             'GET /health',
+            'GET /ready',
             'POST /classify',
             'POST /batch-classify',
+            'POST /jobs',
+            'GET /jobs/<job_id>',
+            'GET /jobs/<job_id>/results',
+            'POST /sync',
             'POST /compose',
             'POST /train'
         ]
@@ -400,8 +1334,26 @@ def internal_error(error):
         'message': 'An unexpected error occurred'
     }), 500
 
+def load_in_background():
+    """Fast-start mode: load the model and start job workers without blocking the server"""
+    def target():
+        initialize_model()
+        job_queue.start()
+        if config.FINETUNE_ENABLED:
+            finetuner.resume()
+    
+    threading.Thread(target=target, name='model-loader', daemon=True).start()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Automail AI Server')
+    parser.add_argument('--fast-start', action='store_true', default=config.FAST_START,
+                        help='Serve rule-based results immediately while the model loads in the background')
+    return parser.parse_args(argv)
+
 if __name__ == '__main__':
     try:
+        args = parse_args()
+        
         # Cloud-friendly configuration
         import os
         
@@ -421,14 +1373,23 @@ if __name__ == '__main__':
         logger.info(f"   API Key: {'Set' if config.API_KEY else 'Not set'}")
         logger.info(f"   Rate Limit: {config.RATE_LIMIT_PER_MINUTE} requests/minute")
         
-        # Initialize model on startup
-        log_model_status('loading')
-        if classifier.load_model():
-            log_model_status('loaded')
+        if config.SPAM_FILTER_ENABLED:
+            spam_filter.start()
+        
+        if args.fast_start:
+            logger.info("⚡ Fast start: serving rule-based results until the model is loaded")
+            load_in_background()
         else:
-            log_model_status('error', 'Failed to load model - will use fallback')
+            # Initialize model on startup
+            initialize_model()
+            
+            # Resume any bulk jobs interrupted by the previous shutdown
+            job_queue.start()
+            if config.FINETUNE_ENABLED:
+                finetuner.resume()
         
         # Start server
+        mark('serving')
         app.run(
             host=host,
             port=port,
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Compare inference backends on CPU (or the available device)
+Loads the same model version as the eager backend and the compiled
+backend, runs synthetic batches at the scheduler's batch sizes and prints
+latency percentiles, throughput and label agreement per batch size
+
+Usage:
+    python benchmark_backends.py
+    python benchmark_backends.py --version facebook/bart-large-mnli --rounds 20
+    COMPILE_MODE=inductor python benchmark_backends.py
+"""
+
+import sys
+import time
+import logging
+import argparse
+
+from utils.autotune import synthetic_emails
+from utils.classifier import DEFAULT_MODEL_VERSION, EmailClassifier
+
+logger = logging.getLogger('automail.benchmark')
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def time_backend(backend, texts, batch_size: int, rounds: int) -> dict:
+    """Latencies (ms) and labels for `rounds` batches of `batch_size` texts"""
+    latencies, labels = [], []
+    for round_index in range(rounds):
+        start_index = (round_index * batch_size) % max(1, len(texts) - batch_size + 1)
+        batch = texts[start_index:start_index + batch_size]
+        start = time.perf_counter()
+        results = backend.classify(batch)
+        latencies.append((time.perf_counter() - start) * 1000)
+        labels.extend(result['label'] for result in results)
+    return {
+        'p50_ms': percentile(latencies, 0.5),
+        'p95_ms': percentile(latencies, 0.95),
+        'emails_per_second': batch_size * rounds / (sum(latencies) / 1000),
+        'labels': labels
+    }
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the compiled backend against eager inference')
+    parser.add_argument('--version', default=DEFAULT_MODEL_VERSION, help='Registered version or hub id')
+    parser.add_argument('--batch-sizes', default='', help='Comma-separated sizes (default: scheduler sizes)')
+    parser.add_argument('--rounds', type=int, default=10, help='Timed batches per size')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s | %(levelname)-8s | %(message)s')
+    args = parse_args(argv)
+
+    classifier = EmailClassifier()
+    sizes = [int(size) for size in args.batch_sizes.split(',') if size] or classifier.scheduler_batch_sizes()
+    texts = synthetic_emails(max(sizes) * args.rounds)
+
+    eager = classifier.load_backend(args.version, 'eager')
+    compiled = classifier.load_backend(args.version, 'compiled')
+
+    # Compile time is reported separately; it is paid once per cache directory
+    start = time.perf_counter()
+    compiled.precompile()
+    compile_seconds = time.perf_counter() - start
+
+    # One untimed batch per size so both backends start warm
+    for size in sizes:
+        eager.classify(texts[:size])
+        compiled.classify(texts[:size])
+
+    print(f"\n{args.version} on {eager.device}, {args.rounds} rounds per batch size")
+    print(f"Compiled backend ready in {compile_seconds:.1f}s ({compiled.mode}, cache {compiled.cache_dir})\n")
+    print(f"  {'batch':>5}  {'eager p50':>10} {'p95':>8}  {'compiled p50':>13} {'p95':>8}  "
+          f"{'eager/s':>8} {'compiled/s':>10}  {'speedup':>7}  {'agree':>6}")
+    for size in sizes:
+        eager_stats = time_backend(eager, texts, size, args.rounds)
+        compiled_stats = time_backend(compiled, texts, size, args.rounds)
+        agreement = sum(
+            a == b for a, b in zip(eager_stats['labels'], compiled_stats['labels'])
+        ) / len(eager_stats['labels'])
+        print(f"  {size:>5}  {eager_stats['p50_ms']:>8.1f}ms {eager_stats['p95_ms']:>6.1f}ms  "
+              f"{compiled_stats['p50_ms']:>11.1f}ms {compiled_stats['p95_ms']:>6.1f}ms  "
+              f"{eager_stats['emails_per_second']:>8.1f} {compiled_stats['emails_per_second']:>10.1f}  "
+              f"{compiled_stats['emails_per_second'] / eager_stats['emails_per_second']:>6.2f}x  "
+              f"{agreement:>6.0%}")
+
+    stats = compiled.get_info()
+    print(f"\nCompiled calls: {stats['compiled_calls']}, eager fallbacks: {stats['eager_calls']}, "
+          f"traced: {stats['traced']}, loaded from disk: {stats['loaded_from_disk']}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Offline bulk classification of mail archives (mbox or Maildir)
+Streams the archive, parses MIME bodies in a process pool, runs batched
+inference and writes one JSON line per message, with resumable checkpoints.
+Messages are screened as the server screens them (boilerplate stripping,
+long email chunks and link domain hints); answers that come from server
+state (corrections, spam filters, senders, threads) are not applied
+
+Usage:
+    python bulk_classify.py archive.mbox -o results.jsonl
+    python bulk_classify.py ~/Maildir -o results.jsonl --workers 8 --batch-size 16
+"""
+
+import os
+import re
+import sys
+import json
+import mmap
+import time
+import logging
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from email import policy
+from email.parser import BytesParser
+
+from utils.classifier import EmailClassifier
+
+logger = logging.getLogger('automail.bulk')
+
+# Message boundaries in an mbox file ("From " at the start of a line)
+MBOX_SEPARATOR = re.compile(rb'^From ', re.MULTILINE)
+HTML_TAG = re.compile(r'<[^>]+>')
+
+# Per-process preprocessor used by the parse workers
+_preprocessor = None
+
+class StageTimer:
+    """Accumulates busy time and message counts for one pipeline stage"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.busy = 0.0
+        self.count = 0
+
+    def add(self, seconds: float, count: int):
+        self.busy += seconds
+        self.count += count
+
+    def rate(self, parallelism: int = 1) -> float:
+        """Messages per second while the stage was busy"""
+        if self.busy <= 0:
+            return 0.0
+        return self.count / (self.busy / parallelism)
+
+def iter_mbox(path: str):
+    """Yield raw messages from an mbox file without loading it into memory"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            start = None
+            for match in MBOX_SEPARATOR.finditer(mm):
+                if start is not None:
+                    yield mm[start:match.start()]
+                # Skip the "From " envelope line itself
+                start = mm.find(b'\n', match.start()) + 1
+            if start is not None and start < len(mm):
+                yield mm[start:]
+
+def iter_maildir(path: str):
+    """Yield raw messages from a Maildir in a stable order"""
+    for folder in ('cur', 'new'):
+        directory = os.path.join(path, folder)
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            with open(os.path.join(directory, name), 'rb') as f:
+                yield f.read()
+
+def detect_format(path: str) -> str:
+    """Maildir if the path is a directory, mbox otherwise"""
+    return 'maildir' if os.path.isdir(path) else 'mbox'
+
+def _init_worker():
+    global _preprocessor
+    _preprocessor = EmailClassifier()
+
+def parse_messages(raw_messages):
+    """
+    Parse and screen a chunk of raw messages (runs in a worker process)
+
+    Returns:
+        Tuple of (parsed message dicts, seconds spent)
+    """
+    start_time = time.time()
+    parser = BytesParser(policy=policy.default)
+    parsed = []
+
+    for raw in raw_messages:
+        try:
+            message = parser.parsebytes(raw)
+            subject = str(message.get('Subject', '') or '')
+            body = message.get_body(preferencelist=('plain', 'html'))
+            content = body.get_content() if body is not None else ''
+            if body is not None and body.get_content_type() == 'text/html':
+                content = HTML_TAG.sub(' ', content)
+
+            texts, hint = _preprocessor.screen_email(content, subject)
+            parsed.append({
+                'message_id': str(message.get('Message-ID', '') or '').strip(),
+                'subject': subject,
+                'texts': texts,
+                'hint': hint
+            })
+        except Exception as e:
+            parsed.append({'message_id': '', 'subject': '', 'texts': [''], 'hint': None, 'error': str(e)})
+
+    return parsed, time.time() - start_time
+
+def load_checkpoint(checkpoint_path: str, input_path: str) -> dict:
+    """Load a checkpoint written for the same input, or start fresh"""
+    if not os.path.exists(checkpoint_path):
+        return {'processed': 0, 'output_bytes': 0}
+
+    with open(checkpoint_path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get('input') != os.path.abspath(input_path):
+        raise SystemExit(f"Checkpoint {checkpoint_path} belongs to {checkpoint.get('input')}")
+    return checkpoint
+
+def save_checkpoint(checkpoint_path: str, input_path: str, processed: int, output):
+    """Flush output and atomically record how far the run got"""
+    output.flush()
+    os.fsync(output.fileno())
+
+    tmp_path = checkpoint_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({
+            'input': os.path.abspath(input_path),
+            'processed': processed,
+            'output_bytes': output.tell(),
+            'updated_at': time.time()
+        }, f)
+    os.replace(tmp_path, checkpoint_path)
+
+def iter_parsed(pool, messages, args, skip: int, stages: dict):
+    """
+    Yield parsed messages in archive order, keeping a bounded number of
+    parse chunks in flight in the process pool
+    """
+    pending = deque()
+    chunk = []
+    index = 0
+
+    def collect():
+        future, first_index = pending.popleft()
+        parsed, seconds = future.result()
+        stages['parse'].add(seconds, len(parsed))
+        for offset, item in enumerate(parsed):
+            item['index'] = first_index + offset
+        return parsed
+
+    read_start = time.time()
+    for raw in messages:
+        if index < skip:
+            index += 1
+            continue
+        if args.limit and index - skip >= args.limit:
+            break
+
+        chunk.append(raw)
+        index += 1
+        if len(chunk) < args.chunk_size:
+            continue
+
+        stages['read'].add(time.time() - read_start, len(chunk))
+        pending.append((pool.submit(parse_messages, chunk), index - len(chunk)))
+        chunk = []
+
+        # Bound the number of chunks in flight to keep memory flat
+        while len(pending) > args.workers * 2:
+            yield from collect()
+        read_start = time.time()
+
+    if chunk:
+        stages['read'].add(time.time() - read_start, len(chunk))
+        pending.append((pool.submit(parse_messages, chunk), index - len(chunk)))
+    while pending:
+        yield from collect()
+
+def run(args) -> dict:
+    """Classify the archive described by args and return per-stage statistics"""
+    archive_format = args.format if args.format != 'auto' else detect_format(args.input)
+    messages = iter_mbox(args.input) if archive_format == 'mbox' else iter_maildir(args.input)
+
+    checkpoint_path = args.output + '.checkpoint'
+    checkpoint = load_checkpoint(checkpoint_path, args.input) if args.resume else {'processed': 0, 'output_bytes': 0}
+    processed = resumed = checkpoint['processed']
+
+    stages = {name: StageTimer(name) for name in ('read', 'parse', 'write')}
+    classifier = EmailClassifier()
+    use_model = not args.rules_only and classifier.load_model()
+    if not args.rules_only and not use_model:
+        logger.warning("AI model unavailable, using rule-based fallback")
+
+    mode = 'r+' if processed and os.path.exists(args.output) else 'w'
+    with open(args.output, mode) as output, \
+            ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker) as pool:
+        # Drop anything written after the last checkpoint
+        output.seek(checkpoint['output_bytes'])
+        output.truncate()
+        if processed:
+            logger.info(f"Resuming after {processed} messages")
+
+        started = time.time()
+        last_checkpoint = processed
+        in_flight = deque()
+
+        def screened():
+            for item in iter_parsed(pool, messages, args, processed, stages):
+                in_flight.append(item)
+                yield item['texts'], item['hint']
+
+        # Tokenisation and inference run as pipeline stages alongside parsing
+        if use_model:
+            results = classifier.classify_stream(screened(), args.batch_size, preprocessed=True)
+        else:
+            results = (hint or classifier.rule_based_classification(texts[0]) for texts, hint in screened())
+
+        for result in results:
+            item = in_flight.popleft()
+            write_start = time.time()
+            output.write(json.dumps({
+                'index': item['index'],
+                'message_id': item['message_id'],
+                'subject': item['subject'],
+                **({'error': item['error']} if 'error' in item else {}),
+                **result
+            }) + '\n')
+            stages['write'].add(time.time() - write_start, 1)
+
+            processed += 1
+            if processed - last_checkpoint >= args.checkpoint_every:
+                save_checkpoint(checkpoint_path, args.input, processed, output)
+                last_checkpoint = processed
+                rate = (processed - resumed) / (time.time() - started)
+                logger.info(f"📦 {processed} messages ({rate:.1f} msg/s this run)")
+
+        save_checkpoint(checkpoint_path, args.input, processed, output)
+
+    elapsed = time.time() - started
+    report = {
+        name: {
+            'messages': stage.count,
+            'busy_seconds': round(stage.busy, 3),
+            'messages_per_second': round(stage.rate(args.workers if name == 'parse' else 1), 1)
+        }
+        for name, stage in stages.items()
+    }
+
+    # Model stages come from the inference pipeline's own counters
+    pipeline = classifier.pipeline_stats.as_dict()
+    for name in (('tokenize', 'infer', 'postprocess') if use_model else ()):
+        busy = pipeline['stages'][name]['busy_seconds']
+        report[name] = {
+            'messages': pipeline['items'],
+            'busy_seconds': busy,
+            'messages_per_second': round(pipeline['items'] / busy, 1) if busy else 0.0,
+            'utilization': pipeline['stages'][name]['utilization']
+        }
+
+    return {
+        'processed': processed,
+        'elapsed': elapsed,
+        'overall_rate': (stages['write'].count / elapsed) if elapsed else 0.0,
+        'stages': report
+    }
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Classify an mbox file or Maildir without the HTTP server')
+    parser.add_argument('input', help='Path to an mbox file or Maildir directory')
+    parser.add_argument('-o', '--output', required=True, help='JSONL output file')
+    parser.add_argument('--format', choices=['auto', 'mbox', 'maildir'], default='auto')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='MIME parsing processes')
+    parser.add_argument('--batch-size', type=int, default=8, help='Inference batch size')
+    parser.add_argument('--chunk-size', type=int, default=64, help='Messages per parsing task')
+    parser.add_argument('--checkpoint-every', type=int, default=1000, help='Messages between checkpoints')
+    parser.add_argument('--no-resume', dest='resume', action='store_false', help='Ignore an existing checkpoint')
+    parser.add_argument('--limit', type=int, default=0, help='Stop after this many messages in this run')
+    parser.add_argument('--rules-only', action='store_true', help='Skip the AI model and use the rule engine')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s | %(levelname)-8s | %(message)s')
+    args = parse_args(argv)
+
+    stats = run(args)
+
+    print(f"\nClassified {stats['processed']} messages in {stats['elapsed']:.1f}s "
+          f"({stats['overall_rate']:.1f} msg/s this run)")
+    for name, stage in stats['stages'].items():
+        utilization = f"  {stage['utilization']:.0%} utilised" if 'utilization' in stage else ''
+        print(f"  {name:<11} {stage['messages']:>9} msgs  {stage['busy_seconds']:>9.1f}s busy  "
+              f"{stage['messages_per_second']:>9.1f} msg/s{utilization}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
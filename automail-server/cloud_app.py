@@ -7,8 +7,12 @@ Optimized for fast startup and lazy model loading
 import os
 import time
 import logging
+import threading
 from flask import Flask, request, jsonify
 from flask_cors import CORS
+from config.config import get_config
+
+config = get_config()
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -20,21 +24,40 @@ CORS(app)
 
 # Global classifier (loaded lazily)
 classifier = None
+_classifier_lock = threading.Lock()
+_load_error = None  # Why the model is not ready, reported by /ready
 
 def get_or_load_classifier():
-    """Lazy load the classifier only when needed"""
-    global classifier
-    if classifier is None:
+    """
+    Lazy load the classifier only when needed
+    The caller that loads the model warms it up after releasing the lock,
+    so other requests are answered (cold) in the meantime
+    """
+    global classifier, _load_error
+    with _classifier_lock:
+        if classifier is not None:
+            return classifier
         try:
             logger.info("Loading AI classifier...")
             from utils.classifier import get_classifier
-            classifier = get_classifier()
-            if not classifier.load_model():
+            loaded = get_classifier()
+            model_loaded = loaded.load_model()
+            if not model_loaded:
                 logger.warning("AI model failed to load, using rule-based fallback")
+            _load_error = None if model_loaded else 'AI model failed to load'
+            classifier = loaded
         except Exception as e:
             logger.error(f"Failed to load classifier: {e}")
-            classifier = None
-    return classifier
+            _load_error = f"Failed to load classifier: {e}"
+            return None
+
+    if model_loaded and config.WARMUP_ENABLED:
+        try:
+            loaded.warm_up()
+        except Exception as e:
+            logger.error(f"Model warm-up failed: {e}")
+            _load_error = f"Model warm-up failed: {e}"
+    return loaded
 
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -46,6 +69,18 @@ def health_check():
         'service': 'automail-ai-server'
     }), 200
 
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """Readiness probe: 503 until the model is loaded and warmed up, with the error if loading failed"""
+    ready = classifier is not None and classifier.is_ready
+    response = {
+        'ready': ready,
+        'timestamp': time.time()
+    }
+    if not ready and _load_error:
+        response['error'] = _load_error
+    return jsonify(response), 200 if ready else 503
+
 @app.route('/classify', methods=['POST'])
 def classify_email():
     """Classify a single email"""
@@ -140,6 +175,7 @@ def root():
         'status': 'running',
         'endpoints': [
             'GET /health - Health check',
+            'GET /ready - Readiness probe (model loaded and warmed up)',
             'POST /classify - Classify single email',
             'POST /batch-classify - Classify multiple emails'
         ]
@@ -155,6 +191,10 @@ if __name__ == '__main__':
     logger.info(f"Debug mode: {debug}")
     logger.info(f"API Key configured: {bool(os.getenv('API_KEY'))}")
     
+    # Load and warm the model in the background so the port opens immediately
+    # and /ready flips once the first request would no longer pay for it
+    threading.Thread(target=get_or_load_classifier, name='model-loader', daemon=True).start()
+    
     # Start server
     app.run(
         host=host,
@@ -16,9 +16,12 @@ class Config:
     HOST = os.environ.get('HOST') or '127.0.0.1'
     PORT = int(os.environ.get('PORT') or 5000)
     DEBUG = os.environ.get('FLASK_DEBUG', 'False').lower() == 'true'
+    FAST_START = os.environ.get('FAST_START', 'False').lower() == 'true'  # Serve rules while the model loads
+    LOG_FILE = os.environ.get('LOG_FILE', 'automail-server.log')  # Empty disables file logging
     
     # API settings
     API_KEY = os.environ.get('API_KEY') or 'automail-dev-key-2024'
+    ADMIN_API_KEY = os.environ.get('ADMIN_API_KEY') or API_KEY
     RATE_LIMIT_PER_MINUTE = int(os.environ.get('RATE_LIMIT_PER_MINUTE') or 100)
     
     # AI Model settings
@@ -27,10 +30,131 @@ class Config:
     CLASSIFICATION_LABELS = [
         'Work', 'Personal', 'Spam', 'Important', 'Review'
     ]
+    CLASSIFIER_BACKEND = os.environ.get('CLASSIFIER_BACKEND') or 'eager'  # eager, compiled, student or prototype
+    COMPILE_MODE = os.environ.get('COMPILE_MODE') or 'torchscript'  # torchscript or inductor (torch.compile)
+    COMPILED_SEQ_BUCKETS = [int(size) for size in (os.environ.get('COMPILED_SEQ_BUCKETS') or '64,128,256').split(',')]
+    STUDENT_MAX_LENGTH = int(os.environ.get('STUDENT_MAX_LENGTH') or 256)  # Tokens per email for distilled students
+    INFERENCE_BATCH_SIZE = int(os.environ.get('INFERENCE_BATCH_SIZE') or 8)
+    PIPELINE_QUEUE_SIZE = int(os.environ.get('PIPELINE_QUEUE_SIZE') or 2)
+    INFERENCE_WORKERS = int(os.environ.get('INFERENCE_WORKERS') or 1)  # Concurrent forward passes
+    
+    # Model warm-up before readiness
+    WARMUP_ENABLED = os.environ.get('WARMUP_ENABLED', 'True').lower() == 'true'
+    WARMUP_BATCH_SIZES = [int(size) for size in os.environ.get('WARMUP_BATCH_SIZES', '').split(',') if size]
+    
+    # Idle unloading (0 keeps the model resident)
+    IDLE_UNLOAD_SECONDS = int(os.environ.get('IDLE_UNLOAD_SECONDS') or 0)
+    IDLE_UNLOAD_MODE = os.environ.get('IDLE_UNLOAD_MODE') or 'release'  # release or mmap
+    
+    # Shadow evaluation of candidate models
+    SHADOW_MODEL_VERSION = os.environ.get('SHADOW_MODEL_VERSION') or ''  # Start shadowing this version at startup
+    SHADOW_SAMPLE_RATE = float(os.environ.get('SHADOW_SAMPLE_RATE') or 0.05)
+    SHADOW_QUEUE_SIZE = int(os.environ.get('SHADOW_QUEUE_SIZE') or 256)
+    SHADOW_MAX_LOAD = float(os.environ.get('SHADOW_MAX_LOAD') or 0.75)  # 1-minute load average per CPU
+    
+    # Inference autotuning
+    AUTOTUNE_ON_STARTUP = os.environ.get('AUTOTUNE_ON_STARTUP', 'False').lower() == 'true'
+    AUTOTUNE_LATENCY_SLO_MS = int(os.environ.get('AUTOTUNE_LATENCY_SLO_MS') or 2000)
+    AUTOTUNE_BATCH_SIZES = [int(size) for size in (os.environ.get('AUTOTUNE_BATCH_SIZES') or '1,2,4,8,16').split(',')]
+    AUTOTUNE_SAMPLE_EMAILS = int(os.environ.get('AUTOTUNE_SAMPLE_EMAILS') or 32)
+    HYPOTHESIS_TEMPLATE = os.environ.get('HYPOTHESIS_TEMPLATE') or 'This example is {}.'
     
     # Request settings
     MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH') or 16384)  # 16KB
     REQUEST_TIMEOUT = int(os.environ.get('REQUEST_TIMEOUT') or 30)
+    MAX_REQUEST_SIZE = int(os.environ.get('MAX_REQUEST_SIZE') or 64 * 1024 * 1024)  # 64MB, bulk job uploads
+    
+    # Persistence settings
+    DATA_DIR = os.environ.get('DATA_DIR') or './data'
+    RESULT_STORE_PATH = os.environ.get('RESULT_STORE_PATH') or os.path.join(DATA_DIR, 'results.db')
+    MAX_SYNC_MESSAGES = int(os.environ.get('MAX_SYNC_MESSAGES') or 10000)
+    
+    # Bulk job settings
+    JOB_STORE_PATH = os.environ.get('JOB_STORE_PATH') or os.path.join(DATA_DIR, 'jobs.db')
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS') or 1)
+    JOB_CHUNK_SIZE = int(os.environ.get('JOB_CHUNK_SIZE') or 32)
+    MAX_JOB_EMAILS = int(os.environ.get('MAX_JOB_EMAILS') or 50000)
+    MAX_JOB_RESULTS_PAGE = int(os.environ.get('MAX_JOB_RESULTS_PAGE') or 1000)
+    
+    # Embedding prototype backend (CLASSIFIER_BACKEND=prototype)
+    PROTOTYPE_EXAMPLES_PATH = os.environ.get('PROTOTYPE_EXAMPLES_PATH') or os.path.join(DATA_DIR, 'prototype_examples.jsonl')
+    PROTOTYPE_TEMPERATURE = float(os.environ.get('PROTOTYPE_TEMPERATURE') or 0.05)  # Softmax temperature over cosine scores
+    PROTOTYPE_MAX_LENGTH = int(os.environ.get('PROTOTYPE_MAX_LENGTH') or 256)
+    
+    # Nearest-neighbour lookup over /train corrections
+    KNN_CORRECTIONS_ENABLED = os.environ.get('KNN_CORRECTIONS_ENABLED', 'True').lower() == 'true'
+    KNN_ENCODER = os.environ.get('KNN_ENCODER') or 'sentence-transformers/all-MiniLM-L6-v2'
+    KNN_THRESHOLD = float(os.environ.get('KNN_THRESHOLD') or 0.92)  # Cosine similarity to reuse a user's own correction
+    KNN_GLOBAL_THRESHOLD = float(os.environ.get('KNN_GLOBAL_THRESHOLD') or 0.97)  # ... and another user's
+    KNN_K = int(os.environ.get('KNN_K') or 5)
+    KNN_IVF_THRESHOLD = int(os.environ.get('KNN_IVF_THRESHOLD') or 20000)  # Exact search below this many vectors
+    KNN_NPROBE = int(os.environ.get('KNN_NPROBE') or 8)
+    
+    # Per-user adapter heads trained online from /train corrections
+    ADAPTERS_ENABLED = os.environ.get('ADAPTERS_ENABLED', 'True').lower() == 'true'
+    ADAPTER_MIN_EXAMPLES = int(os.environ.get('ADAPTER_MIN_EXAMPLES') or 5)
+    ADAPTER_MIN_CONFIDENCE = float(os.environ.get('ADAPTER_MIN_CONFIDENCE') or 0.7)
+    ADAPTER_MIN_SIMILARITY = float(os.environ.get('ADAPTER_MIN_SIMILARITY') or 0.6)  # ... to the user's nearest correction
+    ADAPTER_CACHE_MB = int(os.environ.get('ADAPTER_CACHE_MB') or 64)
+    
+    # Append-only log of /train corrections
+    CORRECTIONS_LOG_DIR = os.environ.get('CORRECTIONS_LOG_DIR') or os.path.join(DATA_DIR, 'corrections_log')
+    CORRECTIONS_SEGMENT_MB = int(os.environ.get('CORRECTIONS_SEGMENT_MB') or 16)  # Segment size before rotation
+    CORRECTIONS_COMPACT_SEGMENTS = int(os.environ.get('CORRECTIONS_COMPACT_SEGMENTS') or 4)  # Sealed segments that start a compaction
+    
+    # Background fine-tuning on /train corrections (see finetune.py)
+    FINETUNE_ENABLED = os.environ.get('FINETUNE_ENABLED', 'True').lower() == 'true'
+    FINETUNE_DIR = os.environ.get('FINETUNE_DIR') or os.path.join(DATA_DIR, 'finetune')
+    FINETUNE_MIN_CORRECTIONS = int(os.environ.get('FINETUNE_MIN_CORRECTIONS') or 200)  # New corrections that start a job
+    FINETUNE_THREADS = int(os.environ.get('FINETUNE_THREADS') or 1)  # Torch threads of the training process
+    FINETUNE_NICE = int(os.environ.get('FINETUNE_NICE') or 10)
+    FINETUNE_EPOCHS = int(os.environ.get('FINETUNE_EPOCHS') or 3)
+    FINETUNE_BATCH_SIZE = int(os.environ.get('FINETUNE_BATCH_SIZE') or 8)
+    FINETUNE_LEARNING_RATE = float(os.environ.get('FINETUNE_LEARNING_RATE') or 1e-3)
+    FINETUNE_CHECKPOINT_STEPS = int(os.environ.get('FINETUNE_CHECKPOINT_STEPS') or 50)
+    
+    # Sender and domain label index (see utils/sender_index.py)
+    SENDER_INDEX_ENABLED = os.environ.get('SENDER_INDEX_ENABLED', 'True').lower() == 'true'
+    SENDER_INDEX_PATH = os.environ.get('SENDER_INDEX_PATH') or os.path.join(DATA_DIR, 'sender_index.npz')
+    SENDER_INDEX_CAPACITY = int(os.environ.get('SENDER_INDEX_CAPACITY') or 100000)  # Addresses and domains kept across all keys
+    SENDER_HALF_LIFE_DAYS = float(os.environ.get('SENDER_HALF_LIFE_DAYS') or 30)  # Old emails count half after this long
+    SENDER_MIN_WEIGHT = float(os.environ.get('SENDER_MIN_WEIGHT') or 5)  # Recent emails before an address answers
+    SENDER_DOMAIN_MIN_WEIGHT = float(os.environ.get('SENDER_DOMAIN_MIN_WEIGHT') or 20)  # ... before a domain answers
+    SENDER_MIN_SHARE = float(os.environ.get('SENDER_MIN_SHARE') or 0.9)  # Share of the dominant label
+    SENDER_CORRECTION_WEIGHT = float(os.environ.get('SENDER_CORRECTION_WEIGHT') or 5)  # Emails a /train correction counts as
+    SENDER_SAVE_SECONDS = int(os.environ.get('SENDER_SAVE_SECONDS') or 60)
+    
+    # Last label per email thread (see utils/thread_state.py)
+    THREAD_STATE_ENABLED = os.environ.get('THREAD_STATE_ENABLED', 'True').lower() == 'true'
+    THREAD_STATE_CAPACITY = int(os.environ.get('THREAD_STATE_CAPACITY') or 50000)  # Threads kept across all keys
+    THREAD_STATE_TTL_DAYS = float(os.environ.get('THREAD_STATE_TTL_DAYS') or 14)  # Idle threads are dropped after this long
+    THREAD_MAX_DISTANCE = int(os.environ.get('THREAD_MAX_DISTANCE') or 48)  # Fingerprint bits (of 128) a reply may differ in
+    THREAD_MIN_CONFIDENCE = float(os.environ.get('THREAD_MIN_CONFIDENCE') or 0.6)  # Thread labels below this are not reused
+    THREAD_MAX_REUSE = int(os.environ.get('THREAD_MAX_REUSE') or 20)  # Reused replies before one is classified again
+    
+    # Bloom-filter spam pre-screen (see utils/spam_filter.py)
+    SPAM_FILTER_ENABLED = os.environ.get('SPAM_FILTER_ENABLED', 'True').lower() == 'true'
+    SPAM_LISTS_DIR = os.environ.get('SPAM_LISTS_DIR') or os.path.join(DATA_DIR, 'spam_lists')
+    SPAM_FILTER_ERROR_RATE = float(os.environ.get('SPAM_FILTER_ERROR_RATE') or 1e-6)  # False positive rate per filter
+    SPAM_FILTER_REBUILD_SECONDS = int(os.environ.get('SPAM_FILTER_REBUILD_SECONDS') or 300)  # Source check interval
+    
+    # Quoted replies, signatures and footers removed before inference (see utils/boilerplate.py)
+    BOILERPLATE_STRIP_ENABLED = os.environ.get('BOILERPLATE_STRIP_ENABLED', 'True').lower() == 'true'
+    
+    # Long emails scored on sampled chunks (see utils/long_email.py)
+    LONG_EMAIL_ENABLED = os.environ.get('LONG_EMAIL_ENABLED', 'True').lower() == 'true'
+    LONG_EMAIL_MAX_CHUNKS = int(os.environ.get('LONG_EMAIL_MAX_CHUNKS') or 3)  # Model inputs per email, i.e. its cost in short emails
+    
+    # Labels from link domains of known categories (see utils/link_domains.py)
+    LINK_HINTS_ENABLED = os.environ.get('LINK_HINTS_ENABLED', 'True').lower() == 'true'
+    LINK_DOMAINS_PATH = os.environ.get('LINK_DOMAINS_PATH', '')  # JSON {"domain": "Label"} added to the built-in list
+    LINK_HINT_MIN_LINKS = int(os.environ.get('LINK_HINT_MIN_LINKS') or 3)  # Links to one category before it answers
+    LINK_HINT_MIN_SHARE = float(os.environ.get('LINK_HINT_MIN_SHARE') or 0.7)  # ... as a share of all links
+    
+    # Score vectors and embeddings keyed by email content (see utils/feature_store.py)
+    FEATURE_STORE_ENABLED = os.environ.get('FEATURE_STORE_ENABLED', 'True').lower() == 'true'
+    FEATURE_STORE_DIR = os.environ.get('FEATURE_STORE_DIR') or os.path.join(DATA_DIR, 'features')
+    FEATURE_STORE_MAX_ROWS = int(os.environ.get('FEATURE_STORE_MAX_ROWS') or 500000)  # Per table; a full table stops storing
     
     # CORS settings
     CORS_ORIGINS = os.environ.get('CORS_ORIGINS', '*').split(',')
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Distil the zero-shot classifier into a small single-pass student
+Labels a local corpus with the current EmailClassifier model, trains a
+small encoder (MODEL_NAME, distilbert-base-uncased by default) with a
+16-way head on the teacher's label distributions, compares the two on a
+held-out split and registers the student in the model registry
+
+Usage:
+    python distill_student.py emails.jsonl -o ./distill
+    python distill_student.py ~/mail/archive.mbox -o ./distill --base microsoft/MiniLM-L12-H384-uncased --epochs 3
+
+The corpus is a JSONL file (objects with 'content' and optional 'subject',
+or already preprocessed 'text'), an mbox file or a Maildir. Teacher labels
+are cached in the output directory, so reruns only pay for training.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from config.config import get_config
+from bulk_classify import detect_format, iter_mbox, iter_maildir, parse_messages, _init_worker
+from utils.classifier import DEFAULT_MODEL_VERSION, EmailClassifier, LABEL_MAPPING
+from utils.student_backend import STUDENT_LABELS, StudentBackend, student_label_config
+
+config = get_config()
+logger = logging.getLogger('automail.distill')
+
+def load_corpus(path: str, classifier: EmailClassifier, limit: int = 0, workers: int = 1) -> list:
+    """Preprocessed, de-duplicated, non-empty texts from a JSONL file, mbox or Maildir"""
+    texts = []
+    if path.endswith('.jsonl'):
+        with open(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                texts.append(item.get('text') or classifier.preprocess_email_content(
+                    item.get('content', ''), item.get('subject', '')
+                ))
+                if limit and len(texts) >= limit:
+                    break
+    else:
+        messages = iter_mbox(path) if detect_format(path) == 'mbox' else iter_maildir(path)
+        chunks, chunk = [], []
+        for raw in messages:
+            chunk.append(raw)
+            if len(chunk) == 64:
+                chunks.append(chunk)
+                chunk = []
+            if limit and sum(map(len, chunks)) + len(chunk) >= limit:
+                break
+        chunks.append(chunk)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            for parsed, _ in pool.map(parse_messages, chunks):
+                texts.extend(item['texts'][0] for item in parsed)  # The head input, as the teacher sees most emails
+
+    return list(dict.fromkeys(text for text in texts if text))
+
+def teacher_scores(teacher, texts: list, batch_size: int, cache_path: str) -> np.ndarray:
+    """
+    Teacher label distributions in STUDENT_LABELS order, one row per text
+    Cached by teacher version and corpus contents; emails the teacher
+    already scored (e.g. while serving) are read from the feature store
+    """
+    digest = hashlib.sha256('\n'.join([teacher.version] + texts).encode('utf-8')).hexdigest()
+    if os.path.exists(cache_path):
+        cached = np.load(cache_path)
+        if str(cached['digest']) == digest:
+            logger.info(f"Using cached teacher labels from {cache_path}")
+            return cached['scores']
+
+    def compute(batch):
+        return teacher.forward(teacher.tokenize(batch))
+
+    order = [teacher.classification_labels.index(label) for label in STUDENT_LABELS]
+    features = teacher.score_features
+    rows = []
+    started = time.time()
+    for start in range(0, len(texts), batch_size):
+        batch = texts[start:start + batch_size]
+        scores = features.get_or_compute(batch, compute) if features is not None else compute(batch)
+        rows.append(scores[:, order])
+        done = min(start + batch_size, len(texts))
+        if done % (batch_size * 10) == 0 or done == len(texts):
+            logger.info(f"Teacher labelled {done}/{len(texts)} emails ({done / (time.time() - started):.1f}/s)")
+
+    if features is not None:
+        logger.info(f"Read {features.stats['hits']} teacher score vectors from the feature store")
+    scores = np.concatenate(rows).astype(np.float32)
+    np.savez(cache_path, digest=digest, scores=scores)
+    return scores
+
+def train_student(args, texts: list, targets: np.ndarray):
+    """Fine-tune the base encoder on the teacher's softened label distributions"""
+    import torch
+    import transformers
+
+    torch.manual_seed(args.seed)
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+
+    tokenizer = transformers.AutoTokenizer.from_pretrained(args.base, cache_dir=config.MODEL_CACHE_DIR)
+    model = transformers.AutoModelForSequenceClassification.from_pretrained(
+        args.base, cache_dir=config.MODEL_CACHE_DIR, **student_label_config()
+    ).to(device)
+
+    # Temperature-sharpened (T < 1) or softened (T > 1) teacher targets
+    soft = targets ** (1.0 / args.temperature)
+    soft = torch.tensor(soft / soft.sum(axis=1, keepdims=True))
+
+    steps = args.epochs * ((len(texts) + args.batch_size - 1) // args.batch_size)
+    optimizer = torch.optim.AdamW(model.parameters(), lr=args.learning_rate, weight_decay=0.01)
+    scheduler = transformers.get_linear_schedule_with_warmup(optimizer, int(steps * 0.1), steps)
+    rng = random.Random(args.seed)
+
+    model.train()
+    for epoch in range(args.epochs):
+        order = list(range(len(texts)))
+        rng.shuffle(order)
+        total, started = 0.0, time.time()
+        for start in range(0, len(order), args.batch_size):
+            batch = order[start:start + args.batch_size]
+            encoded = tokenizer(
+                [texts[i] for i in batch], padding=True, truncation=True,
+                max_length=config.STUDENT_MAX_LENGTH, return_tensors='pt'
+            ).to(device)
+            logits = model(**encoded).logits / args.temperature
+            loss = -(soft[batch].to(device) * torch.log_softmax(logits, dim=-1)).sum(dim=-1).mean()
+            loss = loss * args.temperature ** 2
+
+            optimizer.zero_grad()
+            loss.backward()
+            torch.nn.utils.clip_grad_norm_(model.parameters(), 1.0)
+            optimizer.step()
+            scheduler.step()
+            total += loss.item() * len(batch)
+        logger.info(f"Epoch {epoch + 1}/{args.epochs}: loss {total / len(texts):.4f} ({time.time() - started:.0f}s)")
+
+    model.eval()
+    return model, tokenizer, device
+
+def per_email_ms(backend, texts: list, batch_size: int) -> float:
+    """Mean end-to-end classify() latency per email at the given batch size"""
+    backend.classify(texts[:batch_size])  # untimed warm-up
+    started = time.perf_counter()
+    for start in range(0, len(texts), batch_size):
+        backend.classify(texts[start:start + batch_size])
+    return (time.perf_counter() - started) * 1000 / len(texts)
+
+def compare(teacher, student, texts: list, targets: np.ndarray, args) -> dict:
+    """Side-by-side agreement and latency on the held-out split"""
+    scores = np.concatenate([
+        student.forward(student.tokenize(texts[start:start + args.batch_size]))
+        for start in range(0, len(texts), args.batch_size)
+    ])
+    teacher_top = targets.argmax(axis=1)
+    student_top = scores.argmax(axis=1)
+
+    # Final labels after LABEL_MAPPING and the low-confidence Review rule
+    teacher_labels = [result['label'] for result in teacher.postprocess(
+        targets[:, [STUDENT_LABELS.index(label) for label in teacher.classification_labels]]
+    )]
+    student_labels = [result['label'] for result in student.postprocess(scores)]
+
+    per_label = {}
+    for index, label in enumerate(STUDENT_LABELS):
+        mask = teacher_top == index
+        if mask.any():
+            per_label[LABEL_MAPPING[label]] = {
+                'count': int(mask.sum()),
+                'agreement': round(float((student_top[mask] == index).mean()), 4)
+            }
+
+    latency_texts = texts[:args.latency_emails]
+    teacher_ms = per_email_ms(teacher, latency_texts, args.batch_size)
+    student_ms = per_email_ms(student, latency_texts, args.batch_size)
+    return {
+        'holdout_emails': len(texts),
+        'top_label_agreement': round(float((teacher_top == student_top).mean()), 4),
+        'final_label_agreement': round(float(np.mean([a == b for a, b in zip(teacher_labels, student_labels)])), 4),
+        'per_label': per_label,
+        'latency': {
+            'batch_size': args.batch_size,
+            'emails': len(latency_texts),
+            'teacher_ms_per_email': round(teacher_ms, 2),
+            'student_ms_per_email': round(student_ms, 2),
+            'speedup': round(teacher_ms / student_ms, 1) if student_ms else None
+        }
+    }
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Distil the zero-shot classifier into a single-pass student')
+    parser.add_argument('corpus', help='JSONL file, mbox file or Maildir directory')
+    parser.add_argument('-o', '--output', required=True, help='Directory for teacher labels, the model and the report')
+    parser.add_argument('--teacher', default=None, help='Teacher version (default: the active model)')
+    parser.add_argument('--base', default=config.MODEL_NAME, help='Student base encoder')
+    parser.add_argument('--version', default=None, help='Registry version for the student')
+    parser.add_argument('--epochs', type=int, default=3)
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--learning-rate', type=float, default=5e-5)
+    parser.add_argument('--temperature', type=float, default=2.0, help='Distillation temperature')
+    parser.add_argument('--holdout', type=float, default=0.1, help='Fraction of the corpus kept for the report')
+    parser.add_argument('--latency-emails', type=int, default=64, help='Held-out emails timed on both models')
+    parser.add_argument('--limit', type=int, default=0, help='Use at most this many emails')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='MIME parsing processes')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-register', dest='register', action='store_false',
+                        help='Save the student without adding it to the model registry')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s | %(levelname)-8s | %(message)s')
+    args = parse_args(argv)
+    os.makedirs(args.output, exist_ok=True)
+
+    classifier = EmailClassifier()
+    texts = load_corpus(args.corpus, classifier, args.limit, args.workers)
+    if len(texts) < 20:
+        raise SystemExit(f"Need at least 20 non-empty emails to distil, found {len(texts)}")
+
+    teacher_version = args.teacher or classifier.registry.active_version or DEFAULT_MODEL_VERSION
+    teacher = classifier.load_backend(teacher_version, 'eager')
+    logger.info(f"Labelling {len(texts)} emails with {teacher.version}")
+    targets = teacher_scores(teacher, texts, args.batch_size, os.path.join(args.output, 'teacher_scores.npz'))
+
+    order = list(range(len(texts)))
+    random.Random(args.seed).shuffle(order)
+    holdout = order[:max(1, int(len(order) * args.holdout))]
+    train = order[len(holdout):]
+
+    model, tokenizer, device = train_student(args, [texts[i] for i in train], targets[train])
+    version = args.version or f"student-{args.base.split('/')[-1]}-{time.strftime('%Y%m%d-%H%M%S')}"
+    model_dir = os.path.join(args.output, 'model')
+    model.save_pretrained(model_dir)
+    tokenizer.save_pretrained(model_dir)
+
+    student = StudentBackend(version, model_dir, model, tokenizer, device)
+    report = {
+        'version': version,
+        'teacher': teacher.version,
+        'base': args.base,
+        'train_emails': len(train),
+        **compare(teacher, student, [texts[i] for i in holdout], targets[holdout], args)
+    }
+    with open(os.path.join(args.output, 'report.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+
+    latency = report['latency']
+    print(f"\n{'':<10} {'model':<40} {'ms/email':>9}")
+    print(f"{'teacher':<10} {teacher.version:<40} {latency['teacher_ms_per_email']:>9.2f}")
+    print(f"{'student':<10} {version:<40} {latency['student_ms_per_email']:>9.2f}")
+    print(f"\nSpeedup {latency['speedup']}x at batch size {latency['batch_size']}; agreement with the teacher on "
+          f"{report['holdout_emails']} held-out emails: {report['top_label_agreement']:.1%} (zero-shot label), "
+          f"{report['final_label_agreement']:.1%} (API label)")
+
+    if args.register:
+        classifier.registry.register(version, model_dir, {'backend': 'student', **report})
+        print(f"Registered {version}; shadow it with POST /admin/shadow or swap with POST /admin/models/swap")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Fine-tune a model version on /train corrections
+Runs one job created by utils/finetune.py (normally started by the server
+in a niced child process). Only the classification head is trained: the
+encoder is frozen, so a step costs one forward pass plus a backward pass
+through a few small layers, which is practical on a single CPU thread.
+
+Usage:
+    python finetune.py data/finetune/jobs/20240601-120000-ab12cd
+    python finetune.py data/finetune/jobs/20240601-120000-ab12cd --threads 2 --nice 15
+
+The job directory holds job.json (base version and hyperparameters) and
+corrections/ (a columnar export of the corrections log). Progress is
+written to status.json and the trainable weights to checkpoint.pt every
+checkpoint_steps steps; rerunning the script on the same directory
+continues from the checkpoint.
+The trained model is registered in the model registry but not activated.
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import logging
+import argparse
+
+from config.config import get_config
+from utils.classifier import EmailClassifier, LABEL_MAPPING
+from utils.corrections_log import CorrectionColumns
+from utils.finetune import DATA_DIR, FINISHED_STATES, JOB_FILE, STATUS_FILE, ZERO_SHOT_LABELS, _read_json, _write_json
+
+config = get_config()
+logger = logging.getLogger('automail.finetune')
+
+CHECKPOINT_FILE = 'checkpoint.pt'
+
+class Interrupted(Exception):
+    """The server that started the job has exited"""
+    pass
+
+class Job:
+    """Job directory files"""
+
+    def __init__(self, job_dir: str):
+        self.dir = job_dir
+        self.spec = _read_json(os.path.join(job_dir, JOB_FILE))
+        if self.spec is None:
+            raise SystemExit(f"{job_dir} has no {JOB_FILE}")
+        self.status = _read_json(os.path.join(job_dir, STATUS_FILE)) or {}
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.dir, name)
+
+    def update(self, **fields):
+        self.status.update(fields, pid=os.getpid(), updated_at=time.time())
+        _write_json(self.path(STATUS_FILE), self.status)
+
+    def corrections(self) -> CorrectionColumns:
+        return CorrectionColumns(self.path(DATA_DIR))
+
+def training_examples(classifier, corrections: CorrectionColumns) -> list:
+    """(zero-shot label, preprocessed text) pairs; labels outside LABEL_MAPPING are skipped"""
+    examples = []
+    for label, subject, content in zip(corrections.label, corrections.subject, corrections.content):
+        label = ZERO_SHOT_LABELS.get(label, label)
+        text = classifier.preprocess_email_content(content, subject)
+        if label in LABEL_MAPPING and text:
+            examples.append((label, text))
+    return examples
+
+def limit_resources(threads: int, nice: int):
+    """Lower the process priority and cap math library threads (before torch is imported)"""
+    if nice and hasattr(os, 'nice'):
+        os.nice(nice)
+    for name in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[name] = str(threads)
+    os.environ.setdefault('TOKENIZERS_PARALLELISM', 'false')
+
+def freeze_encoder(model) -> list:
+    """Freeze everything but the classification head; returns the trainable parameters"""
+    prefix = model.base_model_prefix + '.'
+    trainable = []
+    for name, param in model.named_parameters():
+        param.requires_grad = not name.startswith(prefix)
+        if param.requires_grad:
+            trainable.append((name, param))
+    return trainable
+
+def label_logits(backend, logits):
+    """(emails, labels) logits in backend.classification_labels order"""
+    if backend.hypotheses:
+        # NLI models: the entailment logit of each email's label hypotheses
+        return logits[:, backend.entailment_id].reshape(-1, len(backend.hypotheses)).float()
+    return logits.float()
+
+def batches(examples: list, batch_size: int, seed: int):
+    """Shuffled batches of one epoch (the same for a given seed, so resumed runs replay them)"""
+    order = list(range(len(examples)))
+    random.Random(seed).shuffle(order)
+    return [[examples[i] for i in order[start:start + batch_size]] for start in range(0, len(order), batch_size)]
+
+def accuracy(backend, examples: list, batch_size: int, features=None) -> float:
+    """
+    Fraction of examples whose top zero-shot label is the corrected one
+    Score vectors stored in features (a feature store table) are not recomputed
+    """
+    if not examples:
+        return None
+
+    def compute(texts):
+        return backend.forward(backend.tokenize(texts))
+
+    correct = 0
+    for start in range(0, len(examples), batch_size):
+        batch = examples[start:start + batch_size]
+        texts = [text for _, text in batch]
+        scores = features.get_or_compute(texts, compute) if features is not None else compute(texts)
+        correct += sum(backend.classification_labels[int(row.argmax())] == label for row, (label, _) in zip(scores, batch))
+    return round(correct / len(examples), 4)
+
+def train(job: Job, backend, train_examples: list, parent_pid: int = None) -> dict:
+    """Head-only fine-tuning with periodic checkpoints"""
+    import torch
+
+    spec = job.spec
+    model = backend.model
+    trainable = freeze_encoder(model)
+    optimizer = torch.optim.AdamW([param for _, param in trainable], lr=spec['learning_rate'], weight_decay=0.01)
+
+    epochs = [batches(train_examples, spec['batch_size'], seed) for seed in range(spec['epochs'])]
+    total_steps = sum(map(len, epochs))
+    step, losses = 0, []
+
+    checkpoint_path = job.path(CHECKPOINT_FILE)
+    if os.path.exists(checkpoint_path):
+        checkpoint = torch.load(checkpoint_path, map_location=backend.device)
+        model.load_state_dict(checkpoint['trainable'], strict=False)
+        optimizer.load_state_dict(checkpoint['optimizer'])
+        step, losses = checkpoint['step'], checkpoint['losses']
+        logger.info(f"Resuming from step {step}/{total_steps}")
+
+    def save_checkpoint():
+        tmp_path = checkpoint_path + '.tmp'
+        torch.save({
+            'trainable': {name: param.detach().cpu() for name, param in trainable},
+            'optimizer': optimizer.state_dict(),
+            'step': step,
+            'losses': losses
+        }, tmp_path)
+        os.replace(tmp_path, checkpoint_path)
+
+    model.train()
+    flat = [batch for epoch in epochs for batch in epoch]
+    while step < total_steps:
+        batch = flat[step]
+        encoded = backend.tokenize([text for _, text in batch])
+        encoded = {key: value.to(backend.device) for key, value in encoded.items()}
+        targets = torch.tensor([backend.classification_labels.index(label) for label, _ in batch], device=backend.device)
+        loss = torch.nn.functional.cross_entropy(label_logits(backend, backend._logits(model, encoded)), targets)
+
+        optimizer.zero_grad()
+        loss.backward()
+        optimizer.step()
+        step += 1
+        losses.append(round(loss.item(), 4))
+
+        # Stop with the server that started the job; it resumes on the next start
+        interrupted = parent_pid is not None and os.getppid() != parent_pid
+        if step % spec['checkpoint_steps'] == 0 or step == total_steps or interrupted:
+            save_checkpoint()
+            recent = losses[-spec['checkpoint_steps']:]
+            job.update(state='training', step=step, total_steps=total_steps, loss=round(sum(recent) / len(recent), 4))
+        if interrupted:
+            raise Interrupted()
+
+    model.eval()
+    return {'steps': total_steps, 'final_loss': losses[-1] if losses else None}
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Fine-tune a model version on /train corrections')
+    parser.add_argument('job_dir', help='Job directory created by the server')
+    parser.add_argument('--threads', type=int, default=config.FINETUNE_THREADS, help='Torch threads')
+    parser.add_argument('--nice', type=int, default=config.FINETUNE_NICE, help='Niceness increment')
+    parser.add_argument('--parent-pid', type=int, default=None, help='Stop when this process exits')
+    parser.add_argument('--no-register', dest='register', action='store_false',
+                        help='Keep the model in the job directory without adding it to the registry')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s | %(levelname)-8s | %(message)s')
+    args = parse_args(argv)
+    limit_resources(args.threads, args.nice)
+
+    job = Job(args.job_dir)
+    spec = job.spec
+    if job.status.get('state') in FINISHED_STATES:
+        print(f"Job {spec['job_id']} already {job.status['state']}")
+        return 0
+
+    try:
+        import torch
+        torch.set_num_threads(args.threads)
+
+        classifier = EmailClassifier()
+        # Compiled models are trained through the eager backend and keep their kind when published
+        backend = classifier.load_backend(spec['base_version'], 'student' if spec['backend'] == 'student' else 'eager')
+        # Stored scores belong to the base weights: read them for the baseline only
+        base_features, backend.score_features = backend.score_features, None
+        examples = [
+            (label, text) for label, text in training_examples(classifier, job.corrections())
+            if label in backend.classification_labels
+        ]
+        random.Random(0).shuffle(examples)
+        holdout = examples[:len(examples) // 10] if len(examples) >= 20 else []
+        train_examples = examples[len(holdout):]
+        if not train_examples:
+            raise ValueError(f"No corrections use the labels of {spec['base_version']}")
+
+        if 'holdout_accuracy_before' not in job.status:
+            job.update(state='evaluating', holdout_examples=len(holdout),
+                       holdout_accuracy_before=accuracy(backend, holdout, spec['batch_size'], base_features))
+        logger.info(f"Fine-tuning the head of {backend.version} on {len(train_examples)} corrections "
+                    f"with {args.threads} thread(s)")
+        metrics = train(job, backend, train_examples, args.parent_pid)
+
+        job.update(state='publishing', holdout_accuracy_after=accuracy(backend, holdout, spec['batch_size']))
+        version = f"finetuned-{spec['job_id']}"
+        model_dir = job.path('model')
+        backend.model.save_pretrained(model_dir)
+        backend.tokenizer.save_pretrained(model_dir)
+        # A job resumed after registering (but before recording it) is not registered twice
+        if args.register and classifier.registry.get(version) is None:
+            classifier.registry.register(version, model_dir, {
+                'backend': spec['backend'],
+                'base_version': spec['base_version'],
+                'job_id': spec['job_id'],
+                'train_examples': len(train_examples),
+                **{key: job.status.get(key) for key in
+                   ('holdout_examples', 'holdout_accuracy_before', 'holdout_accuracy_after')},
+                **metrics
+            })
+        if args.register:
+            # The registry keeps its own copy
+            shutil.rmtree(model_dir, ignore_errors=True)
+        if os.path.exists(job.path(CHECKPOINT_FILE)):
+            os.remove(job.path(CHECKPOINT_FILE))
+        job.update(state='published' if args.register else 'trained', version=version, **metrics)
+    except Interrupted:
+        logger.info(f"Server exited; job stopped at step {job.status.get('step')} and resumes from its checkpoint")
+        job.update(state='interrupted')
+        return 1
+    except Exception as e:
+        logger.exception(f"Fine-tuning failed: {str(e)}")
+        job.update(state='failed', error=str(e))
+        return 1
+
+    if not args.register:
+        print(f"Saved {version} to {model_dir}")
+        return 0
+    print(f"Published {version} (holdout accuracy {job.status.get('holdout_accuracy_before')} -> "
+          f"{job.status.get('holdout_accuracy_after')}); shadow it with POST /admin/shadow "
+          f"or swap with POST /admin/models/swap")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,72 @@
+"""
+Shared fixtures for the Automail AI Server tests
+"""
+import os
+import numpy as np
+import pytest
+from config.config import get_config
+from utils import security
+from utils.result_store import ResultStore
+from utils.sender_index import SenderIndex
+from utils.thread_state import ThreadStateStore
+
+@pytest.fixture(scope='session')
+def server(tmp_path_factory):
+    """The app module, imported with its data directory in a temporary folder"""
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp('server'))
+    try:
+        import app
+    finally:
+        os.chdir(cwd)
+    return app
+
+@pytest.fixture
+def client(server, tmp_path, monkeypatch):
+    """Flask test client sending the API key, with empty result, sender and thread stores"""
+    monkeypatch.setattr(server, 'result_store', ResultStore(str(tmp_path / 'results.db')))
+    monkeypatch.setattr(server, 'senders', SenderIndex(str(tmp_path / 'senders.npz')))
+    monkeypatch.setattr(server, 'thread_state', ThreadStateStore(server.classifier))
+    security._rate_limit_storage.clear()
+    test_client = server.app.test_client()
+    test_client.environ_base['HTTP_X_API_KEY'] = get_config().API_KEY
+    return test_client
+
+class FakeClassifier:
+    """Preprocessing of the classifier without a model"""
+
+    def preprocess_email_content(self, content, subject=''):
+        return f"{subject} {content}".strip()
+
+class FakeEncoder:
+    """Embeds texts by their characters, so identical texts match exactly"""
+
+    def embed(self, texts):
+        vectors = np.stack([np.random.default_rng(sum(map(ord, text))).normal(size=16) for text in texts])
+        return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+@pytest.fixture
+def fake_classifier():
+    return FakeClassifier()
+
+@pytest.fixture
+def fake_encoder():
+    return FakeEncoder()
+
+@pytest.fixture
+def make_sender_index(tmp_path):
+    """Sender index factory with small test settings; keyword arguments override them"""
+    def make(**kwargs):
+        options = {'capacity': 64, 'half_life_days': 30, 'min_weight': 3, 'domain_min_weight': 6, 'min_share': 0.9}
+        options.update(kwargs)
+        return SenderIndex(str(tmp_path / 'senders.npz'), **options)
+    return make
+
+@pytest.fixture
+def make_thread_state(fake_classifier):
+    """Thread state factory with small test settings; keyword arguments override them"""
+    def make(**kwargs):
+        options = {'capacity': 8, 'ttl_days': 14, 'max_distance': 48, 'min_confidence': 0.6, 'max_reuse': 3}
+        options.update(kwargs)
+        return ThreadStateStore(fake_classifier, **options)
+    return make
@@ -0,0 +1,42 @@
+"""
+Unit tests for per-user adapter heads
+"""
+import numpy as np
+from utils.adapters import AdapterHead, AdapterStore
+
+def clusters(count, dim=8, seed=0):
+    """Two well-separated groups of unit vectors labelled Work and Personal"""
+    rng = np.random.default_rng(seed)
+    centres = np.eye(dim)[:2]
+    vectors = centres[np.arange(count) % 2] + 0.1 * rng.normal(size=(count, dim))
+    labels = ['Work' if i % 2 == 0 else 'Personal' for i in range(count)]
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32), labels
+
+def test_online_updates_learn_new_labels():
+    head = AdapterHead(8)
+    vectors, labels = clusters(20)
+    head.update(vectors[:10], labels[:10])
+    head.update(vectors[10:], labels[10:])
+
+    predicted = [head.labels[i] for i in head.predict_proba(vectors).argmax(axis=1)]
+    assert predicted == labels
+    assert head.examples == 20
+
+    head.update(vectors[:2] * 0 + np.eye(8)[2], ['Travel', 'Travel'])
+    assert head.labels == ['Work', 'Personal', 'Travel']
+    assert head.params[0].shape == (3, 8)
+
+def test_lru_spills_heads_and_reads_them_back(tmp_path):
+    vectors, labels = clusters(10)
+    one_head = AdapterHead(8, ['Work', 'Personal'], np.zeros((2, 8), np.float32), np.zeros(2, np.float32)).nbytes
+    store = AdapterStore(str(tmp_path), max_bytes=2 * one_head)
+
+    for user in ('a', 'b', 'c'):
+        store.update(user, vectors, labels)
+    assert store.get_status()['users_in_memory'] == 2
+    assert store.stats['evictions'] == 1
+
+    head = store.get('a')  # evicted, reloaded from disk
+    assert store.stats['loads'] == 1
+    assert head.labels == ['Work', 'Personal'] and head.examples == 10
+    assert store.get_status()['memory_bytes'] == 2 * one_head
@@ -0,0 +1,58 @@
+"""
+Unit tests for the inference autotuner
+"""
+import pytest
+from utils import autotune
+from utils.autotune import AutoTuner
+
+class StubClassifier:
+    def __init__(self, model_version='model-a'):
+        self.model_version = model_version
+
+class RecordingClassifier(StubClassifier):
+    """Records how measure calls classify_texts"""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def configure_inference(self, batch_size, workers):
+        pass
+
+    def classify_texts(self, texts, batch_size=None, use_features=True):
+        self.calls.append((len(texts), use_features))
+        return [{'label': 'Work'} for _ in texts]
+
+def measurement(throughput, p95_latency_ms, batch_size=8):
+    return {'torch_threads': 1, 'workers': 1, 'batch_size': batch_size,
+            'throughput': throughput, 'p95_latency_ms': p95_latency_ms}
+
+def test_best_is_fastest_within_the_slo_or_else_the_quickest(tmp_path):
+    tuner = AutoTuner(StubClassifier(), cache_dir=str(tmp_path), latency_slo_ms=100)
+    fast_but_slow_batches = measurement(90.0, 250.0, batch_size=16)
+    within_slo = measurement(60.0, 80.0, batch_size=4)
+    assert tuner._best([fast_but_slow_batches, within_slo, measurement(40.0, 20.0)]) == within_slo
+    assert tuner._best([fast_but_slow_batches, measurement(50.0, 150.0)])['p95_latency_ms'] == 150.0
+
+def test_thread_options_are_powers_of_two_and_all_cores(tmp_path, monkeypatch):
+    tuner = AutoTuner(StubClassifier(), cache_dir=str(tmp_path))
+    monkeypatch.setattr(autotune.os, 'cpu_count', lambda: 6)
+    assert tuner._thread_options() == [1, 2, 4, 6]
+    monkeypatch.setattr(autotune.os, 'cpu_count', lambda: None)
+    assert tuner._thread_options() == [1]
+
+def test_saved_settings_are_only_reused_for_the_same_model(tmp_path):
+    result = {'model_version': 'model-a', 'settings': {'batch_size': 4}}
+    AutoTuner(StubClassifier('model-a'), cache_dir=str(tmp_path)).save(result)
+
+    assert AutoTuner(StubClassifier('model-a'), cache_dir=str(tmp_path)).load() == result
+    assert AutoTuner(StubClassifier('model-b'), cache_dir=str(tmp_path)).load() is None
+
+def test_measure_times_the_model_not_the_feature_store(tmp_path):
+    pytest.importorskip('torch')
+    classifier = RecordingClassifier()
+    result = AutoTuner(classifier, cache_dir=str(tmp_path)).measure(1, 2, 2, ['same text'] * 8)
+
+    assert result['throughput'] > 0
+    assert sum(count for count, _ in classifier.calls) == 2 + 8
+    assert all(use_features is False for _, use_features in classifier.calls)
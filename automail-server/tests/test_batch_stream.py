@@ -0,0 +1,165 @@
+"""
+Tests for NDJSON streaming of /batch-classify
+"""
+import io
+import json
+import threading
+import numpy as np
+import pytest
+from utils.pipeline import InferencePipeline
+from utils.sender_index import SENDER_MODEL_VERSION
+
+NDJSON = 'application/x-ndjson'
+
+def ndjson(*lines):
+    return ''.join((line if isinstance(line, str) else json.dumps(line)) + '\n' for line in lines)
+
+class NumberStages:
+    """Pipeline stages that answer each email with the number it contains"""
+    model_version = 'numbers'
+
+    def preprocess_email_content(self, content, subject=''):
+        return content
+
+    def tokenize(self, texts):
+        return list(texts)
+
+    def forward(self, encoded):
+        return np.array([[float(text)] for text in encoded], dtype=np.float32)
+
+    def postprocess(self, scores):
+        return [{'label': 'Work', 'confidence': 0.9, 'number': int(row[0])} for row in scores]
+
+@pytest.fixture
+def pipeline_model(server, monkeypatch):
+    """A real inference pipeline with batches of 2 behind classify_stream"""
+    def classify_stream(emails, batch_size=None, ramp_up=False):
+        return InferencePipeline(NumberStages(), batch_size=batch_size, ramp_up=ramp_up).run(emails)
+    monkeypatch.setattr(server.classifier, 'model_available', lambda: True)
+    monkeypatch.setattr(server.classifier, 'batch_size', 2)
+    monkeypatch.setattr(server.classifier, 'classify_stream', classify_stream)
+
+def stream_lines(client, body, timeout=10):
+    """POST an NDJSON body and collect the response lines, failing instead of hanging"""
+    lines = []
+    def read():
+        response = client.post('/batch-classify', data=body, content_type=NDJSON, buffered=False)
+        lines.extend(json.loads(chunk) for chunk in response.response)
+    reader = threading.Thread(target=read, daemon=True)
+    reader.start()
+    reader.join(timeout)
+    assert not reader.is_alive(), f"stream stalled after {len(lines)} lines"
+    return lines
+
+def test_lines_are_parsed_validated_and_sanitised(server):
+    body = ndjson(
+        {'content': ' Team meeting ', 'subject': 'Agenda', 'message_id': 'm1', 'sender': 42},
+        '',
+        '{"content": "broken',
+        {'subject': 'no content'},
+        ['not', 'an', 'object']
+    )
+    parsed = list(server.iter_ndjson_emails(io.BytesIO(body.encode('utf-8'))))
+
+    assert [index for index, _, _ in parsed] == [0, 1, 2, 3]
+    assert parsed[0][1] == {'content': 'Team meeting', 'subject': 'Agenda', 'message_id': 'm1'}
+    assert parsed[1][1] is None and parsed[1][2] == 'Email 2 is not valid JSON'
+    assert parsed[2][2] == 'Email 3 missing required field: content'
+    assert parsed[3][2] == 'Email 4 must be an object with content and subject'
+
+def test_results_and_line_errors_come_back_in_input_order(client):
+    body = ndjson(
+        {'content': 'Team meeting about the project deadline', 'message_id': 'm1'},
+        'not json',
+        {'content': 'Win a free prize, click here now'},
+        {'content': 42}
+    )
+    response = client.post('/batch-classify', data=body, content_type=NDJSON)
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    assert response.status_code == 200 and response.mimetype == NDJSON
+    assert [line.get('index') for line in lines[:-1]] == [0, 1, 2, 3]
+    assert lines[0]['label'] and lines[0]['message_id'] == 'm1'
+    assert lines[1]['error'] == 'Invalid email' and 'not valid JSON' in lines[1]['message']
+    assert 'label' in lines[2]
+    assert lines[3]['message'] == 'Email 4 content must be a string'
+    assert lines[-1]['done'] is True and lines[-1]['total_emails'] == 2
+
+class RecordingBody(io.BytesIO):
+    """Request body that records how far the server has read it"""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.read_up_to = 0
+
+    def readline(self, *args):
+        line = super().readline(*args)
+        self.read_up_to = self.tell()
+        return line
+
+    def read(self, *args):
+        data = super().read(*args)
+        self.read_up_to = self.tell()
+        return data
+
+def test_prescreen_answers_stream_back_before_the_body_is_read(client, server, monkeypatch):
+    api_key_id = server.get_api_key_id(server.config.API_KEY)
+    for _ in range(10):
+        server.senders.update(api_key_id, 'news@shop.example', 'Shopping')
+
+    # The model holds its results back until the test has seen the first line
+    release, timed_out = threading.Event(), []
+    def held_model(emails, batch_size=None, ramp_up=False):
+        for email in emails:
+            if not release.wait(2):
+                timed_out.append(email)
+            yield {'label': 'Work', 'confidence': 0.9, 'model_version': 'held'}
+    monkeypatch.setattr(server.classifier, 'model_available', lambda: True)
+    monkeypatch.setattr(server.classifier, 'classify_stream', held_model)
+
+    emails = [{'content': 'Project plan', 'sender': 'boss@corp.example'}] * 3
+    data = ndjson({'content': 'Weekly deals', 'sender': 'news@shop.example'}, *emails).encode('utf-8')
+    body = RecordingBody(data)
+    response = client.post('/batch-classify', input_stream=body, content_length=len(data),
+                           content_type=NDJSON, buffered=False)
+    chunks = iter(response.response)
+
+    first = json.loads(next(chunks))
+    assert timed_out == []
+    assert first['index'] == 0 and first['model_version'] == SENDER_MODEL_VERSION
+    assert body.read_up_to < len(data)
+
+    release.set()
+    lines = [json.loads(chunk) for chunk in chunks]
+    assert [line['model_version'] for line in lines[:-1]] == ['held'] * 3
+    assert [line['index'] for line in lines[:-1]] == [1, 2, 3] and lines[-1]['total_emails'] == 4
+
+def test_streams_longer_than_the_waiting_limit_finish(client, pipeline_model):
+    # More lines need the model than may wait for it (4 batches of 2)
+    lines = stream_lines(client, ndjson(*({'content': str(i)} for i in range(40))))
+    assert [line['number'] for line in lines[:-1]] == list(range(40))
+    assert lines[-1]['total_emails'] == 40
+
+def test_large_streams_answer_every_line_in_order_while_reading_ahead_a_little(client, pipeline_model):
+    lines_in = [{'content': str(i)} if i % 50 != 49 else 'not json' for i in range(600)]
+    data = ndjson(*lines_in).encode('utf-8')
+    body = RecordingBody(data)
+    lines, read_at_first_line = [], []
+
+    def read():
+        response = client.post('/batch-classify', input_stream=body, content_length=len(data),
+                               content_type=NDJSON, buffered=False)
+        for chunk in response.response:
+            if not read_at_first_line:
+                read_at_first_line.append(body.read_up_to)
+            lines.append(json.loads(chunk))
+    reader = threading.Thread(target=read, daemon=True)
+    reader.start()
+    reader.join(10)
+    assert not reader.is_alive(), f"stream stalled after {len(lines)} lines"
+
+    assert [line['index'] for line in lines[:-1]] == list(range(600))
+    assert all(line.get('number') == i or 'error' in line for i, line in enumerate(lines[:-1]))
+    assert sum('error' in line for line in lines[:-1]) == 12 and lines[-1]['total_emails'] == 588
+    # The first result goes out before more lines than may wait for the model (4 batches of 2) are read
+    assert read_at_first_line[0] <= len(ndjson(*lines_in[:9]).encode('utf-8'))
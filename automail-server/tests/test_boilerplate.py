@@ -0,0 +1,44 @@
+"""
+Unit tests for boilerplate stripping
+"""
+from utils.boilerplate import BoilerplateStripper
+
+def test_reply_history_and_signatures_are_removed():
+    stripper = BoilerplateStripper()
+    gmail = (
+        "Sounds good, see you Tuesday.\n\n"
+        "On Mon, Jun 3, 2024 at 10:00 AM John Doe <\njohn@example.com> wrote:\n"
+        "> Can we meet Tuesday?\n> Thanks"
+    )
+    outlook = (
+        "Approved, please go ahead.\n\nBest regards,\nAnn\nACME Corp | +1 555 0100\n\n"
+        "________________________________\nFrom: Bob\nSent: Monday\nTo: Ann\nSubject: PO 12\n\nPlease approve PO 12."
+    )
+    disclaimer = "Contract attached.\n-- \nJane Smith\nCONFIDENTIALITY NOTICE: This email is confidential."
+
+    assert stripper.strip(gmail) == 'Sounds good, see you Tuesday.'
+    assert stripper.strip(outlook) == 'Approved, please go ahead.'
+    assert stripper.strip(disclaimer) == 'Contract attached.'
+
+    info = stripper.get_info()
+    assert info['stripped'] == 3 and info['removed']['reply_history'] == 1 and info['removed']['signature'] == 2
+    assert info['bytes_removed'] > 0 and info['tokens_removed'] > 0
+
+def test_forwarded_bodies_are_kept_without_their_headers_and_footers():
+    stripper = BoilerplateStripper()
+    forwarded = (
+        "FYI\n\n---------- Forwarded message ---------\nFrom: Shop <ship@shop.example>\nDate: Mon, Jun 3\n"
+        "Subject: Your order shipped\nTo: <me@example.com>\n\nYour order #123 has shipped.\n\n"
+        "To unsubscribe click here.\nYou are receiving this because you ordered."
+    )
+    newsletter = "View this email in your browser\nThis week: ten autumn recipes\nUnsubscribe | Manage preferences"
+
+    assert stripper.strip(forwarded) == 'FYI\n\nYour order #123 has shipped.'
+    assert stripper.strip(newsletter) == 'This week: ten autumn recipes'
+
+def test_bodies_are_never_emptied():
+    stripper = BoilerplateStripper()
+    assert stripper.strip('> only quoted\n> lines') == '> only quoted\n> lines'
+    assert stripper.strip('Best regards,\nAnn') == 'Best regards,\nAnn'
+    assert stripper.strip('On Friday we meet.\nThanks') == 'On Friday we meet.\nThanks'
+    assert stripper.stats['stripped'] == 0
@@ -0,0 +1,57 @@
+"""
+Tests for offline bulk classification checkpoints and resume
+"""
+import json
+import bulk_classify
+
+def write_mbox(path, count):
+    with open(path, 'w') as f:
+        for i in range(count):
+            f.write(
+                f"From sender{i}@example.com Mon Jun  3 10:00:00 2024\n"
+                f"Message-ID: <m{i}@example.com>\nSubject: Meeting {i}\n\n"
+                f"Team meeting about project {i}\n\n"
+            )
+
+def run(tmp_path, *options):
+    args = bulk_classify.parse_args([
+        str(tmp_path / 'archive.mbox'), '-o', str(tmp_path / 'results.jsonl'),
+        '--rules-only', '--workers', '1', '--chunk-size', '2', '--checkpoint-every', '2', *options
+    ])
+    return bulk_classify.run(args)
+
+def read_lines(tmp_path):
+    with open(tmp_path / 'results.jsonl') as f:
+        return [json.loads(line) for line in f]
+
+def test_resume_continues_after_the_checkpoint(tmp_path):
+    write_mbox(tmp_path / 'archive.mbox', 7)
+
+    assert run(tmp_path, '--limit', '3')['processed'] == 3
+    checkpoint = json.loads((tmp_path / 'results.jsonl.checkpoint').read_text())
+    assert checkpoint['processed'] == 3
+
+    # A line written after the checkpoint (e.g. before a crash) is dropped on resume
+    with open(tmp_path / 'results.jsonl', 'a') as f:
+        f.write('{"index": 99, "torn": true}\n')
+
+    stats = run(tmp_path)
+    lines = read_lines(tmp_path)
+    assert stats['processed'] == 7 and stats['stages']['write']['messages'] == 4
+    assert [line['index'] for line in lines] == list(range(7))
+    assert lines[4]['message_id'] == '<m4@example.com>' and lines[4]['label'] == 'Work'
+
+def test_limit_counts_the_messages_of_this_run(tmp_path):
+    write_mbox(tmp_path / 'archive.mbox', 7)
+
+    assert run(tmp_path, '--limit', '3')['processed'] == 3
+    stats = run(tmp_path, '--limit', '3')
+    assert stats['processed'] == 6 and stats['stages']['write']['messages'] == 3
+    assert run(tmp_path, '--limit', '3')['processed'] == 7
+    assert [line['index'] for line in read_lines(tmp_path)] == list(range(7))
+
+def test_no_resume_starts_over(tmp_path):
+    write_mbox(tmp_path / 'archive.mbox', 4)
+    run(tmp_path)
+    assert run(tmp_path, '--no-resume')['processed'] == 4
+    assert [line['index'] for line in read_lines(tmp_path)] == list(range(4))
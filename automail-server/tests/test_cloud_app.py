@@ -0,0 +1,49 @@
+"""
+Tests for model loading, warm-up and readiness of the Cloud Run server
+"""
+import pytest
+import cloud_app
+import utils.classifier
+
+class StubClassifier:
+    def __init__(self, loads=True):
+        self.loads = loads
+        self.warmed = False
+        self.warmed_under_lock = None
+
+    def load_model(self):
+        return self.loads
+
+    def warm_up(self):
+        self.warmed_under_lock = cloud_app._classifier_lock.locked()
+        self.warmed = True
+
+    @property
+    def is_ready(self):
+        return self.loads and (self.warmed or not cloud_app.config.WARMUP_ENABLED)
+
+@pytest.fixture
+def load_with(monkeypatch):
+    def load(stub):
+        monkeypatch.setattr(cloud_app, 'classifier', None)
+        monkeypatch.setattr(cloud_app, '_load_error', None)
+        monkeypatch.setattr(utils.classifier, 'get_classifier', lambda: stub)
+        cloud_app.get_or_load_classifier()
+        return cloud_app.app.test_client().get('/ready')
+    return load
+
+def test_model_is_warmed_outside_the_lock_before_it_is_ready(load_with, monkeypatch):
+    monkeypatch.setattr(cloud_app.config, 'WARMUP_ENABLED', True)
+    stub = StubClassifier()
+    response = load_with(stub)
+    assert stub.warmed and stub.warmed_under_lock is False
+    assert response.status_code == 200 and response.get_json()['ready'] is True
+
+def test_warm_up_follows_the_config(load_with, monkeypatch):
+    monkeypatch.setattr(cloud_app.config, 'WARMUP_ENABLED', False)
+    stub = StubClassifier()
+    assert load_with(stub).status_code == 200 and not stub.warmed
+
+def test_ready_reports_a_failed_load(load_with):
+    response = load_with(StubClassifier(loads=False))
+    assert response.status_code == 503 and response.get_json()['error'] == 'AI model failed to load'
@@ -0,0 +1,73 @@
+"""
+Unit tests for the compiled backend's eager fallback
+"""
+import pytest
+
+torch = pytest.importorskip('torch')
+
+from utils.compiled_backend import CompiledBackend
+
+class TinyNLI(torch.nn.Module):
+    """Two-logit model with the interface of a transformers NLI model"""
+
+    class config:
+        label2id = {'entailment': 0, 'contradiction': 1}
+
+    def __init__(self):
+        super().__init__()
+        self.scale = torch.nn.Parameter(torch.ones(1))
+
+    def forward(self, input_ids, attention_mask):
+        total = (input_ids * attention_mask).sum(dim=1, keepdim=True).float() * self.scale
+        return (torch.cat([total, -total], dim=1),)
+
+class StubTokenizer:
+    pad_token_id = 0
+
+def make_backend(tmp_path, mode):
+    return CompiledBackend(
+        'tiny', 'tiny', TinyNLI(), StubTokenizer(), torch.device('cpu'),
+        mode=mode, seq_buckets=[16], batch_sizes=[1], cache_dir=str(tmp_path)
+    )
+
+def encoded_batch(backend, texts=1, seq_len=10):
+    ids = torch.arange(1, seq_len + 1).repeat(texts * len(backend.hypotheses), 1)
+    return {'input_ids': ids, 'attention_mask': torch.ones_like(ids)}
+
+def test_failed_trace_falls_back_to_eager_once(tmp_path, monkeypatch):
+    backend = make_backend(tmp_path, 'torchscript')
+    traces = []
+
+    def failing_trace(*args, **kwargs):
+        traces.append(args)
+        raise RuntimeError('unsupported op')
+
+    monkeypatch.setattr(torch.jit, 'trace', failing_trace)
+    encoded = encoded_batch(backend)
+    expected = backend.model(**encoded)[0]
+
+    with torch.no_grad():
+        assert torch.equal(backend._logits(backend.model, encoded), expected)
+        assert torch.equal(backend._logits(backend.model, encoded), expected)
+    assert len(traces) == 1 and backend.get_info()['failed_shapes'] == [[1, 16]]
+    assert backend.compile_stats['eager_calls'] == 2 and backend.compile_stats['compiled_calls'] == 0
+
+def test_unavailable_compiler_falls_back_to_eager(tmp_path, monkeypatch):
+    backend = make_backend(tmp_path, 'inductor')
+
+    def unavailable(*args, **kwargs):
+        raise RuntimeError('torch.compile is not supported on this platform')
+
+    monkeypatch.setattr(torch, 'compile', unavailable)
+    encoded = encoded_batch(backend)
+    with torch.no_grad():
+        assert torch.equal(backend._logits(backend.model, encoded), backend.model(**encoded)[0])
+    assert backend.compile_stats['eager_calls'] == 1
+
+def test_shapes_without_a_graph_run_eagerly(tmp_path, monkeypatch):
+    backend = make_backend(tmp_path, 'torchscript')
+    monkeypatch.setattr(torch.jit, 'trace', pytest.fail)
+    with torch.no_grad():
+        backend._logits(backend.model, encoded_batch(backend, texts=3))
+        backend._logits(backend.model, encoded_batch(backend, seq_len=40))
+    assert backend.compile_stats['eager_calls'] == 2 and not backend._failed
@@ -0,0 +1,40 @@
+"""
+Tests for /train and correction lookups across the classification endpoints
+"""
+import json
+import pytest
+from utils.corrections import CORRECTION_MODEL_VERSION, CorrectionIndex
+
+EMAIL = {'content': 'Weekly digest of community posts', 'subject': 'Digest'}
+
+@pytest.fixture
+def corrections(server, tmp_path, monkeypatch):
+    index = CorrectionIndex(server.classifier, root=str(tmp_path / 'corrections'), threshold=0.9, global_threshold=0.99)
+    monkeypatch.setattr(server, 'corrections', index)
+    return index
+
+def test_train_without_encoder_counts_corrections_once(client, corrections, monkeypatch):
+    monkeypatch.setattr(corrections, '_load_embedder', lambda: None)
+    correction = {'email_id': '1', 'correct_label': 'Work', 'sender': 'boss@corp.example', **EMAIL}
+
+    for _ in range(2):
+        response = client.post('/train', json={'corrections': [correction]})
+        body = response.get_json()
+        assert response.status_code == 200
+        assert body['corrections_indexed'] == 0 and body['corrections_logged'] == 1 and body['senders_updated'] == 1
+
+def test_corrections_answer_on_every_endpoint(client, corrections, server, fake_encoder, monkeypatch):
+    corrections.embedder, corrections.status = fake_encoder, 'ready'
+    shadowed = []
+    monkeypatch.setattr(server.shadow, 'submit', lambda *args: shadowed.append(args))
+    assert client.post('/train', json={'corrections': [{'correct_label': 'Newsletters', **EMAIL}]}).status_code == 200
+
+    single = client.post('/classify', json=EMAIL).get_json()
+    batch = client.post('/batch-classify', json={'emails': [EMAIL]}).get_json()['results'][0]
+    stream = client.post('/batch-classify', data=json.dumps(EMAIL) + '\n', content_type='application/x-ndjson')
+    streamed = json.loads(stream.get_data(as_text=True).splitlines()[0])
+    job = server.process_job_batch(server.get_api_key_id(server.config.API_KEY), [EMAIL])[0]
+
+    for result in (single, batch, streamed, job):
+        assert result['label'] == 'Newsletters' and result['model_version'] == CORRECTION_MODEL_VERSION
+    assert shadowed == []
@@ -0,0 +1,39 @@
+"""
+Unit tests for the corrections log
+"""
+import os
+from utils.corrections_log import CorrectionsLog
+
+def corrections(*items):
+    return [{'email_id': email_id, 'correct_label': label, 'content': f'body of {email_id}'} for email_id, label in items]
+
+def test_compaction_keeps_the_latest_label_per_email(tmp_path):
+    log = CorrectionsLog(str(tmp_path), segment_bytes=200, compact_segments=100)
+    log.append('a', corrections(('1', 'Work'), ('2', 'Spam')))
+    log.append('b', corrections(('1', 'Personal')))
+    log.append('a', corrections(('1', 'Finance')))
+    log.append('a', [{'correct_label': 'Work', 'content': ''}])
+    assert log.last_seq == 4
+    assert log.get_status()['segments'] > 1
+
+    assert log.compact()
+    log.append('a', corrections(('2', 'Travel')))
+
+    exported = log.export(str(tmp_path / 'export'))
+    rows = [(key, email_id, label) for key, email_id, label in zip(exported.api_key_id, exported.email_id, exported.label)]
+    assert rows == [('b', '1', 'Personal'), ('a', '1', 'Finance'), ('a', '2', 'Travel')]
+    assert exported.last_seq == 5
+    assert exported.content[1] == 'body of 1'
+
+def test_reopen_drops_a_torn_tail_and_continues_the_sequence(tmp_path):
+    log = CorrectionsLog(str(tmp_path))
+    log.append('a', corrections(('1', 'Work'), ('2', 'Spam')))
+    segment = os.path.join(str(tmp_path), sorted(os.listdir(str(tmp_path)))[0])
+    with open(segment, 'ab') as f:
+        f.write(b'{"seq": 3, "label": "Wo')
+
+    reopened = CorrectionsLog(str(tmp_path))
+    assert reopened.last_seq == 2
+    reopened.append('a', corrections(('3', 'Travel')))
+    assert reopened.last_seq == 3
+    assert len(reopened.export(str(tmp_path / 'export'))) == 3
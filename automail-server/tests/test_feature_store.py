@@ -0,0 +1,77 @@
+"""
+Unit tests for the feature store
+"""
+import os
+import numpy as np
+from utils.feature_store import FeatureStore, FeatureTable, ROWS_FILE
+from utils.pipeline import InferencePipeline
+
+class CountingClassifier:
+    """Pipeline stages that record which texts reached the forward pass"""
+    model_version = 'fake'
+
+    def __init__(self):
+        self.forwarded = []
+
+    def preprocess_email_content(self, content, subject=''):
+        return content.strip()
+
+    def tokenize(self, texts):
+        return list(texts)
+
+    def forward(self, encoded):
+        self.forwarded.extend(encoded)
+        return np.array([[len(text), 1.0] for text in encoded], dtype=np.float32)
+
+    def postprocess(self, scores):
+        return [{'label': 'Work', 'length': int(row[0])} for row in scores]
+
+def test_rows_survive_a_reopen_and_a_torn_append(tmp_path):
+    table = FeatureTable(str(tmp_path))
+    table.put(['a', 'b'], np.array([[0.25, 1.0], [0.5, 2.0]]))
+    table.put(['b', 'c'], np.array([[9.0, 9.0], [0.75, 3.0]]))
+    assert len(table) == 3
+
+    # A row written without its key is ignored and overwritten by the next append
+    with open(os.path.join(str(tmp_path), ROWS_FILE), 'ab') as f:
+        f.write(np.zeros(2, dtype=np.float16).tobytes())
+    reopened = FeatureTable(str(tmp_path))
+    assert len(reopened) == 3
+    reopened.put(['d'], np.array([[1.5, 4.0]]))
+
+    rows = FeatureTable(str(tmp_path)).get(['c', 'x', 'b', 'd'])
+    assert rows[1] is None
+    assert rows[0].tolist() == [0.75, 3.0]
+    assert rows[2].tolist() == [0.5, 2.0]
+    assert rows[3].tolist() == [1.5, 4.0]
+
+def test_tables_sharing_a_directory_append_after_each_other(tmp_path):
+    # Two processes (e.g. the server and bulk_classify.py) with the same table open
+    server, bulk = FeatureTable(str(tmp_path)), FeatureTable(str(tmp_path))
+    server.put(['a'], np.array([[0.25, 1.0]]))
+    bulk.put(['b', 'a'], np.array([[0.5, 2.0], [9.0, 9.0]]))
+    server.put(['c'], np.array([[0.75, 3.0]]))
+
+    # A writer picks up the other's rows before appending its own
+    rows = server.get(['a', 'b', 'c'])
+    assert [row.tolist() for row in rows] == [[0.25, 1.0], [0.5, 2.0], [0.75, 3.0]]
+    assert len(FeatureTable(str(tmp_path))) == 3
+    assert FeatureTable(str(tmp_path)).get(['c'])[0].tolist() == [0.75, 3.0]
+
+def test_a_full_table_stops_storing(tmp_path):
+    table = FeatureTable(str(tmp_path), max_rows=2)
+    table.put(['a', 'b', 'c'], np.array([[1.0], [2.0], [3.0]]))
+    assert len(table) == 2 and table.get(['c']) == [None]
+    assert table.get_info()['dropped'] == 1
+
+def test_pipeline_only_forwards_texts_without_stored_scores(tmp_path):
+    features = FeatureStore(str(tmp_path)).table('scores', 'org/model@labels')
+    classifier = CountingClassifier()
+    emails = [{'content': 'one'}, {'content': ' '}, {'content': 'three'}]
+
+    first = list(InferencePipeline(classifier, batch_size=2, features=features).run(emails))
+    second = list(InferencePipeline(classifier, batch_size=2, features=features).run(emails + [{'content': 'four'}]))
+
+    assert classifier.forwarded == ['one', 'three', 'four']
+    assert [r.get('length') for r in second] == [r.get('length') for r in first] + [4]
+    assert second[1]['label'] == 'Review'
@@ -0,0 +1,39 @@
+"""
+Unit tests for fine-tuning job bookkeeping
+"""
+import os
+import json
+from utils.corrections_log import CorrectionsLog, CorrectionColumns
+from utils.finetune import FineTuneRunner, DATA_DIR, JOB_FILE
+
+class FakeClassifier:
+    model_version = 'facebook/bart-large-mnli'
+
+    def backend_kind(self, version, kind=None):
+        return 'eager'
+
+def make_runner(tmp_path, min_corrections=3):
+    log = CorrectionsLog(str(tmp_path / 'log'))
+    runner = FineTuneRunner(FakeClassifier(), log, root=str(tmp_path / 'finetune'), min_corrections=min_corrections)
+    runner.launched = []
+    runner._launch = runner.launched.append
+    return runner
+
+def test_jobs_start_at_the_threshold_and_export_corrections(tmp_path):
+    runner = make_runner(tmp_path)
+    runner.log.append('key', [{'email_id': str(i), 'correct_label': 'Work', 'content': f'email {i}'} for i in range(2)])
+    assert runner.maybe_start() is None
+
+    runner.log.append('key', [{'email_id': '1', 'correct_label': 'Spam', 'content': 'win a prize'}])
+    job = runner.maybe_start()
+    assert job['corrections'] == 2 and job['base_version'] == 'facebook/bart-large-mnli'
+    assert runner.launched == [runner.job_dir]
+    assert runner.pending == 0
+
+    corrections = CorrectionColumns(os.path.join(runner.job_dir, DATA_DIR))
+    assert list(corrections.label) == ['Work', 'Spam']
+    with open(os.path.join(runner.job_dir, JOB_FILE)) as f:
+        assert json.load(f)['job_id'] == job['job_id']
+
+    # The consumed position survives a restart, so the same corrections do not trigger again
+    assert make_runner(tmp_path).pending == 0
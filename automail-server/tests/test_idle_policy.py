@@ -0,0 +1,55 @@
+"""
+Unit tests for idle model unloading
+"""
+import time
+import pytest
+from utils.idle_policy import IdlePolicy
+
+class FakeClassifier:
+    """Lifecycle attributes of EmailClassifier used by the idle policy"""
+
+    def __init__(self, idle_for=0.0):
+        self.is_loaded = True
+        self.is_loading = False
+        self.weights_mapped = False
+        self.last_used = time.time() - idle_for
+        self.idle_stats = {'unloads': 0}
+        self.unload_modes = []
+
+    def unload(self, mode):
+        self.unload_modes.append(mode)
+        self.idle_stats['unloads'] += 1
+        if mode == 'mmap':
+            self.weights_mapped = True
+        else:
+            self.is_loaded = False
+        return True
+
+def test_recently_used_model_stays_loaded():
+    classifier = FakeClassifier(idle_for=5)
+    policy = IdlePolicy(classifier, idle_seconds=60, mode='release')
+
+    assert policy.check() is False
+    assert classifier.unload_modes == []
+
+def test_idle_model_is_released_once():
+    classifier = FakeClassifier(idle_for=120)
+    policy = IdlePolicy(classifier, idle_seconds=60, mode='release')
+
+    assert policy.check() is True
+    assert policy.check() is False
+    assert classifier.unload_modes == ['release']
+    assert policy.get_status()['unloads'] == 1
+
+def test_mmap_mode_remaps_only_once():
+    classifier = FakeClassifier(idle_for=120)
+    policy = IdlePolicy(classifier, idle_seconds=60, mode='mmap')
+
+    assert policy.check() is True
+    assert policy.check() is False
+    assert classifier.unload_modes == ['mmap']
+
+def test_disabled_policy_and_invalid_mode():
+    assert IdlePolicy(FakeClassifier(), idle_seconds=0).enabled is False
+    with pytest.raises(ValueError):
+        IdlePolicy(FakeClassifier(), idle_seconds=60, mode='swap')
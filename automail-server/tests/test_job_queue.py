@@ -0,0 +1,86 @@
+"""
+Unit tests for the durable bulk classification job queue
+"""
+import pytest
+from utils.job_queue import JobQueue, JobConflictError
+
+def fake_classify(api_key, emails):
+    return [{'label': 'Work', 'confidence': 0.9, 'reasoning': email['content']} for email in emails]
+
+def make_queue(tmp_path, process_batch=fake_classify):
+    return JobQueue(process_batch, db_path=str(tmp_path / 'jobs.db'), workers=1, chunk_size=2)
+
+def make_emails(count):
+    return [{'content': f'email {i}', 'subject': ''} for i in range(count)]
+
+def test_job_runs_to_completion_with_ordered_results(tmp_path):
+    queue = make_queue(tmp_path)
+    job, created = queue.submit('key-a', make_emails(5))
+    assert created and job['status'] == 'queued'
+
+    while queue.process_next():
+        pass
+
+    job = queue.get_job('key-a', job['job_id'])
+    assert job['status'] == 'completed'
+    assert job['completed'] == 5
+
+    page = queue.get_results('key-a', job['job_id'], offset=3, limit=10)
+    assert [item['index'] for item in page] == [3, 4]
+    assert page[0]['reasoning'] == 'email 3'
+
+def test_idempotency_key_returns_existing_job(tmp_path):
+    queue = make_queue(tmp_path)
+    first, created = queue.submit('key-a', make_emails(3), 'backfill-1')
+    again, created_again = queue.submit('key-a', make_emails(3), 'backfill-1')
+
+    assert created and not created_again
+    assert first['job_id'] == again['job_id']
+
+    with pytest.raises(JobConflictError):
+        queue.submit('key-a', make_emails(4), 'backfill-1')
+
+    # Keys are scoped per API key
+    _, created_other = queue.submit('key-b', make_emails(3), 'backfill-1')
+    assert created_other
+
+def test_restart_resumes_without_reprocessing(tmp_path):
+    processed = []
+
+    def counting_classify(api_key, emails):
+        processed.extend(email['content'] for email in emails)
+        return fake_classify(api_key, emails)
+
+    queue = make_queue(tmp_path, counting_classify)
+    job, _ = queue.submit('key-a', make_emails(6))
+    queue.process_next()
+
+    # Simulate a crash while the next chunk is in flight
+    queue._claim()
+
+    restarted = make_queue(tmp_path, counting_classify)
+    while restarted.process_next():
+        pass
+
+    assert sorted(processed) == sorted(f'email {i}' for i in range(6))
+    assert restarted.get_job('key-a', job['job_id'])['status'] == 'completed'
+
+def test_failing_items_are_retried_then_given_review(tmp_path):
+    def broken_classify(api_key, emails):
+        raise RuntimeError('model crashed')
+
+    queue = make_queue(tmp_path, broken_classify)
+    job, _ = queue.submit('key-a', make_emails(1))
+    while queue.process_next():
+        pass
+
+    result = queue.get_results('key-a', job['job_id'])[0]
+    assert result['status'] == 'done'
+    assert result['label'] == 'Review'
+
+def test_jobs_are_private_to_their_api_key(tmp_path):
+    queue = make_queue(tmp_path)
+    job, _ = queue.submit('key-a', make_emails(1))
+
+    assert queue.get_job('key-b', job['job_id']) is None
+    assert queue.get_results('key-b', job['job_id']) is None
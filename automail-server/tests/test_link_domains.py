@@ -0,0 +1,37 @@
+"""
+Unit tests for link domain hints
+"""
+from utils.link_domains import DomainTrie, LinkHints, LINK_MODEL_VERSION, link_host, registrable_domain
+from utils.classifier import EmailClassifier
+
+def test_trie_matches_the_longest_listed_suffix():
+    trie = DomainTrie({'amazon.com': 'Shopping', 'aws.amazon.com': 'Technical'})
+    assert trie.match('smile.amazon.com') == 'Shopping'
+    assert trie.match('console.aws.amazon.com') == 'Technical'
+    assert trie.match('amazon.com.evil.example') is None
+    assert trie.match('notamazon.com') is None
+
+def test_hosts_and_registrable_domains():
+    assert link_host('https://WWW.Shop.example/cart?id=1') == 'shop.example'
+    assert link_host('http://localhost/path') is None
+    assert registrable_domain('mail.shop.co.uk') == 'shop.co.uk'
+    assert registrable_domain('deals.shop.example') == 'shop.example'
+
+def test_hints_need_enough_links_to_one_category():
+    hints = LinkHints({'paypal.com': 'Finance', 'twitter.com': 'Social-Media'}, min_links=3, min_share=0.7)
+    result = hints.result(['paypal.com', 'www.paypal.com', 'paypal.com', 'twitter.com'])
+    assert result['label'] == 'Finance' and result['model_version'] == LINK_MODEL_VERSION
+
+    assert hints.result(['paypal.com', 'paypal.com']) is None
+    assert hints.result(['paypal.com'] * 3 + ['blog.example'] * 3) is None
+
+def test_preprocessing_removes_urls_and_keeps_their_hosts():
+    classifier = EmailClassifier.__new__(EmailClassifier)
+    classifier.link_hints = LinkHints({'ebay.com': 'Shopping'}, min_links=2, min_share=0.7)
+    classifier.boilerplate = classifier.long_emails = None
+    content = 'Your order shipped https://www.ebay.com/itm/1 track at https://pages.ebay.com/t?id=2'
+
+    text, hosts = classifier.preprocess_with_links(content, 'Order')
+    assert 'http' not in text and hosts == ['ebay.com', 'pages.ebay.com']
+    assert classifier.preprocess_email_content(content, 'Order') == text
+    assert classifier.screen_email(content, 'Order')[1]['label'] == 'Shopping'
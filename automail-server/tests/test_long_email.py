@@ -0,0 +1,70 @@
+"""
+Unit tests for long email chunking and score pooling
+"""
+import numpy as np
+from utils.long_email import HEAD_WEIGHT, LongEmailChunker, pool_scores
+from utils.pipeline import InferencePipeline
+
+WINDOW = 100
+
+def filler(count):
+    return ' '.join(f"word{i}" for i in range(count))
+
+def test_chunks_are_head_densest_window_and_tail():
+    chunker = LongEmailChunker(['invoice', 'payment', 'action required'], window=WINDOW, max_chunks=3)
+    text = f"Subject line {filler(60)} invoice payment due action required {filler(60)} the very end"
+
+    chunks = chunker.chunks(text, 'Subject line')
+    assert len(chunks) == 3
+    assert chunks[0] == text[:WINDOW].strip()
+    assert 'invoice' in chunks[1] and chunks[1].startswith('Subject line ')
+    assert chunks[2].endswith('the very end')
+    assert all(len(chunk) <= WINDOW for chunk in chunks)
+
+    assert chunker.chunks('short text', 'Subject') == ['short text']
+
+def test_cost_is_capped_however_long_the_email():
+    chunker = LongEmailChunker(['invoice'], window=WINDOW, max_chunks=4)
+    text = ' '.join(['invoice ' + filler(20)] * 200)
+    assert len(text) > 16 * 1024
+
+    chunks = chunker.chunks(text, '')
+    assert len(chunks) == 4 and sum(len(chunk) for chunk in chunks) <= 4 * WINDOW
+    assert LongEmailChunker(['invoice'], window=WINDOW, max_chunks=1).chunks(text) == [text[:WINDOW].strip()]
+
+def test_pooling_weights_the_head():
+    scores = np.array([[0.8, 0.2], [0.2, 0.8], [0.2, 0.8]], dtype=np.float32)
+    pooled = pool_scores(scores)
+    assert np.allclose(pooled, (HEAD_WEIGHT * scores[0] + scores[1] + scores[2]) / (HEAD_WEIGHT + 2))
+    assert np.array_equal(pool_scores(scores[:1]), scores[0])
+
+class FakeClassifier:
+    model_version = 'fake'
+
+    def __init__(self):
+        self.batches = []
+
+    def tokenize(self, texts):
+        return list(texts)
+
+    def forward(self, encoded):
+        self.batches.append(len(encoded))
+        return np.array([[1.0, 0.0] if 'spam' in text else [0.0, 1.0] for text in encoded], dtype=np.float32)
+
+    def postprocess(self, scores):
+        return [{'label': 'Spam' if row[0] > row[1] else 'Work', 'spam_share': float(row[0])} for row in scores]
+
+def test_pipeline_scores_all_chunks_in_one_pass_and_pools_them():
+    classifier = FakeClassifier()
+    chunked = {'long': ['spam head', 'spam middle', 'work tail'], 'short': ['work']}
+
+    def screen(content, subject):
+        return chunked[content], None
+
+    pipeline = InferencePipeline(classifier, batch_size=8, screen=screen)
+    results = list(pipeline.run([{'content': 'long'}, {'content': 'short'}]))
+
+    assert classifier.batches == [4]
+    assert results[0]['label'] == 'Spam'
+    assert np.isclose(results[0]['spam_share'], (HEAD_WEIGHT + 1) / (HEAD_WEIGHT + 2))
+    assert results[1]['label'] == 'Work'
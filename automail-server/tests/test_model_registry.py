@@ -0,0 +1,44 @@
+"""
+Unit tests for the versioned model registry
+"""
+import os
+import pytest
+from utils.model_registry import ModelRegistry
+
+@pytest.fixture
+def registry(tmp_path):
+    return ModelRegistry(str(tmp_path / 'registry'))
+
+def test_local_versions_are_copied_and_hub_ids_recorded(registry, tmp_path):
+    source = tmp_path / 'finetuned'
+    source.mkdir()
+    (source / 'config.json').write_text('{}')
+
+    local = registry.register('v2', str(source), {'accuracy': 0.91})
+    hub = registry.register('bart', 'facebook/bart-large-mnli')
+
+    assert local['kind'] == 'local'
+    assert os.path.isfile(os.path.join(registry.resolve('v2'), 'config.json'))
+    assert hub['kind'] == 'hub'
+    assert registry.resolve('bart') == 'facebook/bart-large-mnli'
+    assert registry.resolve('unregistered/model') == 'unregistered/model'
+    assert [m['version'] for m in registry.list_versions()] == ['v2', 'bart']
+    assert registry.get('v2')['metadata'] == {'accuracy': 0.91}
+
+def test_duplicate_version_is_rejected(registry):
+    registry.register('v1', 'org/model')
+    with pytest.raises(ValueError):
+        registry.register('v1', 'org/other-model')
+
+def test_rollback_walks_back_through_history(registry):
+    for version in ('v1', 'v2', 'v3'):
+        registry.set_active(version)
+    assert registry.active_version == 'v3'
+    assert registry.previous_version == 'v2'
+
+    registry.set_active('v2', rollback=True)
+    assert registry.active_version == 'v2'
+    assert registry.previous_version == 'v1'
+
+    registry.set_active('v1', rollback=True)
+    assert registry.previous_version is None
@@ -0,0 +1,83 @@
+"""
+Unit tests for the staged inference pipeline
+"""
+import time
+import pytest
+from utils.pipeline import InferencePipeline, PipelineStats
+
+class FakeClassifier:
+    """Stage functions with fixed costs, mimicking EmailClassifier"""
+    model_version = 'fake'
+
+    def __init__(self, stage_delay=0.0, fail_on=None):
+        self.stage_delay = stage_delay
+        self.fail_on = fail_on
+
+    def preprocess_email_content(self, content, subject=''):
+        time.sleep(self.stage_delay)
+        return content.strip()
+
+    def tokenize(self, texts):
+        return list(texts)
+
+    def forward(self, encoded):
+        time.sleep(self.stage_delay)
+        if self.fail_on in encoded:
+            raise ValueError('forward failed')
+        return [[len(text)] for text in encoded]
+
+    def postprocess(self, scores):
+        return [{'label': 'Work', 'confidence': 1.0, 'length': row[0]} for row in scores]
+
+def emails(count):
+    return [{'content': 'x' * (i + 1)} for i in range(count)]
+
+def test_results_are_in_input_order():
+    pipeline = InferencePipeline(FakeClassifier(), batch_size=4)
+    results = list(pipeline.run(emails(11)))
+
+    assert [r['length'] for r in results] == list(range(1, 12))
+
+def test_empty_texts_get_review():
+    pipeline = InferencePipeline(FakeClassifier(), batch_size=4)
+    results = list(pipeline.run([{'content': 'hello'}, {'content': '   '}]))
+
+    assert results[0]['length'] == 5
+    assert results[1]['label'] == 'Review'
+
+def test_preprocessed_texts_skip_preprocessing():
+    pipeline = InferencePipeline(FakeClassifier(), batch_size=2, preprocessed=True)
+    assert [r['length'] for r in pipeline.run(['a', 'bb', 'ccc'])] == [1, 2, 3]
+
+    # Screen results computed elsewhere: chunks are pooled, answered emails skip the model
+    pipeline = InferencePipeline(FakeClassifier(), batch_size=2, preprocessed=True)
+    results = list(pipeline.run([(['aaaa', 'b'], None), (['c'], {'label': 'Shopping'})]))
+    assert results[0]['length'] == (2 * 4 + 1) / 3 and results[1] == {'label': 'Shopping'}
+
+def test_stage_errors_reach_the_consumer():
+    pipeline = InferencePipeline(FakeClassifier(fail_on='xxx'), batch_size=1)
+    with pytest.raises(ValueError):
+        list(pipeline.run(emails(5)))
+
+def test_stages_overlap_and_report_utilization():
+    stats = PipelineStats()
+    delay = 0.05
+    pipeline = InferencePipeline(FakeClassifier(stage_delay=delay), batch_size=1, ramp_up=False, stats=stats)
+
+    start = time.perf_counter()
+    list(pipeline.run(emails(8)))
+    elapsed = time.perf_counter() - start
+
+    # Serial execution would take 8 * (preprocess + infer) = 16 * delay
+    assert elapsed < 16 * delay * 0.8
+
+    report = stats.as_dict()
+    assert report['items'] == 8
+    assert report['stages']['infer']['batches'] == 8
+    assert 0 < report['stages']['infer']['utilization'] <= 1.0
+
+def test_consumer_can_stop_early():
+    pipeline = InferencePipeline(FakeClassifier(), batch_size=1)
+    results = pipeline.run(emails(100))
+    assert next(results)['length'] == 1
+    results.close()
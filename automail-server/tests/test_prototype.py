@@ -0,0 +1,34 @@
+"""
+Unit tests for embedding prototype scoring
+"""
+import json
+import numpy as np
+from utils.prototype_backend import cosine_scores, load_examples
+
+def test_cosine_scores_rank_by_similarity_and_sum_to_one():
+    prototypes = np.eye(3)
+    embeddings = np.array([[0.0, 1.0, 0.0], [0.6, 0.0, 0.8]])
+
+    scores = cosine_scores(embeddings, prototypes, temperature=0.05)
+
+    assert scores.shape == (2, 3)
+    assert np.allclose(scores.sum(axis=1), 1.0)
+    assert list(scores.argmax(axis=1)) == [1, 2]
+    # A lower temperature makes the same similarities more decisive
+    assert cosine_scores(embeddings, prototypes, 0.01)[1, 2] > scores[1, 2]
+
+def test_examples_accept_api_and_zero_shot_labels(tmp_path):
+    path = tmp_path / 'examples.jsonl'
+    path.write_text('\n'.join([
+        json.dumps({'label': 'Work', 'text': 'Quarterly budget review'}),
+        json.dumps({'label': 'travel and booking confirmations', 'text': 'Your flight is booked'}),
+        json.dumps({'label': 'Unknown', 'text': 'ignored'}),
+        json.dumps({'label': 'Work', 'text': ''}),
+        'not json'
+    ]))
+
+    assert load_examples(str(path)) == [
+        ('work and business communications', 'Quarterly budget review'),
+        ('travel and booking confirmations', 'Your flight is booked')
+    ]
+    assert load_examples(str(tmp_path / 'missing.jsonl')) == []
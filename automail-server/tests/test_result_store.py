@@ -0,0 +1,90 @@
+"""
+Unit tests for the persistent classification result store
+"""
+import sqlite3
+from utils.result_store import ResultStore, compute_content_hash
+from utils.sender_index import SENDER_MODEL_VERSION
+
+def make_store(tmp_path):
+    return ResultStore(str(tmp_path / 'results.db'))
+
+def test_sync_splits_known_and_unknown(tmp_path):
+    store = make_store(tmp_path)
+    result = {'label': 'Work', 'confidence': 0.91, 'reasoning': 'test', 'model_version': 'v1'}
+    store.put('key-a', 'm1', 'h1', result)
+
+    known, unknown = store.sync('key-a', [
+        {'message_id': 'm1', 'content_hash': 'h1'},
+        {'message_id': 'm2', 'content_hash': 'h2'}
+    ], 'v1')
+
+    assert [r['message_id'] for r in known] == ['m1']
+    assert known[0]['label'] == 'Work'
+    assert unknown == [{'message_id': 'm2', 'content_hash': 'h2'}]
+
+def test_changed_content_and_model_version_need_classification(tmp_path):
+    store = make_store(tmp_path)
+    store.put('key-a', 'm1', 'h1', {'label': 'Work', 'confidence': 0.9, 'model_version': 'v1'})
+
+    # Edited message
+    known, unknown = store.sync('key-a', [{'message_id': 'm1', 'content_hash': 'h2'}], 'v1')
+    assert not known and len(unknown) == 1
+
+    # New model
+    known, unknown = store.sync('key-a', [{'message_id': 'm1', 'content_hash': 'h1'}], 'v2')
+    assert not known and len(unknown) == 1
+
+def test_results_are_scoped_by_api_key(tmp_path):
+    store = make_store(tmp_path)
+    store.put('key-a', 'm1', 'h1', {'label': 'Work', 'confidence': 0.9, 'model_version': 'v1'})
+
+    assert store.get('key-b', 'm1', 'h1') is None
+    assert store.get('key-a', 'm1', 'h1')['label'] == 'Work'
+
+def test_new_content_replaces_old_version(tmp_path):
+    store = make_store(tmp_path)
+    store.put('key-a', 'm1', 'h1', {'label': 'Work', 'confidence': 0.9, 'model_version': 'v1'})
+    store.put('key-a', 'm1', 'h2', {'label': 'Spam', 'confidence': 0.8, 'model_version': 'v1'})
+
+    assert store.get('key-a', 'm1', 'h1') is None
+    assert store.get_stats()['stored_results'] == 1
+
+def test_content_hash_is_stable():
+    assert compute_content_hash('body', 'subject') == compute_content_hash('body', 'subject')
+    assert compute_content_hash('body', 'subject') != compute_content_hash('body', 'other')
+
+def test_short_circuit_results_are_known_until_the_serving_model_changes(tmp_path):
+    store = make_store(tmp_path)
+    store.put('key-a', 'm1', 'h1', {'label': 'Shopping', 'model_version': 'sender-index'}, serving_model='v1')
+
+    known, _ = store.sync('key-a', [{'message_id': 'm1', 'content_hash': 'h1'}], 'v1')
+    assert known[0]['label'] == 'Shopping' and known[0]['model_version'] == 'sender-index'
+    assert not store.sync('key-a', [{'message_id': 'm1', 'content_hash': 'h1'}], 'v2')[0]
+
+def test_stores_without_a_serving_model_column_are_migrated(tmp_path):
+    path = str(tmp_path / 'results.db')
+    with sqlite3.connect(path) as conn:
+        conn.execute("""
+            CREATE TABLE results (
+                api_key TEXT NOT NULL, message_id TEXT NOT NULL, content_hash TEXT NOT NULL,
+                result TEXT NOT NULL, model_version TEXT NOT NULL, updated_at REAL NOT NULL,
+                PRIMARY KEY (api_key, message_id, content_hash)
+            )
+        """)
+        conn.execute("INSERT INTO results VALUES ('key-a', 'm1', 'h1', '{\"label\": \"Work\"}', 'v1', 0)")
+
+    store = ResultStore(path)
+    assert store.get('key-a', 'm1', 'h1', 'v1')['label'] == 'Work'
+    store.put('key-a', 'm2', 'h2', {'label': 'Spam', 'model_version': 'spam-filter'}, serving_model='v1')
+    assert store.get('key-a', 'm2', 'h2', 'v1')['label'] == 'Spam'
+
+def test_sync_knows_results_the_sender_index_answered(client, server):
+    api_key_id = server.get_api_key_id(server.config.API_KEY)
+    for _ in range(10):
+        server.senders.update(api_key_id, 'news@shop.example', 'Shopping')
+    email = {'content': 'Weekly deals', 'subject': 'Sale', 'sender': 'news@shop.example', 'message_id': 'm1'}
+    assert client.post('/classify', json=email).get_json()['model_version'] == SENDER_MODEL_VERSION
+
+    message = {'message_id': 'm1', 'content_hash': compute_content_hash(email['content'], email['subject'])}
+    body = client.post('/sync', json={'messages': [message]}).get_json()
+    assert [r['label'] for r in body['results']] == ['Shopping'] and body['needs_classification'] == []
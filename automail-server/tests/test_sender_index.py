@@ -0,0 +1,53 @@
+"""
+Unit tests for the sender index
+"""
+from utils.sender_index import SENDER_MODEL_VERSION, parse_sender
+
+DAY = 86400
+
+def test_parse_sender_normalises_addresses():
+    assert parse_sender('Billing <Billing@Bank.example>') == ('billing@bank.example', 'bank.example')
+    assert parse_sender('not an address') is None
+    assert parse_sender(None) is None
+
+def test_confident_senders_answer_and_decay(make_sender_index):
+    index = make_sender_index()
+    now = 1000 * DAY
+    for _ in range(3):
+        index.update('a', 'news@shop.example', 'Shopping', now=now)
+    index.update('a', 'boss@corp.example', 'Work', now=now)
+    index.update('a', 'boss@corp.example', 'Personal', now=now)
+    index.update('a', 'boss@corp.example', 'Work', now=now)
+
+    result = index.lookup('a', 'Shop <news@shop.example>', now=now)
+    assert result['label'] == 'Shopping' and result['model_version'] == SENDER_MODEL_VERSION
+    assert result['sender_scope'] == 'user'
+    assert index.lookup('b', 'news@shop.example', now=now)['sender_scope'] == 'global'
+
+    # Mixed senders and domains with too little weight go to the model
+    assert index.lookup('a', 'boss@corp.example', now=now) is None
+    assert index.lookup('a', 'sale@shop.example', now=now) is None
+
+    # After one half-life the three emails weigh 1.5, below min_weight
+    assert index.lookup('a', 'news@shop.example', now=now + 30 * DAY) is None
+
+def test_results_from_the_index_are_not_counted(make_sender_index):
+    index = make_sender_index()
+    emails = [{'sender': 'a@x.example'}, {'sender': 'b@x.example'}, {}]
+    results = [
+        {'label': 'Work', 'model_version': 'facebook/bart-large-mnli'},
+        {'label': 'Work', 'model_version': SENDER_MODEL_VERSION},
+        {'label': 'Work', 'model_version': 'facebook/bart-large-mnli'}
+    ]
+    assert index.update_from_results('a', emails, results) == 1
+
+def test_full_index_evicts_and_reloads(make_sender_index):
+    index = make_sender_index(capacity=32)
+    for i in range(40):
+        index.update('a', f'sender{i}@example.com', 'Work', weight=i + 1, now=DAY)
+    assert len(index) <= 32 and index.stats['evicted'] > 0
+
+    index.save()
+    reloaded = make_sender_index(capacity=32)
+    assert len(reloaded) == len(index)
+    assert reloaded.lookup('a', 'sender39@example.com', now=DAY)['label'] == 'Work'
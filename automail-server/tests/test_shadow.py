@@ -0,0 +1,61 @@
+"""
+Unit tests for shadow evaluation bookkeeping
+"""
+from utils.shadow import ShadowEvaluator
+
+class FakeCandidate:
+    """Backend that records the texts it classified"""
+    version = 'candidate'
+
+    def __init__(self):
+        self.classified = []
+
+    def classify(self, texts):
+        self.classified.extend(texts)
+        return [{'label': 'Work' if 'meeting' in text else 'Spam'} for text in texts]
+
+class FakePrimary:
+    model_version = 'primary'
+    last_used = 0.0
+
+    def __init__(self):
+        self.backend = FakeCandidate()
+        self.backend.version = 'primary'
+
+    def preprocess_email_content(self, content, subject=''):
+        return content
+
+def make_evaluator(**kwargs):
+    evaluator = ShadowEvaluator(FakePrimary(), sample_rate=1.0, **kwargs)
+    evaluator.candidate = FakeCandidate()
+    evaluator.status = 'running'
+    return evaluator
+
+def test_agreement_confusion_and_latency_are_recorded():
+    evaluator = make_evaluator()
+    evaluator._evaluate('team meeting', '', 'Work', 'primary')
+    evaluator._evaluate('weekly meeting notes', '', 'Newsletters', 'primary')
+    evaluator._evaluate('win a prize', '', 'Spam', 'primary')
+    evaluator._evaluate('swapped out', '', 'Work', 'older-primary')
+
+    report = evaluator.get_report()
+    assert report['compared'] == 3
+    assert report['agreement_rate'] == round(2 / 3, 4)
+    assert report['confusion']['Newsletters'] == {'Work': 1}
+    assert report['per_label']['Work'] == {'count': 1, 'agreement': 1.0}
+    # Both latencies come from one classify call each on the same texts
+    assert report['latency']['primary']['count'] == report['latency']['candidate']['count'] == 3
+    assert evaluator.classifier.backend.classified == evaluator.candidate.classified == [
+        'team meeting', 'weekly meeting notes', 'win a prize'
+    ]
+
+def test_submit_never_blocks_and_skips_rule_based_results():
+    evaluator = make_evaluator(queue_size=1)
+    evaluator.submit('a', '', {'label': 'Work', 'model_version': 'rule-based'})
+    evaluator.submit('b', '', {'label': 'Work', 'model_version': 'primary'})
+    evaluator.submit('c', '', {'label': 'Work', 'model_version': 'primary'})
+
+    report = evaluator.get_report()
+    assert report['sampled'] == 1
+    assert report['dropped'] == 1
+    assert report['queue_depth'] == 1
@@ -0,0 +1,38 @@
+"""
+Unit tests for the spam pre-screen
+"""
+from utils.corrections_log import CorrectionsLog
+from utils.spam_filter import BloomFilter, SpamPrescreen, SPAM_FILTER_MODEL_VERSION, content_fingerprint
+
+def test_bloom_filter_has_no_false_negatives_and_few_false_positives():
+    members = [f"member-{i}" for i in range(20000)]
+    bloom = BloomFilter.build(members, error_rate=1e-3)
+
+    assert all(bloom.contains_many(members))
+    false_positives = sum(bloom.contains_many([f"other-{i}" for i in range(20000)]))
+    assert false_positives < 60
+    assert bloom.get_info()['bytes'] < 20000 * 2
+
+def test_prescreen_uses_spam_corrections_and_imported_lists(tmp_path, fake_classifier):
+    log = CorrectionsLog(str(tmp_path / 'log'))
+    log.append('a', [
+        {'email_id': '1', 'correct_label': 'Spam', 'content': 'You won 1000 dollars', 'subject': 'Prize'},
+        {'email_id': '2', 'correct_label': 'Spam', 'content': 'Team lunch', 'subject': ''},
+        {'email_id': '2', 'correct_label': 'Personal', 'content': 'Team lunch', 'subject': ''}
+    ])
+    prescreen = SpamPrescreen(fake_classifier, log, lists_dir=str(tmp_path / 'lists'), error_rate=1e-6)
+    prescreen._thread = 'disabled'
+    prescreen.import_list('feed', domains=['*.Spam.example'], fingerprints=[content_fingerprint('phish text')])
+    assert prescreen.rebuild()
+    assert not prescreen.rebuild()
+
+    results = prescreen.check([
+        {'content': 'You  won 2500 dollars', 'subject': 'prize'},
+        {'content': 'Team lunch'},
+        {'content': 'Hello', 'sender': 'Promo <deals@mail.spam.example>'},
+        {'content': 'Hello', 'sender': 'friend@ham.example'},
+        {'content': 'phish text'}
+    ])
+    assert [r and r['label'] for r in results] == ['Spam', None, 'Spam', None, 'Spam']
+    assert results[0]['model_version'] == SPAM_FILTER_MODEL_VERSION
+    assert 'spam.example' in results[2]['reasoning']
@@ -0,0 +1,42 @@
+"""
+Unit tests for lazy backend imports and the startup report
+"""
+import os
+import sys
+import subprocess
+from utils import startup
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _run(code):
+    return subprocess.run(
+        [sys.executable, '-c', code], cwd=SERVER_DIR, capture_output=True, text=True, check=True
+    ).stdout.strip()
+
+def test_rule_based_path_does_not_import_model_backend():
+    output = _run(
+        "import sys\n"
+        "from utils.classifier import EmailClassifier\n"
+        "result = EmailClassifier().rule_based_classification('team meeting about the budget')\n"
+        "print(result['label'], 'torch' in sys.modules, 'transformers' in sys.modules)"
+    )
+    assert output == 'Work False False'
+
+def test_logging_config_import_has_no_side_effects():
+    output = _run(
+        "import logging\n"
+        "import utils.logging_config\n"
+        "print(len(logging.getLogger().handlers))"
+    )
+    assert output == '0'
+
+def test_startup_report_records_imports_and_milestones():
+    with startup.track_import('test-group'):
+        pass
+    startup.mark('test-milestone')
+    startup.mark('test-milestone')
+
+    report = startup.get_startup_report()
+    assert 'test-group' in report['imports_ms']
+    assert report['milestones_ms']['test-milestone'] >= 0
+    assert report['uptime_ms'] >= report['milestones_ms']['test-milestone']
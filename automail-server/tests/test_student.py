@@ -0,0 +1,43 @@
+"""
+Unit tests for the distilled student backend and backend selection
+"""
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from utils.classifier import EmailClassifier
+from utils.model_registry import ModelRegistry
+from utils.student_backend import STUDENT_LABELS, StudentBackend, student_label_config
+
+def fake_model(**label_config):
+    config = SimpleNamespace(label2id=label_config['label2id'], id2label=label_config['id2label'])
+    return SimpleNamespace(config=config)
+
+def test_student_scores_map_to_api_labels():
+    labels = student_label_config()
+    # Saved configs come back with string ids
+    labels['id2label'] = {str(idx): label for idx, label in labels['id2label'].items()}
+    backend = StudentBackend('student-v1', '/models/student', fake_model(**labels), None, 'cpu')
+
+    scores = np.full((2, len(STUDENT_LABELS)), 0.01)
+    scores[0, STUDENT_LABELS.index('spam and promotional content')] = 0.95
+    scores[1, 0] = 0.3
+
+    results = backend.postprocess(scores)
+    assert [r['label'] for r in results] == ['Spam', 'Review']
+    assert all(r['model_version'] == 'student-v1' for r in results)
+
+def test_student_rejects_models_without_the_distilled_head():
+    nli = {'label2id': {'entailment': 2}, 'id2label': {0: 'contradiction', 1: 'neutral', 2: 'entailment'}}
+    with pytest.raises(ValueError):
+        StudentBackend('bart', 'facebook/bart-large-mnli', fake_model(**nli), None, 'cpu')
+
+def test_backend_kind_comes_from_registry_metadata(tmp_path):
+    classifier = EmailClassifier()
+    classifier.registry = ModelRegistry(str(tmp_path / 'registry'))
+    classifier.registry.register('student-v1', 'org/student', {'backend': 'student'})
+
+    assert classifier.backend_kind('student-v1') == 'student'
+    assert classifier.backend_kind('facebook/bart-large-mnli') == 'eager'
+    assert classifier.backend_kind('facebook/bart-large-mnli', 'compiled') == 'compiled'
+    with pytest.raises(ValueError):
+        classifier.backend_kind('facebook/bart-large-mnli', 'onnx')
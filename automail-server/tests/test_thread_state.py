@@ -0,0 +1,55 @@
+"""
+Unit tests for thread state
+"""
+from utils.thread_state import THREAD_MODEL_VERSION, content_words, hamming, simhash
+
+DAY = 86400
+
+INVOICE = 'Your invoice for March is attached. The total due is 49.00 USD and will be charged to your card on file.'
+
+def test_similar_texts_have_close_fingerprints():
+    quoted = simhash(content_words('Could you resend this as a PDF? ' + INVOICE))
+    unrelated = simhash(content_words('Are you free for lunch on Friday? We could try the new Thai place downtown.'))
+    base = simhash(content_words(INVOICE))
+    assert hamming(base, quoted) <= 48 < hamming(base, unrelated)
+
+def test_replies_reuse_the_label_until_they_diverge(make_thread_state):
+    store = make_thread_state()
+    first = {'content': INVOICE, 'subject': 'Invoice', 'thread_id': 't1'}
+    assert store.update_from_results('a', [first], [{'label': 'Finance', 'confidence': 0.9, 'model_version': 'm'}]) == 1
+
+    replies = [
+        {'content': 'Thanks, got it!', 'thread_id': 't1'},
+        {'content': 'Could you resend this as a PDF? ' + INVOICE, 'thread_id': 't1'},
+        {'content': 'Separately, are you free for lunch on Friday? Jane would love to try the new Thai place.',
+         'thread_id': 't1'},
+        {'content': 'Thanks, got it!', 'thread_id': 't2'},
+        {'content': 'Thanks, got it!'}
+    ]
+    results = store.check('a', replies)
+    assert [r and r['label'] for r in results] == ['Finance', 'Finance', None, None, None]
+    assert results[0]['model_version'] == THREAD_MODEL_VERSION
+    assert store.check('b', replies[:1]) == [None]
+
+    # Answers from the thread state never become the thread's state
+    assert store.update_from_results('a', replies[:1], results[:1]) == 0
+
+    # After max_reuse reused replies the next one is classified again
+    assert store.check('a', replies[:1])[0]['label'] == 'Finance'
+    assert store.check('a', replies[:1]) == [None]
+
+def test_low_confidence_threads_are_not_reused(make_thread_state):
+    store = make_thread_state()
+    store.update('a', {'content': INVOICE, 'thread_id': 't1'}, 'Finance', 0.4)
+    assert store.check('a', [{'content': 'Thanks!', 'thread_id': 't1'}]) == [None]
+
+def test_store_is_bounded_and_expires_idle_threads(make_thread_state):
+    store = make_thread_state(capacity=4)
+    for i in range(6):
+        store.update('a', {'content': INVOICE, 'thread_id': f't{i}'}, 'Finance', 0.9, now=DAY)
+    assert len(store) == 4 and store.stats['evicted'] == 2
+    assert store.check('a', [{'content': 'Thanks!', 'thread_id': 't0'}], now=DAY) == [None]
+
+    store.check('a', [{'content': 'Thanks!', 'thread_id': 't5'}], now=10 * DAY)
+    assert store.check('a', [{'content': 'Thanks!', 'thread_id': 't5'}], now=20 * DAY)[0]['label'] == 'Finance'
+    assert len(store) == 1 and store.stats['expired'] == 3
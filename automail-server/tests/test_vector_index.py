@@ -0,0 +1,77 @@
+"""
+Unit tests for the on-disk vector index and correction lookup
+"""
+import numpy as np
+from utils.vector_index import VectorIndex
+from utils.corrections import CORRECTION_MODEL_VERSION, CorrectionIndex
+
+def unit_vectors(count, dim=16, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def test_index_persists_and_reopens_memory_mapped(tmp_path):
+    vectors = unit_vectors(50)
+    index = VectorIndex(str(tmp_path / 'index'), dim=16)
+    index.add(vectors[:30], [{'row': i} for i in range(30)])
+    index.add(vectors[30:], [{'row': i} for i in range(30, 50)])
+
+    reopened = VectorIndex(str(tmp_path / 'index'))
+    assert len(reopened) == 50
+    assert isinstance(reopened._vectors, np.memmap)
+    similarity, meta = reopened.search(vectors[[42]], k=3)[0][0]
+    assert meta == {'row': 42}
+    assert similarity > 0.999
+
+def test_ivf_finds_exact_matches_including_rows_added_later(tmp_path):
+    vectors = unit_vectors(600, seed=1)
+    index = VectorIndex(str(tmp_path / 'index'), dim=16, ivf_threshold=200, nprobe=4)
+    for start in range(0, 500, 100):
+        index.add(vectors[start:start + 100], [{'row': i} for i in range(start, start + 100)])
+    index.wait_for_training()
+    assert index.get_info()['mode'] == 'ivf'
+
+    # Searches during a retraining use the current lists, which include new rows
+    index.add(vectors[500:], [{'row': i} for i in range(500, 600)])
+    queries = [3, 250, 499, 555]
+    assert [hits[0][1]['row'] for hits in index.search(vectors[queries], k=1)] == queries
+    index.wait_for_training()
+
+    reopened = VectorIndex(str(tmp_path / 'index'), ivf_threshold=200, nprobe=4)
+    assert reopened.get_info()['mode'] == 'ivf'
+    assert reopened.search(vectors[[599]], k=1)[0][0][1]['row'] == 599
+
+def test_corrections_answer_near_duplicates_for_their_owner_first(tmp_path, fake_classifier, fake_encoder):
+    corrections = CorrectionIndex(fake_classifier, root=str(tmp_path), threshold=0.9, global_threshold=0.99)
+    corrections.embedder, corrections.status = fake_encoder, 'ready'
+
+    assert corrections.lookup('alice', ['Weekly digest']) == [None]
+    corrections.add('alice', [
+        {'email_id': '1', 'correct_label': 'Newsletters', 'content': 'Weekly digest'},
+        {'email_id': '2', 'correct_label': 'Work'}
+    ])
+    corrections.add('alice', [{'email_id': '1', 'correct_label': 'Personal', 'content': 'Weekly digest'}])
+
+    own, unrelated = corrections.lookup('alice', ['Weekly digest', 'Something else'])
+    assert own['label'] == 'Personal'  # the latest correction wins
+    assert own['model_version'] == CORRECTION_MODEL_VERSION
+    assert own['correction_scope'] == 'user'
+    assert unrelated is None
+    assert corrections.lookup('bob', ['Weekly digest'])[0]['correction_scope'] == 'global'
+    assert corrections.stats['skipped'] == 1
+
+class NearbyEncoder:
+    """Corrections c0..c5 lie close together; q is near them but not a duplicate"""
+
+    def embed(self, texts):
+        basis = np.eye(8, dtype=np.float32)
+        vectors = [basis[0] + (basis[7] if text == 'q' else 0.3 * basis[1 + int(text[1:]) % 3]) for text in texts]
+        return np.stack([vector / np.linalg.norm(vector) for vector in vectors])
+
+def test_adapter_trained_on_one_label_does_not_answer(tmp_path, fake_classifier):
+    corrections = CorrectionIndex(fake_classifier, root=str(tmp_path), threshold=0.9, global_threshold=0.99)
+    corrections.embedder, corrections.status = NearbyEncoder(), 'ready'
+    corrections.add('alice', [{'email_id': str(i), 'correct_label': 'Newsletters', 'content': f'c{i}'} for i in range(6)])
+
+    assert corrections.adapters.get('alice').labels == ['Newsletters']
+    assert corrections.lookup('alice', ['q']) == [None]
+    assert corrections.stats['adapter_hits'] == 0
@@ -0,0 +1,170 @@
+"""
+Per-user adapter heads for Automail AI Server
+A small logistic-regression head per API key over the sentence embeddings
+of its corrected emails. Each /train call takes a few gradient steps (no
+retraining), and heads live in a memory-bounded LRU backed by disk.
+"""
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import numpy as np
+from config.config import get_config
+
+config = get_config()
+logger = logging.getLogger(__name__)
+
+# Online update settings: a few full-batch steps over new and replayed examples
+LEARNING_RATE = 0.5
+UPDATE_STEPS = 20
+L2_PENALTY = 1e-3
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    logits = logits - logits.max(axis=1, keepdims=True)
+    scores = np.exp(logits)
+    return scores / scores.sum(axis=1, keepdims=True)
+
+class AdapterHead:
+    """
+    Multinomial logistic regression over unit-length embeddings
+
+    Classes are whatever labels the user corrected emails to; a new label
+    adds a row to the weights.
+    """
+
+    def __init__(self, dim: int, labels: List[str] = None, weights: np.ndarray = None,
+                 bias: np.ndarray = None, examples: int = 0):
+        self.dim = dim
+        self.labels = list(labels or [])
+        # Replaced as one tuple so concurrent predictions never see mismatched shapes
+        self.params = (
+            weights if weights is not None else np.zeros((0, dim), dtype=np.float32),
+            bias if bias is not None else np.zeros(0, dtype=np.float32)
+        )
+        self.examples = examples
+
+    @property
+    def nbytes(self) -> int:
+        return sum(param.nbytes for param in self.params)
+
+    def predict_proba(self, embeddings: np.ndarray) -> np.ndarray:
+        """(emails, labels) probabilities"""
+        weights, bias = self.params
+        return _softmax(embeddings @ weights.T + bias)
+
+    def update(self, embeddings: np.ndarray, labels: List[str], new_examples: int = None):
+        """
+        Take UPDATE_STEPS gradient steps on the cross-entropy of these examples
+
+        Args:
+            embeddings: (examples, dim) unit vectors
+            labels: Label of each example
+            new_examples: How many of them are new (the rest are replayed)
+        """
+        weights, bias = self.params
+        new_labels = [label for label in dict.fromkeys(labels) if label not in self.labels]
+        weights = np.vstack([weights, np.zeros((len(new_labels), self.dim), dtype=np.float32)])
+        bias = np.concatenate([bias, np.zeros(len(new_labels), dtype=np.float32)])
+        all_labels = self.labels + new_labels
+
+        targets = np.array([all_labels.index(label) for label in labels])
+        rows = np.arange(len(targets))
+        for _ in range(UPDATE_STEPS):
+            error = _softmax(embeddings @ weights.T + bias)
+            error[rows, targets] -= 1.0
+            error /= len(targets)
+            weights = weights - LEARNING_RATE * (error.T @ embeddings + L2_PENALTY * weights)
+            bias = bias - LEARNING_RATE * error.sum(axis=0)
+
+        self.labels = all_labels
+        self.params = (weights.astype(np.float32), bias.astype(np.float32))
+        self.examples += len(labels) if new_examples is None else new_examples
+
+    def save(self, path: str):
+        tmp_path = path + '.tmp.npz'
+        weights, bias = self.params
+        np.savez(tmp_path, labels=np.array(self.labels), weights=weights, bias=bias, examples=self.examples)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'AdapterHead':
+        data = np.load(path)
+        return cls(data['weights'].shape[1], [str(label) for label in data['labels']],
+                   data['weights'], data['bias'], int(data['examples']))
+
+class AdapterStore:
+    """
+    Per-user heads in an LRU bounded by max_bytes of weights
+
+    Heads are written to <root>/<api key id>.npz on every update, so
+    evicting one only drops it from memory; the next request for that
+    user reads it back.
+    """
+
+    def __init__(self, root: str, max_bytes: int = None):
+        self.root = root
+        self.max_bytes = max_bytes or config.ADAPTER_CACHE_MB * 1024 * 1024
+        self._heads = OrderedDict()
+        self._sizes = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {'updates': 0, 'hits': 0, 'loads': 0, 'evictions': 0, 'last_update_ms': None}
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, api_key_id: str) -> str:
+        return os.path.join(self.root, f"{api_key_id}.npz")
+
+    def _put(self, api_key_id: str, head: AdapterHead):
+        """Insert or refresh a head and evict the least recently used (caller holds the lock)"""
+        self._heads.pop(api_key_id, None)
+        self._bytes -= self._sizes.pop(api_key_id, 0)
+        self._heads[api_key_id] = head
+        self._sizes[api_key_id] = head.nbytes
+        self._bytes += head.nbytes
+        while self._bytes > self.max_bytes and len(self._heads) > 1:
+            evicted, _ = self._heads.popitem(last=False)
+            self._bytes -= self._sizes.pop(evicted)
+            self.stats['evictions'] += 1
+
+    def get(self, api_key_id: str) -> Optional[AdapterHead]:
+        """A user's head from memory or disk, or None if they have none"""
+        with self._lock:
+            head = self._heads.get(api_key_id)
+            if head is not None:
+                self._heads.move_to_end(api_key_id)
+                self.stats['hits'] += 1
+                return head
+
+            path = self._path(api_key_id)
+            if not os.path.exists(path):
+                return None
+            try:
+                head = AdapterHead.load(path)
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Could not load adapter head {path}: {str(e)}")
+                return None
+            self.stats['loads'] += 1
+            self._put(api_key_id, head)
+            return head
+
+    def update(self, api_key_id: str, embeddings: np.ndarray, labels: List[str], new_examples: int = None):
+        """Online update of a user's head (created on first use)"""
+        started = time.perf_counter()
+        head = self.get(api_key_id) or AdapterHead(embeddings.shape[1])
+        with self._lock:
+            head.update(embeddings, labels, new_examples)
+            head.save(self._path(api_key_id))
+            self._put(api_key_id, head)
+            self.stats['updates'] += 1
+            self.stats['last_update_ms'] = round((time.perf_counter() - started) * 1000, 2)
+
+    def get_status(self) -> Dict:
+        with self._lock:
+            return {
+                'users_in_memory': len(self._heads),
+                'memory_bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                **self.stats
+            }
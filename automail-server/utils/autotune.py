@@ -0,0 +1,261 @@
+"""
+Inference autotuning for Automail AI Server
+Sweeps torch thread counts, concurrent inference workers and batch size on
+synthetic emails, picks the fastest configuration that meets the latency SLO
+and persists it per machine type next to MODEL_CACHE_DIR
+"""
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import logging
+import platform
+import threading
+from typing import Dict, List, Optional
+from config.config import get_config
+
+config = get_config()
+logger = logging.getLogger(__name__)
+
+# Building blocks for synthetic calibration emails
+SYNTHETIC_SNIPPETS = [
+    "Team meeting tomorrow at 2pm to review the quarterly report and project budget.",
+    "Happy birthday! Looking forward to dinner with the family this weekend.",
+    "Congratulations, you have won a free prize. Click here to claim it now, limited time offer.",
+    "Your password expires in 3 days. Please verify your account security settings.",
+    "Your order has shipped and will arrive on Thursday. Track your package online.",
+    "Your monthly bank statement is ready. Review recent transactions and payments.",
+    "Your flight booking is confirmed. Check in opens 24 hours before departure.",
+    "New comment on your post and three people followed you this week.",
+    "The server deployment failed with a timeout error in the build pipeline.",
+    "This week's newsletter: product updates, upcoming webinars and community news.",
+]
+
+def machine_key() -> str:
+    """Identify the machine type (architecture, CPU model and core count)"""
+    cpu_model = platform.processor() or ''
+    try:
+        with open('/proc/cpuinfo') as f:
+            match = re.search(r'^model name\s*:\s*(.+)$', f.read(), re.MULTILINE)
+            if match:
+                cpu_model = match.group(1)
+    except OSError:
+        pass
+
+    description = f"{platform.machine()}|{cpu_model}|{os.cpu_count()}"
+    slug = re.sub(r'[^a-z0-9]+', '-', f"{platform.machine()}-{os.cpu_count()}cpu".lower())
+    return f"{slug}-{hashlib.sha256(description.encode('utf-8')).hexdigest()[:8]}"
+
+def synthetic_emails(count: int, seed: int = 0) -> List[str]:
+    """Deterministic preprocessed-style emails of varied length"""
+    rng = random.Random(seed)
+    emails = []
+    for _ in range(count):
+        text = ' '.join(rng.choice(SYNTHETIC_SNIPPETS) for _ in range(rng.randint(1, 6)))
+        emails.append(text[:512])
+    return emails
+
+def _percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+class AutoTuner:
+    """
+    Calibration sweep for a loaded EmailClassifier
+
+    The sweep runs in two phases to stay short: thread and worker counts at
+    the default batch size first, then batch sizes for the best of those.
+    """
+
+    def __init__(self, classifier, cache_dir: str = None, latency_slo_ms: float = None,
+                 batch_sizes: List[int] = None, sample_emails: int = None):
+        self.classifier = classifier
+        self.cache_dir = os.path.join(cache_dir or config.MODEL_CACHE_DIR, 'autotune')
+        self.latency_slo_ms = latency_slo_ms or config.AUTOTUNE_LATENCY_SLO_MS
+        self.batch_sizes = batch_sizes or config.AUTOTUNE_BATCH_SIZES
+        self.sample_emails = sample_emails or config.AUTOTUNE_SAMPLE_EMAILS
+
+        self.running = False
+        self.last_result = None
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.cache_dir, f"{machine_key()}.json")
+
+    def load(self) -> Optional[Dict]:
+        """Load the persisted choice for this machine type and model"""
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if saved.get('model_version') != self.classifier.model_version:
+            return None
+        return saved
+
+    def save(self, result: Dict):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(result, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def apply(self, settings: Dict):
+        """Apply chosen settings to torch and the classifier"""
+        import torch
+        
+        torch.set_num_threads(settings['torch_threads'])
+        try:
+            torch.set_num_interop_threads(settings['torch_interop_threads'])
+        except RuntimeError:
+            # Only possible before the first inter-op parallel work in this process
+            logger.debug("Inter-op thread count already fixed for this process")
+        self.classifier.configure_inference(settings['batch_size'], settings['workers'])
+        logger.info(f"⚙️ Inference settings: {settings}")
+
+    def _thread_options(self) -> List[int]:
+        cpus = os.cpu_count() or 1
+        options = {cpus}
+        threads = 1
+        while threads < cpus:
+            options.add(threads)
+            threads *= 2
+        return sorted(options)
+
+    def measure(self, threads: int, workers: int, batch_size: int, texts: List[str]) -> Dict:
+        """
+        Classify texts with the given settings from `workers` concurrent threads
+
+        Returns:
+            Settings with throughput (emails/s) and p95 batch latency (ms)
+        """
+        import torch
+        
+        torch.set_num_threads(threads)
+        self.classifier.configure_inference(batch_size, workers)
+        # Stored scores would turn every run after the first into cache hits
+        self.classifier.classify_texts(texts[:batch_size], batch_size, use_features=False)  # warm the shapes
+
+        latencies = []
+        latencies_lock = threading.Lock()
+
+        def client(shard):
+            for start in range(0, len(shard), batch_size):
+                batch_start = time.perf_counter()
+                self.classifier.classify_texts(shard[start:start + batch_size], batch_size, use_features=False)
+                with latencies_lock:
+                    latencies.append((time.perf_counter() - batch_start) * 1000)
+
+        shards = [texts[i::workers] for i in range(workers)]
+        clients = [threading.Thread(target=client, args=(shard,)) for shard in shards]
+        start = time.perf_counter()
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        return {
+            'torch_threads': threads,
+            'workers': workers,
+            'batch_size': batch_size,
+            'throughput': round(len(texts) / elapsed, 2),
+            'p95_latency_ms': round(_percentile(latencies, 0.95), 1)
+        }
+
+    def _best(self, measurements: List[Dict]) -> Dict:
+        """Highest throughput within the SLO, or the lowest latency if nothing meets it"""
+        within_slo = [m for m in measurements if m['p95_latency_ms'] <= self.latency_slo_ms]
+        if within_slo:
+            return max(within_slo, key=lambda m: m['throughput'])
+        return min(measurements, key=lambda m: m['p95_latency_ms'])
+
+    def run(self) -> Dict:
+        """Run the calibration sweep, persist and apply the result"""
+        with self._lock:
+            if self.running:
+                raise RuntimeError("Autotuning already in progress")
+            self.running = True
+
+        try:
+            if not self.classifier.is_loaded and not self.classifier.load_model():
+                raise RuntimeError("AI model unavailable")
+
+            started = time.time()
+            cpus = os.cpu_count() or 1
+            texts = synthetic_emails(self.sample_emails)
+            default_batch = self.classifier.batch_size
+            measurements = []
+
+            # Phase 1: intra-op threads x concurrent workers
+            for threads in self._thread_options():
+                for workers in (1, 2, 4):
+                    if threads * workers <= cpus:
+                        measurements.append(self.measure(threads, workers, default_batch, texts))
+            best = self._best(measurements)
+
+            # Phase 2: batch size for the best thread layout
+            for batch_size in self.batch_sizes:
+                if batch_size != default_batch:
+                    measurements.append(self.measure(best['torch_threads'], best['workers'], batch_size, texts))
+            best = self._best(measurements)
+
+            settings = {
+                'torch_threads': best['torch_threads'],
+                'torch_interop_threads': max(1, cpus // (best['torch_threads'] * best['workers'])),
+                'workers': best['workers'],
+                'batch_size': best['batch_size']
+            }
+            result = {
+                'machine': machine_key(),
+                'model_version': self.classifier.model_version,
+                'latency_slo_ms': self.latency_slo_ms,
+                'settings': settings,
+                'expected': {'throughput': best['throughput'], 'p95_latency_ms': best['p95_latency_ms']},
+                'measurements': measurements,
+                'sweep_seconds': round(time.time() - started, 1),
+                'timestamp': time.time()
+            }
+
+            self.save(result)
+            self.apply(settings)
+            self.last_result = result
+            logger.info(f"⚙️ Autotune finished in {result['sweep_seconds']}s: {best['throughput']} emails/s")
+            return result
+        finally:
+            self.running = False
+
+    def load_or_run(self) -> Dict:
+        """Reuse the persisted choice for this machine type, sweeping only if there is none"""
+        saved = self.load()
+        if saved:
+            self.apply(saved['settings'])
+            self.last_result = saved
+            return saved
+        return self.run()
+
+    def run_in_background(self) -> bool:
+        """Start an on-demand sweep; returns False if one is already running"""
+        if self.running:
+            return False
+
+        def target():
+            try:
+                self.run()
+            except Exception as e:
+                logger.error(f"Autotune failed: {str(e)}")
+
+        threading.Thread(target=target, name='autotune', daemon=True).start()
+        return True
+
+    def get_status(self) -> Dict:
+        return {
+            'running': self.running,
+            'machine': machine_key(),
+            'path': self.path,
+            'result': self.last_result
+        }
@@ -0,0 +1,176 @@
+"""
+Boilerplate stripping for Automail AI Server
+Replies repeat the messages before them, and mail clients and mailing
+tools append signatures, legal disclaimers and unsubscribe footers. These
+are removed from email bodies in one pass over their lines, before the
+text is truncated for the model, so the model sees the new content.
+"""
+import re
+import logging
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+# First words of a reply header such as "On Mon, 3 Jun 2024 John <j@x.com> wrote:" (en, fr, de, es, it, nl)
+REPLY_HEADER_PREFIXES = ('on ', 'le ', 'am ', 'el ', 'il ', 'op ')
+REPLY_HEADER_ENDINGS = ('wrote:', 'écrit:', 'écrit :', 'schrieb:', 'escribió:', 'scritto:', 'schreef:')
+
+# Outlook-style separators before the previous message; a bare rule or a
+# From: line only counts when a header field follows it
+ORIGINAL_MESSAGE = re.compile(r'-{2,} ?(original message|ursprüngliche nachricht|message d\'origine) ?-{2,}$')
+SEPARATOR = re.compile(r'_{10,}$')
+FROM_FIELD = re.compile(r'(from|von|de):\s')
+
+# Forwarded messages keep their body; only the marker and header fields go
+FORWARD_MARKER = re.compile(r'(-{2,} ?forwarded message ?-{2,}|begin forwarded message:?)$')
+HEADER_FIELD = re.compile(r'(from|sent|date|to|cc|bcc|subject|reply-to|von|gesendet|an|betreff|de|envoyé|à|objet):\s')
+
+# Lines after which the rest of the body is a signature or footer
+VALEDICTION = re.compile(
+    r'((best|kind|warm|warmest|many thanks and) )?regards|best( wishes)?|sincerely|cheers|'
+    r'yours (truly|sincerely|faithfully)|mit freundlichen grüßen|cordialement|saludos'
+)
+SIGNATURE_PREFIXES = ('sent from my ', 'sent from outlook', 'get outlook for ', 'sent via ')
+DISCLAIMER_PREFIXES = (
+    'confidentiality notice', 'disclaimer:', 'this email and any', 'this e-mail and any', 'this message and any',
+    'this email is confidential', 'this e-mail is confidential', 'this message is confidential',
+    'this communication is confidential', 'the information contained in this', 'the information in this email',
+    'if you are not the intended recipient', 'privileged and confidential'
+)
+FOOTER_PREFIXES = (
+    'unsubscribe', 'to unsubscribe', 'click here to unsubscribe', 'you are receiving this', "you're receiving this",
+    'you received this email because', 'this email was sent to', 'this message was sent to', 'to stop receiving',
+    'if you no longer wish to receive', 'manage your preferences', 'manage preferences', 'update your preferences',
+    'update your email preferences', 'manage your subscription', 'want to change how you receive these emails'
+)
+
+# Tracking lines at the top of newsletters; only the line itself goes
+TRACKING_LINE_PREFIXES = (
+    'view this email in your browser', 'view in browser', 'view it in your browser', 'view online',
+    'having trouble viewing this email', 'email not displaying correctly'
+)
+
+# Removed-text size is counted in words and punctuation marks, close to
+# what a subword tokenizer produces for ordinary prose
+TOKEN_PATTERN = re.compile(r'\w+|[^\w\s]')
+
+# Kinds of removed text, counted per email in the stats
+KINDS = ('quoted', 'reply_history', 'forward_headers', 'signature', 'disclaimer', 'footer', 'tracking')
+
+class BoilerplateStripper:
+    """
+    Removes quoted history, forwarded headers, signatures, disclaimers and
+    tracking footers from email bodies
+
+    Each line is looked at once, with prefix tests and anchored patterns
+    that cannot backtrack across lines, so stripping is linear in the size
+    of the email. Markers that end the useful part of a body (a reply
+    header, "-- ", a closing like "Best regards", a disclaimer or footer)
+    only apply once some content was kept, so a body is never emptied by
+    them; a body with nothing left is returned unchanged.
+    """
+
+    def __init__(self):
+        self.stats = {
+            'emails': 0, 'stripped': 0, 'bytes_in': 0, 'bytes_removed': 0, 'tokens_removed': 0,
+            'removed': dict.fromkeys(KINDS, 0)
+        }
+
+    def _cut_kind(self, line: str, previous: str, following: str) -> str:
+        """Kind of marker that drops this line and the rest of the body, or None (lines are lowercased)"""
+        if line.startswith(REPLY_HEADER_PREFIXES) and line.endswith(REPLY_HEADER_ENDINGS):
+            return 'reply_history'
+        if line.endswith(REPLY_HEADER_ENDINGS) and previous.startswith(REPLY_HEADER_PREFIXES):
+            # Header wrapped over two lines; the caller drops the previous one too
+            return 'reply_history'
+        if ORIGINAL_MESSAGE.match(line):
+            return 'reply_history'
+        if (SEPARATOR.match(line) or FROM_FIELD.match(line)) and HEADER_FIELD.match(following):
+            return 'reply_history'
+        if line == '--' or line.startswith(SIGNATURE_PREFIXES):
+            return 'signature'
+        if VALEDICTION.fullmatch(line.rstrip(',.!')):
+            return 'signature'
+        if line.startswith(DISCLAIMER_PREFIXES):
+            return 'disclaimer'
+        if line.startswith(FOOTER_PREFIXES):
+            return 'footer'
+        return None
+
+    def strip(self, text: str) -> str:
+        """
+        Body without boilerplate
+
+        Args:
+            text: Email body with its original line breaks
+
+        Returns:
+            The kept lines, or text unchanged if nothing would be kept
+        """
+        if not text:
+            return text
+
+        lines = text.splitlines()
+        kept: List[str] = []
+        removed: List[str] = []
+        kinds = set()
+        has_content = False
+        in_forward_headers = False
+        previous = ''
+
+        for index, raw in enumerate(lines):
+            line = raw.strip()
+            lowered = line.lower()
+
+            if in_forward_headers:
+                if not line or HEADER_FIELD.match(lowered):
+                    removed.append(raw)
+                    continue
+                in_forward_headers = False
+
+            if line.startswith('>'):
+                removed.append(raw)
+                kinds.add('quoted')
+            elif FORWARD_MARKER.match(lowered):
+                removed.append(raw)
+                kinds.add('forward_headers')
+                in_forward_headers = True
+            elif lowered.startswith(TRACKING_LINE_PREFIXES):
+                removed.append(raw)
+                kinds.add('tracking')
+            else:
+                following = lines[index + 1].strip().lower() if index + 1 < len(lines) else ''
+                kind = self._cut_kind(lowered, previous, following) if line else None
+                if kind is not None and has_content:
+                    if lowered.endswith(REPLY_HEADER_ENDINGS) and not lowered.startswith(REPLY_HEADER_PREFIXES) \
+                            and kept[-1].strip().lower() == previous:
+                        removed.append(kept.pop())
+                    removed.extend(lines[index:])
+                    kinds.add(kind)
+                    break
+                kept.append(raw)
+                has_content = has_content or bool(line)
+
+            if line:
+                previous = lowered
+
+        stripped = '\n'.join(kept).strip()
+        self.stats['emails'] += 1
+        self.stats['bytes_in'] += len(text.encode('utf-8'))
+        if not removed or not stripped:
+            return text
+
+        self.stats['stripped'] += 1
+        self.stats['bytes_removed'] += len(text.encode('utf-8')) - len(stripped.encode('utf-8'))
+        self.stats['tokens_removed'] += sum(len(TOKEN_PATTERN.findall(line)) for line in removed)
+        for kind in kinds:
+            self.stats['removed'][kind] += 1
+        return stripped
+
+    def get_info(self) -> Dict:
+        stats = self.stats
+        return {
+            **stats,
+            'removed': dict(stats['removed']),
+            'bytes_saved_share': round(stats['bytes_removed'] / stats['bytes_in'], 3) if stats['bytes_in'] else 0.0
+        }
@@ -2,60 +2,145 @@
 Email Classification using DistilBERT
 Provides intelligent email categorization for the Automail system
 """
+import gc
 import os
 import re
+import hashlib
+import sys
+import time
 import logging
-from typing import Dict, List, Tuple, Optional
-import torch
-from transformers import (
-    DistilBertTokenizer, 
-    DistilBertForSequenceClassification, 
-    pipeline
-)
+import threading
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Tuple, Optional
 from config.config import get_config
+from utils.pipeline import InferencePipeline, PipelineStats
+from utils.autotune import synthetic_emails
+from utils.startup import track_import, mark
+from utils.idle_policy import rss_bytes
+from utils.model_registry import get_model_registry
+from utils.feature_store import get_feature_store
+from utils.link_domains import LinkHints, link_host
+from utils.boilerplate import BoilerplateStripper
+from utils.long_email import LongEmailChunker, pool_scores
+
+# torch and transformers are imported on first use of the model backend, so
+# the rule-based path starts in milliseconds (see _import_backend)
+if TYPE_CHECKING:
+    import numpy as np
 
 config = get_config()
 logger = logging.getLogger(__name__)
 
-class EmailClassifier:
+# Version tag recorded for results produced by the keyword fallback
+RULE_BASED_MODEL_VERSION = 'rule-based'
+
+def _import_backend():
+    """Import the model backend dependencies, timing them in the startup report"""
+    with track_import('torch'):
+        import torch
+    with track_import('transformers'):
+        import transformers
+    return torch, transformers
+
+# Backend implementations selectable with CLASSIFIER_BACKEND or registry metadata
+BACKEND_KINDS = ('eager', 'compiled', 'student', 'prototype')
+
+# Use a proper text classification model for emails
+# Option 1: Use zero-shot classification with email categories
+DEFAULT_MODEL_VERSION = "facebook/bart-large-mnli"  # Better for email classification
+
+# Map detailed zero-shot labels to intelligent categories
+LABEL_MAPPING = {
+    "work and business communications": "Work",
+    "personal and social messages": "Personal",
+    "spam and promotional content": "Spam",
+    "important and urgent notifications": "Important",
+    "newsletters and updates": "Newsletters",
+    "financial and banking communications": "Finance",
+    "shopping and e-commerce notifications": "Shopping",
+    "travel and booking confirmations": "Travel",
+    "educational and learning content": "Education",
+    "social media and platform notifications": "Social-Media",
+    "health and medical communications": "Health",
+    "legal and official documents": "Legal",
+    "technical and IT communications": "Technical",
+    "project management and collaboration": "Projects",
+    "customer service and support": "Support",
+    "entertainment and media content": "Entertainment"
+}
+
+# Characters of preprocessed text per model input (DistilBERT has token limits)
+MAX_TEXT_CHARS = 512
+
+# Keywords of the rule-based fallback; long emails are also sampled where they are densest
+RULE_KEYWORDS = {
+    'Spam': [
+        'unsubscribe', 'click here', 'limited time', 'act now',
+        'free money', 'guarantee', 'winner', 'congratulations',
+        'viagra', 'casino', 'lottery', 'inheritance'
+    ],
+    'Important': [
+        'urgent', 'important', 'asap', 'deadline', 'action required',
+        'verification', 'security', 'password', 'account', 'confirm',
+        'invoice', 'payment', 'bill', 'receipt'
+    ],
+    'Work': [
+        'meeting', 'project', 'deadline', 'report', 'team',
+        'client', 'business', 'office', 'conference', 'schedule',
+        'proposal', 'contract', 'budget', 'quarterly'
+    ],
+    'Personal': [
+        'family', 'friend', 'vacation', 'birthday', 'dinner',
+        'weekend', 'party', 'holiday', 'personal', 'home'
+    ]
+}
+
+def build_result(top_label: str, confidence: float, model_version: str) -> Dict:
+    """Turn the top zero-shot prediction into an API result"""
+    final_label = LABEL_MAPPING.get(top_label, "Review")
+    
+    # Apply confidence-based refinement
+    if confidence < 0.6:
+        final_label = "Review"  # Low confidence items need manual review
+    elif confidence > 0.9 and "spam" in top_label.lower():
+        final_label = "Spam"  # High confidence spam detection
+    
+    return {
+        'label': final_label,
+        'confidence': round(confidence, 3),
+        'reasoning': f'AI zero-shot classification: {top_label} ({confidence:.3f})',
+        'model_version': model_version
+    }
+
+class ModelBackend:
     """
-    AI-powered email classifier using DistilBERT
-    Provides email categorization with confidence scores
+    One loaded NLI model with everything its stages need
+    Requests pin the backend they start on, so a hot swap never mixes models
     """
     
-    def __init__(self):
-        self.model = None
-        self.tokenizer = None
-        self.classifier = None
-        self.labels = config.CLASSIFICATION_LABELS
-        self.model_cache_dir = config.MODEL_CACHE_DIR
-        self.is_loaded = False
+    # CLASSIFIER_BACKEND value served by this class (eager PyTorch)
+    kind = 'eager'
+    
+    def __init__(self, version: str, source: str, model, tokenizer, device):
+        self.version = version
+        self.source = source
+        self.model = model
+        self.tokenizer = tokenizer
+        self.device = device
+        self.model_config = model.config
+        self.loaded_at = time.time()
+        self.warmup_info = None
+        self.weights_mapped = False
         
-        # Ensure model cache directory exists
-        os.makedirs(self.model_cache_dir, exist_ok=True)
+        # Feature store table of this backend's score vectors (see EmailClassifier.load_backend)
+        self.score_features = None
         
-    def load_model(self) -> bool:
-        """
-        Load proper email classification model
-        Returns True if successful, False otherwise
-        """
-        try:
-            logger.info("Loading email classification model...")
-            
-            # Use a proper text classification model for emails
-            # Option 1: Use zero-shot classification with email categories
-            model_name = "facebook/bart-large-mnli"  # Better for email classification
-            
-            from transformers import pipeline
-            
-            # Create zero-shot classification pipeline
-            self.classifier = pipeline(
-                "zero-shot-classification",
-                model=model_name,
-                device=0 if torch.cuda.is_available() else -1
-            )
-            
-                    # Define comprehensive email classification labels for detailed categorization
+        # Zero-shot scoring uses the entailment logit of each hypothesis
+        self.entailment_id = next(
+            (idx for label, idx in model.config.label2id.items() if label.lower().startswith('entail')),
+            -1
+        )
+        
+        # Define comprehensive email classification labels for detailed categorization
         self.classification_labels = [
             "work and business communications",
             "personal and social messages", 
@@ -74,8 +159,207 @@ class EmailClassifier:
             "customer service and support",
             "entertainment and media content"
         ]
+        self.hypotheses = [config.HYPOTHESIS_TEMPLATE.format(label) for label in self.classification_labels]
+    
+    @staticmethod
+    def auto_model(transformers):
+        """transformers auto class the backend's model is loaded with"""
+        return transformers.AutoModelForSequenceClassification
+    
+    @property
+    def feature_name(self) -> str:
+        """Feature store name: score vectors depend on the weights, labels and hypotheses"""
+        digest = hashlib.sha256('\n'.join(self.classification_labels + self.hypotheses).encode('utf-8')).hexdigest()
+        return f"{self.version}@{digest[:8]}"
+    
+    def tokenize(self, texts: List[str]):
+        """
+        Tokenisation stage: pair every text with every label hypothesis
+        
+        Args:
+            texts: Non-empty preprocessed texts
+            
+        Returns:
+            Model inputs for len(texts) * len(hypotheses) premise/hypothesis pairs
+        """
+        premises = [text for text in texts for _ in self.hypotheses]
+        hypotheses = self.hypotheses * len(texts)
+        return self.tokenizer(
+            premises,
+            hypotheses,
+            padding=True,
+            truncation='only_first',
+            return_tensors='pt'
+        )
+    
+    def forward(self, encoded) -> 'np.ndarray':
+        """
+        Inference stage: run the NLI model on tokenised pairs
+        
+        Returns:
+            Array of shape (texts, labels) with zero-shot label probabilities
+        """
+        import torch
+        
+        model = self.model
+        if model is None:
+            raise RuntimeError("AI model unloaded")
+        
+        with self._inference_context(torch):
+            encoded = {key: value.to(self.device) for key, value in encoded.items()}
+            logits = self._logits(model, encoded)
+        
+        return self._scores(torch, logits).cpu().numpy()
+    
+    def _inference_context(self, torch):
+        return torch.inference_mode()
+    
+    def _logits(self, model, encoded):
+        """Forward pass hook for accelerated subclasses"""
+        return model(**encoded)[0]
+    
+    def _scores(self, torch, logits):
+        """Zero-shot label probabilities from the entailment logit of each hypothesis"""
+        entailment = logits[:, self.entailment_id].reshape(-1, len(self.hypotheses)).float()
+        return torch.softmax(entailment, dim=-1)
+    
+    def weights_changed(self):
+        """Called after the weights were released, remapped or reloaded"""
+        pass
+    
+    def postprocess(self, scores: 'np.ndarray') -> List[Dict]:
+        """Postprocessing stage: map score vectors to API results"""
+        results = []
+        for row in scores:
+            best = int(row.argmax())
+            results.append(build_result(self.classification_labels[best], float(row[best]), self.version))
+        return results
+    
+    def classify(self, texts: List[str]) -> List[Dict]:
+        """
+        Run all stages on preprocessed, non-empty texts (no concurrency limits)
+        Scores are stored but never read here, so timings stay honest
+        """
+        scores = self.forward(self.tokenize(texts))
+        if self.score_features is not None:
+            self.score_features.put(texts, scores)
+        return self.postprocess(scores)
+    
+    def get_info(self) -> Dict:
+        return {
+            'version': self.version,
+            'kind': self.kind,
+            'source': self.source,
+            'device': str(self.device),
+            'loaded_at': self.loaded_at,
+            'weights_mapped': self.weights_mapped
+        }
+
+class _PinnedStages:
+    """Pipeline stage functions bound to one backend for the whole request"""
+    
+    def __init__(self, classifier, backend: ModelBackend):
+        self.classifier = classifier
+        self.backend = backend
+        self.model_version = backend.version
+    
+    def preprocess_email_content(self, content: str, subject: str = "") -> str:
+        return self.classifier.preprocess_email_content(content, subject)
+    
+    def tokenize(self, texts: List[str]):
+        return self.classifier.tokenize(texts, self.backend)
+    
+    def forward(self, encoded):
+        return self.classifier.forward(encoded, self.backend)
+    
+    def postprocess(self, scores) -> List[Dict]:
+        return self.classifier.postprocess(scores, self.backend)
+
+class EmailClassifier:
+    """
+    AI-powered email classifier using DistilBERT
+    Provides email categorization with confidence scores
+    """
+    
+    def __init__(self):
+        self.backend = None
+        self.registry = get_model_registry()
+        self.pipeline_stats = PipelineStats()
+        self.feature_store = get_feature_store() if config.FEATURE_STORE_ENABLED else None
+        self.link_hints = LinkHints() if config.LINK_HINTS_ENABLED else None
+        self.boilerplate = BoilerplateStripper() if config.BOILERPLATE_STRIP_ENABLED else None
+        self.long_emails = LongEmailChunker(
+            [keyword for keywords in RULE_KEYWORDS.values() for keyword in keywords]
+            + [word for label in LABEL_MAPPING for word in label.split() if len(word) > 3],
+            window=MAX_TEXT_CHARS
+        ) if config.LONG_EMAIL_ENABLED else None
+        
+        # Inference tuning knobs (see utils/autotune.py)
+        self.batch_size = config.INFERENCE_BATCH_SIZE
+        self.inference_workers = config.INFERENCE_WORKERS
+        self._inference_slots = threading.BoundedSemaphore(self.inference_workers)
+        self.labels = config.CLASSIFICATION_LABELS
+        self.model_cache_dir = config.MODEL_CACHE_DIR
+        self.is_loaded = False
+        self.is_loading = False
+        self._load_lock = threading.Lock()
+        
+        # Hot swap state (see swap_model)
+        self._swap_lock = threading.Lock()
+        self.swap_status = {'running': False, 'target': None, 'last': None, 'error': None}
+        
+        # Idle unloading state (see utils/idle_policy.py)
+        self.last_used = time.time()
+        self.unloaded_at = None
+        self._reload_started = None
+        self.idle_stats = {
+            'unloads': 0,
+            'reloads': 0,
+            'rule_fallbacks': 0,
+            'last_unload': None,
+            'last_reload_ms': None,
+            'first_inference_after_reload_ms': None
+        }
+        
+        # Ensure model cache directory exists
+        os.makedirs(self.model_cache_dir, exist_ok=True)
+        
+    def load_model(self) -> bool:
+        """
+        Load proper email classification model
+        Concurrent callers wait for a load already in progress
+        Returns True if successful, False otherwise
+        """
+        with self._load_lock:
+            if self.is_loaded:
+                return True
+            self.is_loading = True
+            try:
+                return self._load_model()
+            finally:
+                self.is_loading = False
+    
+    def _load_model(self) -> bool:
+        try:
+            logger.info("Loading email classification model...")
+            torch, transformers = _import_backend()
+            started = time.perf_counter()
+            
+            if self.unloaded_at is not None:
+                # Weights released by the idle policy come back from the snapshot
+                if not self._load_snapshot(torch, transformers):
+                    self.backend.model = self.load_backend(self.backend.version, self.backend.kind).model
+                    self.backend.weights_changed()
+                self._record_reload(started)
+            else:
+                # Start on the version last swapped in, if any
+                version = self.registry.active_version or DEFAULT_MODEL_VERSION
+                self.backend = self.load_backend(version)
+                if self.registry.active_version is None:
+                    self.registry.set_active(version)
             
             self.is_loaded = True
+            mark('model_loaded')
             logger.info("Email classification model loaded successfully")
             return True
             
@@ -85,38 +369,342 @@ class EmailClassifier:
             self.is_loaded = False
             return False
     
+    def load_backend(self, version: str, kind: str = None) -> ModelBackend:
+        """
+        Load a model version without activating it
+        
+        Args:
+            version: Registered version or Hugging Face hub id
+            kind: Backend implementation (see backend_kind)
+            
+        Returns:
+            The loaded backend
+        """
+        torch, transformers = _import_backend()
+        source = self.registry.resolve(version)
+        kind = self.backend_kind(version, kind)
+        
+        backend_class = ModelBackend
+        model_kwargs = {}
+        backend_kwargs = {}
+        if kind == 'compiled':
+            from utils.compiled_backend import CompiledBackend
+            backend_class = CompiledBackend
+            model_kwargs = CompiledBackend.model_kwargs()
+        elif kind == 'student':
+            from utils.student_backend import StudentBackend
+            backend_class = StudentBackend
+        elif kind == 'prototype':
+            from utils.prototype_backend import PrototypeBackend
+            backend_class = PrototypeBackend
+            if self.feature_store is not None:
+                backend_kwargs['embedding_features'] = self.feature_store.table(
+                    'embeddings', f"{version}@{config.PROTOTYPE_MAX_LENGTH}"
+                )
+        
+        # Load the NLI model directly so tokenisation and the forward
+        # pass can run as separate pipeline stages
+        device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        tokenizer = transformers.AutoTokenizer.from_pretrained(source, cache_dir=self.model_cache_dir)
+        model = backend_class.auto_model(transformers).from_pretrained(
+            source, cache_dir=self.model_cache_dir, **model_kwargs
+        )
+        model.to(device)
+        model.eval()
+        backend = backend_class(version, source, model, tokenizer, device, **backend_kwargs)
+        
+        # Prototype scores move with the examples, so only their embeddings are stored
+        if self.feature_store is not None and kind != 'prototype':
+            backend.score_features = self.feature_store.table('scores', backend.feature_name)
+        return backend
+    
+    def backend_kind(self, version: str, kind: str = None) -> str:
+        """
+        Backend implementation for a model version
+        
+        Args:
+            version: Registered version or Hugging Face hub id
+            kind: Explicit choice; otherwise the 'backend' recorded in the
+                version's registry metadata (e.g. 'student' for distilled
+                models), then CLASSIFIER_BACKEND
+            
+        Returns:
+            'eager', 'compiled' (NLI models), 'student' (single-pass
+            classifiers) or 'prototype' (sentence encoders)
+        """
+        manifest = self.registry.get(version) or {}
+        kind = kind or manifest.get('metadata', {}).get('backend') or config.CLASSIFIER_BACKEND
+        if kind not in BACKEND_KINDS:
+            raise ValueError(f"Unknown classifier backend: {kind}")
+        return kind
+    
+    def swap_model(self, version: str, rollback: bool = False) -> Dict:
+        """
+        Load and warm up a model version, then atomically make it active
+        Requests already running finish on the backend they started with
+        
+        Args:
+            version: Registered version or Hugging Face hub id
+            rollback: The swap returns to the previous version
+            
+        Returns:
+            Summary of the swap
+            
+        Raises:
+            RuntimeError: if another swap is in progress
+        """
+        if not self._swap_lock.acquire(blocking=False):
+            raise RuntimeError("A model swap is already in progress")
+        
+        try:
+            self.swap_status.update({'running': True, 'target': version, 'error': None})
+            started = time.perf_counter()
+            candidate = self.load_backend(version)
+            if config.WARMUP_ENABLED:
+                self.warm_up(backend=candidate)
+            
+            with self._load_lock:
+                previous = self.backend
+                self.backend = candidate
+                self.unloaded_at = None
+                self.is_loaded = True
+            self.registry.set_active(version, rollback=rollback)
+            
+            summary = {
+                'version': version,
+                'previous_version': previous.version if previous else None,
+                'rollback': rollback,
+                'duration_seconds': round(time.perf_counter() - started, 2),
+                'timestamp': time.time()
+            }
+            self.swap_status['last'] = summary
+            logger.info(f"🔄 Swapped model {summary['previous_version']} -> {version} "
+                        f"in {summary['duration_seconds']}s")
+            return summary
+        except Exception as e:
+            self.swap_status['error'] = str(e)
+            raise
+        finally:
+            self.swap_status['running'] = False
+            self._swap_lock.release()
+    
+    def rollback_model(self) -> Dict:
+        """
+        Swap back to the version that was active before the current one
+        
+        Raises:
+            ValueError: if there is no previous version
+        """
+        previous = self.registry.previous_version
+        if previous is None:
+            raise ValueError("No previous model version to roll back to")
+        return self.swap_model(previous, rollback=True)
+    
+    def swap_in_background(self, version: str = None, rollback: bool = False) -> bool:
+        """
+        Start a swap (or rollback when version is None) in a background thread
+        Returns False if a swap is already running
+        """
+        if self.swap_status['running']:
+            return False
+        
+        def target():
+            try:
+                if version is None:
+                    self.rollback_model()
+                else:
+                    self.swap_model(version, rollback)
+            except Exception as e:
+                logger.error(f"Model swap failed: {str(e)}")
+        
+        threading.Thread(target=target, name='model-swap', daemon=True).start()
+        return True
+    
+    def _snapshot_path(self) -> str:
+        slug = re.sub(r'[^A-Za-z0-9]+', '-', self.backend.version)
+        return os.path.join(self.model_cache_dir, 'mmap', f"{slug}.pt")
+    
+    def _save_snapshot(self, torch) -> str:
+        """Write the weights once in a format torch can memory-map on reload"""
+        path = self._snapshot_path()
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            torch.save(self.backend.model.state_dict(), path + '.tmp')
+            os.replace(path + '.tmp', path)
+            logger.info(f"💾 Saved memory-mappable weights to {path}")
+        return path
+    
+    def _load_snapshot(self, torch, transformers) -> bool:
+        """Rebuild the released model around its memory-mapped snapshot (needs torch >= 2.1)"""
+        try:
+            state = torch.load(self._snapshot_path(), mmap=True, weights_only=True)
+            with torch.device('meta'):
+                model = self.backend.auto_model(transformers).from_config(self.backend.model_config)
+            model.load_state_dict(state, assign=True)
+            model.tie_weights()
+        except Exception as e:
+            logger.warning(f"Memory-mapped reload failed, loading from the model cache: {str(e)}")
+            return False
+        
+        self.backend.model = model.to(self.backend.device).eval()
+        self.backend.weights_mapped = self.backend.device.type == 'cpu'
+        self.backend.weights_changed()
+        return True
+    
+    def _record_reload(self, started: float):
+        self.unloaded_at = None
+        self._reload_started = time.perf_counter()
+        self.idle_stats['reloads'] += 1
+        self.idle_stats['last_reload_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        logger.info(f"⏰ Model reloaded in {self.idle_stats['last_reload_ms']:.0f}ms")
+    
+    def unload(self, mode: str = 'release') -> bool:
+        """
+        Free the model's memory after an idle period (see utils/idle_policy.py)
+        
+        Args:
+            mode: 'release' drops the weights until a request triggers a
+                reload; 'mmap' rebinds them to the memory-mapped snapshot so
+                the OS can page them out while the model stays loaded
+            
+        Returns:
+            True if the model was unloaded or remapped
+        """
+        import torch
+        
+        with self._load_lock:
+            if not self.is_loaded:
+                return False
+            backend = self.backend
+            
+            rss_before = rss_bytes()
+            try:
+                path = self._save_snapshot(torch)
+            except Exception as e:
+                logger.warning(f"Could not save memory-mappable weights: {str(e)}")
+                path = None
+            if path is None or backend.device.type != 'cpu':
+                mode = 'release'
+            
+            # Let in-flight forward passes finish first
+            slots, workers = self._inference_slots, self.inference_workers
+            for _ in range(workers):
+                slots.acquire()
+            try:
+                if mode == 'mmap':
+                    try:
+                        backend.model.load_state_dict(torch.load(path, mmap=True, weights_only=True), assign=True)
+                        backend.model.tie_weights()
+                        backend.weights_mapped = True
+                    except Exception as e:
+                        logger.warning(f"Could not memory-map weights, releasing them: {str(e)}")
+                        mode = 'release'
+                if mode == 'release':
+                    backend.model = None
+                    backend.weights_mapped = False
+                    self.is_loaded = False
+                    self.unloaded_at = time.time()
+                backend.weights_changed()
+            finally:
+                for _ in range(workers):
+                    slots.release()
+            
+            gc.collect()
+            if backend.device.type == 'cuda':
+                torch.cuda.empty_cache()
+            
+            rss_after = rss_bytes()
+            self.idle_stats['unloads'] += 1
+            self.idle_stats['last_unload'] = {
+                'mode': mode,
+                'timestamp': time.time(),
+                'rss_before_bytes': rss_before,
+                'rss_after_bytes': rss_after,
+                'freed_bytes': rss_before - rss_after
+            }
+            logger.info(f"💤 Model idle, weights {'memory-mapped' if mode == 'mmap' else 'released'} "
+                        f"({(rss_before - rss_after) / 2**20:.0f} MB freed)")
+            return True
+    
+    def load_in_background(self):
+        """Start loading the model without blocking the caller"""
+        threading.Thread(target=self.load_model, name='model-loader', daemon=True).start()
+    
     def preprocess_email_content(self, content: str, subject: str = "") -> str:
         """
         Preprocess email content for better classification
         Combines subject and content, cleans text
         """
+        return self.preprocess_with_links(content, subject)[0]
+    
+    def preprocess_with_links(self, content: str, subject: str = "") -> Tuple[str, List[str]]:
+        """
+        preprocess_email_content that also returns the hosts of the removed URLs
+        
+        Returns:
+            (preprocessed text, link hosts in order of appearance)
+        """
+        full_text, hosts = self._clean_email(content, subject)
+        
+        # Truncate to reasonable length (DistilBERT has token limits)
+        return full_text[:MAX_TEXT_CHARS].strip(), hosts
+    
+    def _clean_email(self, content: str, subject: str = "") -> Tuple[str, List[str]]:
+        """Preprocessing before truncation: (cleaned subject and body, link hosts)"""
+        hosts = []
+        
+        def remove_url(match):
+            host = link_host(match.group(0))
+            if host:
+                hosts.append(host)
+            return ''
+        
         try:
+            # Remove quoted replies, forwarded headers, signatures and footers
+            # (line by line, so before whitespace is collapsed)
+            if self.boilerplate is not None and content:
+                content = self.boilerplate.strip(content)
+            
             # Combine subject and content
             full_text = f"{subject} {content}" if subject else content
             
             # Remove excessive whitespace
             full_text = re.sub(r'\s+', ' ', full_text)
             
-            # Remove email signatures (common patterns)
-            full_text = re.sub(r'--\s*\n.*', '', full_text, flags=re.DOTALL)
+            # Remove email signatures (common patterns, also in bodies without line breaks)
             full_text = re.sub(r'Sent from my.*', '', full_text)
             full_text = re.sub(r'Best regards.*', '', full_text, flags=re.DOTALL)
             
-            # Remove URLs
-            full_text = re.sub(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', '', full_text)
+            # Remove URLs, keeping their hosts for link hints
+            full_text = re.sub(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', remove_url, full_text)
             
             # Remove email addresses
             full_text = re.sub(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', '', full_text)
             
-            # Truncate to reasonable length (DistilBERT has token limits)
-            if len(full_text) > 512:
-                full_text = full_text[:512]
-            
-            return full_text.strip()
+            return full_text, hosts
             
         except Exception as e:
             logger.error(f"Error preprocessing email content: {str(e)}")
-            return content[:512] if content else ""
+            return (content or ""), hosts
+    
+    def screen_email(self, content: str, subject: str = "") -> Tuple[List[str], Optional[Dict]]:
+        """
+        Preprocess an email into model inputs and check its links for a category hint
+        
+        Returns:
+            (model input texts, link hint result or None). The first text is
+            preprocess_email_content's; emails longer than one input add up
+            to LONG_EMAIL_MAX_CHUNKS - 1 more chunks (see utils/long_email.py)
+        """
+        full_text, hosts = self._clean_email(content, subject)
+        if self.long_emails is not None and len(full_text.strip()) > MAX_TEXT_CHARS:
+            texts = self.long_emails.chunks(full_text, subject or '')
+        else:
+            texts = [full_text[:MAX_TEXT_CHARS].strip()]
+        
+        if self.link_hints is None or not hosts:
+            return texts, None
+        return texts, self.link_hints.result(hosts)
     
     def rule_based_classification(self, content: str, subject: str = "") -> Dict:
         """
@@ -126,32 +714,9 @@ class EmailClassifier:
         try:
             full_text = f"{subject} {content}".lower()
             
-            # Define keyword patterns for each category
-            patterns = {
-                'Spam': [
-                    'unsubscribe', 'click here', 'limited time', 'act now',
-                    'free money', 'guarantee', 'winner', 'congratulations',
-                    'viagra', 'casino', 'lottery', 'inheritance'
-                ],
-                'Important': [
-                    'urgent', 'important', 'asap', 'deadline', 'action required',
-                    'verification', 'security', 'password', 'account', 'confirm',
-                    'invoice', 'payment', 'bill', 'receipt'
-                ],
-                'Work': [
-                    'meeting', 'project', 'deadline', 'report', 'team',
-                    'client', 'business', 'office', 'conference', 'schedule',
-                    'proposal', 'contract', 'budget', 'quarterly'
-                ],
-                'Personal': [
-                    'family', 'friend', 'vacation', 'birthday', 'dinner',
-                    'weekend', 'party', 'holiday', 'personal', 'home'
-                ]
-            }
-            
             # Score each category
             scores = {}
-            for label, keywords in patterns.items():
+            for label, keywords in RULE_KEYWORDS.items():
                 score = sum(1 for keyword in keywords if keyword in full_text)
                 scores[label] = score
             
@@ -165,14 +730,16 @@ class EmailClassifier:
                     return {
                         'label': best_label,
                         'confidence': confidence,
-                        'reasoning': f'Rule-based classification using keyword matching'
+                        'reasoning': f'Rule-based classification using keyword matching',
+                        'model_version': RULE_BASED_MODEL_VERSION
                     }
             
             # Default classification
             return {
                 'label': 'Review',
                 'confidence': 0.5,
-                'reasoning': 'No clear classification patterns found - requires manual review'
+                'reasoning': 'No clear classification patterns found - requires manual review',
+                'model_version': RULE_BASED_MODEL_VERSION
             }
             
         except Exception as e:
@@ -180,7 +747,8 @@ class EmailClassifier:
             return {
                 'label': 'Review',
                 'confidence': 0.3,
-                'reasoning': 'Classification error - manual review recommended'
+                'reasoning': 'Classification error - manual review recommended',
+                'model_version': RULE_BASED_MODEL_VERSION
             }
     
     def classify_email(self, content: str, subject: str = "") -> Dict:
@@ -195,102 +763,291 @@ class EmailClassifier:
             Dict with label, confidence, and reasoning
         """
         try:
-            # Ensure model is loaded
-            if not self.is_loaded:
-                logger.warning("AI model not loaded, attempting to load...")
-                if not self.load_model():
-                    logger.warning("AI model unavailable, using rule-based fallback")
-                    return self.rule_based_classification(content, subject)
+            # Preprocess content; links mostly to one category answer without the model
+            texts, hint = self.screen_email(content, subject)
+            if hint:
+                return hint
             
-            # Preprocess content
-            processed_text = self.preprocess_email_content(content, subject)
+            # Ensure model is loaded (the rules answer while it loads in the background)
+            if not self.model_available():
+                return self.rule_based_classification(content, subject)
+            backend = self.backend
             
-            if not processed_text:
+            if not texts[0]:
                 return {
                     'label': 'Review',
                     'confidence': 0.1,
-                    'reasoning': 'Empty or invalid email content'
+                    'reasoning': 'Empty or invalid email content',
+                    'model_version': backend.version
                 }
             
-            # Perform zero-shot classification
-            result = self.classifier(processed_text, self.classification_labels)
-            
-            # Extract top prediction
-            top_label = result['labels'][0]
-            confidence = result['scores'][0]
-            
-            # Map detailed labels to intelligent categories
-            label_mapping = {
-                "work and business communications": "Work",
-                "personal and social messages": "Personal",
-                "spam and promotional content": "Spam",
-                "important and urgent notifications": "Important",
-                "newsletters and updates": "Newsletters",
-                "financial and banking communications": "Finance",
-                "shopping and e-commerce notifications": "Shopping",
-                "travel and booking confirmations": "Travel",
-                "educational and learning content": "Education",
-                "social media and platform notifications": "Social-Media",
-                "health and medical communications": "Health",
-                "legal and official documents": "Legal",
-                "technical and IT communications": "Technical",
-                "project management and collaboration": "Projects",
-                "customer service and support": "Support",
-                "entertainment and media content": "Entertainment"
-            }
-            
-            final_label = label_mapping.get(top_label, "Review")
+            # Perform zero-shot classification (once per text and model), one pass for all chunks
+            def compute(texts):
+                return self.forward(self.tokenize(texts, backend), backend)
+            if backend.score_features is not None:
+                scores = backend.score_features.get_or_compute(texts, compute)
+            else:
+                scores = compute(texts)
             
-            # Apply confidence-based refinement
-            if confidence < 0.6:
-                final_label = "Review"  # Low confidence items need manual review
-            elif confidence > 0.9 and "spam" in top_label.lower():
-                final_label = "Spam"  # High confidence spam detection
-            
-            return {
-                'label': final_label,
-                'confidence': round(confidence, 3),
-                'reasoning': f'AI zero-shot classification: {top_label} ({confidence:.3f})'
-            }
+            return self.postprocess(pool_scores(scores)[None], backend)[0]
             
         except Exception as e:
             logger.error(f"Error in AI classification: {str(e)}")
             logger.warning("Falling back to rule-based classification")
             return self.rule_based_classification(content, subject)
     
-    def batch_classify(self, emails: List[Dict]) -> List[Dict]:
+    def tokenize(self, texts: List[str], backend: ModelBackend = None):
+        """Tokenisation stage of the given backend (defaults to the active one)"""
+        return (backend or self.backend).tokenize(texts)
+    
+    def forward(self, encoded, backend: ModelBackend = None) -> 'np.ndarray':
+        """
+        Inference stage of the given backend (defaults to the active one)
+        Concurrent requests share a bounded number of forward passes
+        """
+        backend = backend or self.backend
+        self.last_used = time.time()
+        started = time.perf_counter()
+        
+        with self._inference_slots:
+            scores = backend.forward(encoded)
+        
+        # First pass after an idle reload pays for paging the weights back in
+        if self._reload_started is not None:
+            self._reload_started = None
+            self.idle_stats['first_inference_after_reload_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        return scores
+    
+    def postprocess(self, scores: 'np.ndarray', backend: ModelBackend = None) -> List[Dict]:
+        """Postprocessing stage of the given backend (defaults to the active one)"""
+        return (backend or self.backend).postprocess(scores)
+    
+    def classify_stream(self, emails: Iterable[Dict], batch_size: int = None,
+                        preprocessed: bool = False, ramp_up: bool = False,
+                        use_features: bool = True) -> Iterator[Dict]:
+        """
+        Classify an iterable of emails through the staged inference pipeline
+        Results are yielded in input order as soon as their batch is done
+        
+        Args:
+            emails: Dicts with 'content' and optional 'subject' keys, or
+                preprocessed texts or screen_email results when preprocessed is True
+            batch_size: Inference batch size (defaults to the tuned batch size)
+            preprocessed: Inputs already went through preprocess_email_content or screen_email
+            ramp_up: Start with small batches to return the first results sooner
+            use_features: Read stored score vectors (False always runs the model,
+                e.g. to time it)
+            
+        Raises:
+            RuntimeError: if the AI model cannot be loaded or is still loading
+                (callers choose the fallback)
+        """
+        if not self.model_available():
+            raise RuntimeError("AI model still loading" if self.is_loading else "AI model unavailable")
+        
+        # Pin the active backend so a hot swap mid-stream does not mix models
+        backend = self.backend
+        pipeline = InferencePipeline(
+            _PinnedStages(self, backend),
+            batch_size=batch_size or self.batch_size,
+            preprocessed=preprocessed,
+            ramp_up=ramp_up,
+            stats=self.pipeline_stats,
+            features=backend.score_features if use_features else None,
+            screen=self.screen_email
+        )
+        yield from pipeline.run(emails)
+    
+    def batch_classify(self, emails: List[Dict], batch_size: int = None) -> List[Dict]:
         """
         Classify multiple emails efficiently
+        Preprocessing and tokenisation of the next batch overlap with the
+        forward pass of the current one (see utils/pipeline.py)
         
         Args:
             emails: List of dicts with 'content' and optional 'subject' keys
+            batch_size: Inference batch size (defaults to the tuned batch size)
             
         Returns:
             List of classification results
         """
+        if not emails:
+            return []
+        
         try:
-            results = []
-            
-            for email in emails:
-                content = email.get('content', '')
-                subject = email.get('subject', '')
-                
-                result = self.classify_email(content, subject)
-                results.append(result)
-            
-            return results
+            return list(self.classify_stream(emails, batch_size))
             
         except Exception as e:
             logger.error(f"Error in batch classification: {str(e)}")
-            return [{'label': 'Review', 'confidence': 0.1, 'reasoning': 'Batch processing error'}] * len(emails)
+            logger.warning("Falling back to rule-based classification")
+            return [
+                self.screen_email(email.get('content', ''), email.get('subject', ''))[1]
+                or self.rule_based_classification(email.get('content', ''), email.get('subject', ''))
+                for email in emails
+            ]
+    
+    def classify_texts(self, texts: List[str], batch_size: int = None, use_features: bool = True) -> List[Dict]:
+        """
+        Classify texts that already went through preprocess_email_content
+        
+        Args:
+            texts: Preprocessed email texts
+            batch_size: Inference batch size (defaults to the tuned batch size)
+            use_features: Read stored score vectors (see classify_stream)
+            
+        Returns:
+            List of classification results
+            
+        Raises:
+            RuntimeError: if the AI model cannot be loaded (callers choose the fallback)
+        """
+        return list(self.classify_stream(texts, batch_size, preprocessed=True, use_features=use_features))
+    
+    def scheduler_batch_sizes(self) -> List[int]:
+        """Batch sizes the pipeline produces: single emails, ramp-up steps and full batches"""
+        sizes = []
+        size = 1
+        while size < self.batch_size:
+            sizes.append(size)
+            size *= 2
+        sizes.append(self.batch_size)
+        return sizes
+    
+    def warm_up(self, batch_sizes: List[int] = None, backend: ModelBackend = None) -> Dict:
+        """
+        Run synthetic batches at every scheduler batch size
+        Pays for allocator initialisation, kernel selection and tokenizer
+        cache fills before readiness is reported instead of on a user request
+        
+        Args:
+            batch_sizes: Sizes to warm (defaults to scheduler_batch_sizes)
+            backend: Model to warm, e.g. a hot swap candidate (defaults to the active one)
+            
+        Returns:
+            Warm-up timings, also reported in get_model_info
+        """
+        backend = backend or self.backend
+        if backend is None or backend.model is None:
+            return {}
+        
+        # Compiled backends build their graphs before anything is timed
+        if hasattr(backend, 'precompile'):
+            backend.precompile()
+        
+        sizes = batch_sizes or config.WARMUP_BATCH_SIZES or self.scheduler_batch_sizes()
+        texts = synthetic_emails(max(sizes))
+        
+        def timed_batch(size):
+            start = time.perf_counter()
+            self.postprocess(self.forward(self.tokenize(texts[:size], backend), backend), backend)
+            return (time.perf_counter() - start) * 1000
+        
+        started = time.perf_counter()
+        cold_ms = timed_batch(1)
+        batch_ms = {size: round(timed_batch(size), 1) for size in sizes}
+        warm_ms = timed_batch(1)
+        
+        backend.warmup_info = {
+            'batch_sizes': sizes,
+            'cold_latency_ms': round(cold_ms, 1),
+            'warm_latency_ms': round(warm_ms, 1),
+            'cold_warm_delta_ms': round(cold_ms - warm_ms, 1),
+            'batch_latency_ms': batch_ms,
+            'duration_seconds': round(time.perf_counter() - started, 2)
+        }
+        logger.info(f"🔥 Model warmed up: first batch {cold_ms:.0f}ms cold, {warm_ms:.0f}ms warm")
+        return backend.warmup_info
+    
+    def model_available(self) -> bool:
+        """
+        Whether requests can use the model right now
+        Loads it on demand, but returns False instead of waiting while a
+        background load (fast-start mode or an idle reload) is in progress
+        """
+        if self.is_loaded:
+            return True
+        
+        if self.is_loading or self.unloaded_at is not None:
+            # Released by the idle policy: reload in the background, rules answer meanwhile
+            if not self.is_loading:
+                self.load_in_background()
+            self.idle_stats['rule_fallbacks'] += 1
+            return False
+        
+        logger.warning("AI model not loaded, attempting to load...")
+        if not self.load_model():
+            logger.warning("AI model unavailable, using rule-based fallback")
+            return False
+        return True
+    
+    @property
+    def model_version(self) -> Optional[str]:
+        """Version of the active backend (None before the first load)"""
+        return self.backend.version if self.backend else None
+    
+    @property
+    def warmup_info(self) -> Optional[Dict]:
+        return self.backend.warmup_info if self.backend else None
+    
+    @property
+    def weights_mapped(self) -> bool:
+        return bool(self.backend and self.backend.weights_mapped)
+    
+    @property
+    def is_ready(self) -> bool:
+        """Model loaded, or idle-unloaded and reloadable, and (when enabled) warmed up"""
+        return (self.is_loaded or self.unloaded_at is not None) and (self.warmup_info is not None or not config.WARMUP_ENABLED)
+    
+    def configure_inference(self, batch_size: int = None, workers: int = None):
+        """
+        Apply tuned inference settings
+        
+        Args:
+            batch_size: Emails per forward pass
+            workers: Maximum concurrent forward passes
+        """
+        if batch_size:
+            self.batch_size = batch_size
+        if workers and workers != self.inference_workers:
+            self.inference_workers = workers
+            self._inference_slots = threading.BoundedSemaphore(workers)
+    
+    @property
+    def active_model_version(self) -> str:
+        """Version tag of the model currently answering requests"""
+        if self.is_loaded and self.model_version:
+            return self.model_version
+        return RULE_BASED_MODEL_VERSION
+    
+    def _inference_info(self) -> Dict:
+        info = {'batch_size': self.batch_size, 'workers': self.inference_workers}
+        # Only report thread counts once torch is in use; never import it just for /health
+        torch = sys.modules.get('torch')
+        if torch is not None:
+            info['torch_threads'] = torch.get_num_threads()
+            info['torch_interop_threads'] = torch.get_num_interop_threads()
+        return info
     
     def get_model_info(self) -> Dict:
         """Get information about the loaded model"""
         return {
             'is_loaded': self.is_loaded,
+            'is_loading': self.is_loading,
             'model_name': config.MODEL_NAME,
+            'model_version': self.active_model_version,
+            'is_ready': self.is_ready,
+            'warmup': self.warmup_info,
             'labels': self.labels,
-            'cache_dir': self.model_cache_dir
+            'cache_dir': self.model_cache_dir,
+            'inference': self._inference_info(),
+            'backend': self.backend.get_info() if self.backend else None,
+            'swap': self.swap_status,
+            'pipeline': self.pipeline_stats.as_dict(),
+            'idle': self.idle_stats,
+            'features': self.feature_store.get_status() if self.feature_store else None,
+            'link_hints': self.link_hints.get_info() if self.link_hints else None,
+            'boilerplate': self.boilerplate.get_info() if self.boilerplate else None,
+            'long_emails': self.long_emails.get_info() if self.long_emails else None
         }
 
 # Global classifier instance
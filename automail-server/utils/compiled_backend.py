@@ -0,0 +1,189 @@
+"""
+Compiled NLI backend for Automail AI Server
+Runs the forward pass through TorchScript traces (or torch.compile graphs)
+built for the batch shapes the inference scheduler produces. Inputs are
+padded up to a sequence-length bucket so only a few shapes exist; any
+other shape, or a graph that fails, runs in eager mode.
+"""
+import os
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+from config.config import get_config
+from utils.classifier import ModelBackend
+from utils.model_registry import version_slug
+
+config = get_config()
+logger = logging.getLogger(__name__)
+
+COMPILE_MODES = ('torchscript', 'inductor')
+
+class CompiledBackend(ModelBackend):
+    """
+    ModelBackend whose forward pass runs a compiled graph per (texts, sequence bucket)
+
+    torchscript: one traced graph per shape, saved under
+        MODEL_CACHE_DIR/compiled/<version>/<torch version>/ and loaded on later
+        starts instead of re-tracing; loaded graphs share the eager weights
+    inductor: torch.compile with the FX graph cache pointed at the same
+        directory, so cold starts reuse compiled kernels
+    """
+
+    kind = 'compiled'
+
+    def __init__(self, version: str, source: str, model, tokenizer, device,
+                 mode: str = None, seq_buckets=None, batch_sizes=None, cache_dir: str = None):
+        super().__init__(version, source, model, tokenizer, device)
+        import torch
+
+        self.mode = mode or config.COMPILE_MODE
+        if self.mode not in COMPILE_MODES:
+            raise ValueError(f"COMPILE_MODE must be one of {COMPILE_MODES}")
+
+        self.seq_buckets = sorted(seq_buckets or config.COMPILED_SEQ_BUCKETS)
+        self.batch_sizes = set(batch_sizes or _compiled_batch_sizes())
+        self.cache_dir = os.path.join(
+            cache_dir or config.MODEL_CACHE_DIR, 'compiled', version_slug(version),
+            f"torch-{torch.__version__.split('+')[0]}-{device.type}"
+        )
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        self._graphs = {}
+        self._failed = set()
+        self._compiled = None
+        self._lock = threading.Lock()
+        self.compile_stats = {'compiled_calls': 0, 'eager_calls': 0, 'traced': 0, 'loaded_from_disk': 0}
+
+        if self.mode == 'inductor':
+            os.environ.setdefault('TORCHINDUCTOR_CACHE_DIR', os.path.join(self.cache_dir, 'inductor'))
+            os.environ.setdefault('TORCHINDUCTOR_FX_GRAPH_CACHE', '1')
+
+    @staticmethod
+    def model_kwargs() -> Dict:
+        """from_pretrained arguments: tuple outputs are required for tracing"""
+        return {'torchscript': True}
+
+    def _inference_context(self, torch):
+        # Traces cannot be recorded from inference-mode tensors
+        return torch.no_grad()
+
+    def _bucket(self, texts: int, seq_len: int) -> Optional[Tuple[int, int]]:
+        """Compiled shape for a batch, or None if it should run eagerly"""
+        if texts not in self.batch_sizes:
+            return None
+        for bucket in self.seq_buckets:
+            if seq_len <= bucket:
+                return texts, bucket
+        return None
+
+    def _graph_path(self, key: Tuple[int, int]) -> str:
+        return os.path.join(self.cache_dir, f"texts{key[0]}-seq{key[1]}.pt")
+
+    def _share_weights(self, graph, model):
+        """Point a graph loaded from disk at the eager model's tensors instead of its own copy"""
+        import torch
+
+        tensors = dict(model.named_parameters())
+        tensors.update(model.named_buffers())
+        with torch.no_grad():
+            for name, tensor in list(graph.named_parameters()) + list(graph.named_buffers()):
+                if name in tensors and tensors[name].shape == tensor.shape:
+                    tensor.set_(tensors[name])
+
+    def _torchscript_graph(self, key: Tuple[int, int], model, ids, mask):
+        import torch
+
+        graph = self._graphs.get(key)
+        if graph is not None:
+            return graph
+
+        with self._lock:
+            graph = self._graphs.get(key)
+            if graph is not None:
+                return graph
+
+            path = self._graph_path(key)
+            if os.path.exists(path):
+                graph = torch.jit.load(path, map_location=self.device)
+                self._share_weights(graph, model)
+                self.compile_stats['loaded_from_disk'] += 1
+            else:
+                logger.info(f"🔧 Tracing NLI forward pass for {key[0]} texts x {key[1]} tokens")
+                graph = torch.jit.trace(model, (ids, mask), strict=False, check_trace=False)
+                torch.jit.save(graph, path + '.tmp')
+                os.replace(path + '.tmp', path)
+                self.compile_stats['traced'] += 1
+            self._graphs[key] = graph
+            return graph
+
+    def _logits(self, model, encoded):
+        import torch
+
+        ids, mask = encoded['input_ids'], encoded['attention_mask']
+        key = self._bucket(ids.shape[0] // len(self.hypotheses), ids.shape[1])
+        if key is not None and key not in self._failed:
+            pad = key[1] - ids.shape[1]
+            if pad:
+                ids = torch.nn.functional.pad(ids, (0, pad), value=self.tokenizer.pad_token_id)
+                mask = torch.nn.functional.pad(mask, (0, pad), value=0)
+            try:
+                if self.mode == 'torchscript':
+                    logits = self._torchscript_graph(key, model, ids, mask)(ids, mask)[0]
+                else:
+                    if self._compiled is None:
+                        self._compiled = torch.compile(model, dynamic=False)
+                    logits = self._compiled(input_ids=ids, attention_mask=mask)[0]
+                self.compile_stats['compiled_calls'] += 1
+                return logits
+            except Exception as e:
+                logger.warning(f"Compiled forward failed for {key}, using eager mode: {str(e)}")
+                self._failed.add(key)
+                ids, mask = encoded['input_ids'], encoded['attention_mask']
+
+        self.compile_stats['eager_calls'] += 1
+        return model(input_ids=ids, attention_mask=mask)[0]
+
+    def weights_changed(self):
+        # Graphs hold the old weights; rebuild them lazily around the new ones
+        with self._lock:
+            self._graphs = {}
+            self._compiled = None
+
+    def precompile(self, text: str = "Precompile example") -> Dict:
+        """Build (or load from disk) the graph for every batch size and sequence bucket"""
+        import torch
+
+        with torch.no_grad():
+            for batch_size in sorted(self.batch_sizes):
+                for bucket in self.seq_buckets:
+                    premises = [text for _ in range(batch_size) for _ in self.hypotheses]
+                    encoded = self.tokenizer(
+                        premises, self.hypotheses * batch_size, padding='max_length',
+                        max_length=bucket, truncation='only_first', return_tensors='pt'
+                    )
+                    self._logits(self.model, {key: value.to(self.device) for key, value in encoded.items()})
+        return dict(self.compile_stats)
+
+    def get_info(self) -> Dict:
+        return {
+            **super().get_info(),
+            'compile_mode': self.mode,
+            'seq_buckets': self.seq_buckets,
+            'batch_sizes': sorted(self.batch_sizes),
+            'cache_dir': self.cache_dir,
+            'compiled_shapes': [list(key) for key in sorted(self._graphs)],
+            'failed_shapes': [list(key) for key in sorted(self._failed)],
+            **self.compile_stats
+        }
+
+def _compiled_batch_sizes():
+    """
+    Batch sizes the pipeline can produce: ramp-up powers of two and every
+    full batch size the autotuner may pick (partial final batches run eagerly)
+    """
+    largest = max([config.INFERENCE_BATCH_SIZE] + config.AUTOTUNE_BATCH_SIZES)
+    sizes, size = set(), 1
+    while size < largest:
+        sizes.add(size)
+        size *= 2
+    return sizes | {config.INFERENCE_BATCH_SIZE} | set(config.AUTOTUNE_BATCH_SIZES)
@@ -0,0 +1,283 @@
+"""
+Correction lookup for Automail AI Server
+Emails corrected through /train are embedded with a small sentence encoder
+and stored in a vector index per API key plus a global one. A new email
+that is nearly identical to a corrected one gets the corrected label
+without running the classification model; one that is merely similar to
+a user's corrections can be answered by their adapter head.
+"""
+import os
+import time
+import logging
+import threading
+from typing import Dict, List, Optional
+import numpy as np
+from config.config import get_config
+from utils.model_registry import version_slug
+from utils.vector_index import VectorIndex
+from utils.adapters import AdapterStore
+
+config = get_config()
+logger = logging.getLogger(__name__)
+
+# Version tags recorded for results answered from corrections
+CORRECTION_MODEL_VERSION = 'knn-corrections'
+ADAPTER_MODEL_VERSION = 'user-adapter'
+
+# Old corrections replayed with new ones in an adapter update
+ADAPTER_REPLAY_EXAMPLES = 32
+
+GLOBAL_OWNER = 'global'
+
+# Seconds before loading a failed encoder is retried for lookups
+RETRY_LOAD_SECONDS = 300
+
+class CorrectionIndex:
+    """
+    Nearest-neighbour lookup over corrected emails
+
+    Each correction is added to its API key's index and to the global
+    index. Lookups try the caller's own corrections first, then everyone's
+    with a stricter similarity threshold. The encoder is loaded the first
+    time there is something to look up, so servers that never receive
+    corrections never load it.
+    """
+
+    def __init__(self, classifier, root: str = None, encoder: str = None, threshold: float = None,
+                 global_threshold: float = None, k: int = None):
+        self.classifier = classifier
+        self.encoder = encoder or config.KNN_ENCODER
+        self.root = root or os.path.join(config.DATA_DIR, 'corrections', version_slug(self.encoder))
+        self.threshold = threshold or config.KNN_THRESHOLD
+        self.global_threshold = global_threshold or config.KNN_GLOBAL_THRESHOLD
+        self.k = k or config.KNN_K
+
+        self.embedder = None
+        self.status = 'idle'
+        self.error = None
+        self._failed_at = 0.0
+        self._indexes = {}
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self.adapters = AdapterStore(os.path.join(self.root, 'adapters')) if config.ADAPTERS_ENABLED else None
+        self.stats = {'lookups': 0, 'user_hits': 0, 'adapter_hits': 0, 'global_hits': 0, 'added': 0, 'skipped': 0}
+
+    def _index_path(self, owner: str) -> str:
+        if owner == GLOBAL_OWNER:
+            return os.path.join(self.root, GLOBAL_OWNER)
+        return os.path.join(self.root, 'users', owner)
+
+    def _index(self, owner: str, dim: int = None) -> Optional[VectorIndex]:
+        """Open (or with dim, create) an owner's index; None if it does not exist"""
+        with self._lock:
+            index = self._indexes.get(owner)
+            if index is None:
+                path = self._index_path(owner)
+                if dim is None and not os.path.exists(path):
+                    return None
+                index = VectorIndex(path, dim)
+                self._indexes[owner] = index
+            return index
+
+    def has_corrections(self, api_key_id: str) -> bool:
+        return any(
+            index is not None and len(index) > 0
+            for index in (self._index(api_key_id), self._index(GLOBAL_OWNER))
+        )
+
+    def _load_embedder(self):
+        with self._load_lock:
+            if self.embedder is not None:
+                return self.embedder
+            self.status = 'loading'
+            try:
+                self.embedder = self.classifier.load_backend(self.encoder, 'prototype')
+                self.status = 'ready'
+                logger.info(f"🧷 Correction encoder {self.encoder} loaded")
+            except Exception as e:
+                logger.error(f"Failed to load correction encoder {self.encoder}: {str(e)}")
+                self.status = 'failed'
+                self.error = str(e)
+                self._failed_at = time.time()
+            return self.embedder
+
+    def _embedder_if_ready(self):
+        """The encoder, or None while it loads in the background"""
+        retry = self.status == 'failed' and time.time() - self._failed_at > RETRY_LOAD_SECONDS
+        if self.embedder is None and (self.status == 'idle' or retry):
+            self.status = 'loading'
+            threading.Thread(target=self._load_embedder, name='correction-encoder', daemon=True).start()
+        return self.embedder if self.status == 'ready' else None
+
+    def add(self, api_key_id: str, corrections: List[Dict]) -> Dict:
+        """
+        Embed and store corrections (loads the encoder if needed)
+
+        Args:
+            api_key_id: Owner of the corrections
+            corrections: Dicts with 'correct_label' and the email's 'content'
+                (and optional 'subject', 'email_id')
+
+        Returns:
+            Counts of indexed and skipped corrections
+
+        Raises:
+            RuntimeError: if the encoder cannot be loaded
+        """
+        usable, texts = [], []
+        for correction in corrections:
+            label = correction.get('correct_label')
+            content = correction.get('content')
+            text = self.classifier.preprocess_email_content(content, correction.get('subject') or '') \
+                if isinstance(content, str) else ''
+            if isinstance(label, str) and label and text:
+                usable.append(correction)
+                texts.append(text)
+
+        skipped = len(corrections) - len(usable)
+        if usable:
+            embedder = self._load_embedder()
+            if embedder is None:
+                raise RuntimeError(f"Correction encoder unavailable: {self.error}")
+            vectors = embedder.embed(texts)
+            now = time.time()
+            metas = [
+                {'label': c['correct_label'], 'email_id': str(c.get('email_id', '')), 'added_at': now}
+                for c in usable
+            ]
+            user_index = self._index(api_key_id, vectors.shape[1])
+            if self.adapters is not None:
+                # Replay a sample of earlier corrections so the head does not forget them
+                replay_vectors, replay_metas = user_index.sample(ADAPTER_REPLAY_EXAMPLES)
+                self.adapters.update(
+                    api_key_id,
+                    np.concatenate([vectors, replay_vectors]),
+                    [m['label'] for m in metas + replay_metas],
+                    new_examples=len(metas)
+                )
+            user_index.add(vectors, metas)
+            # Only labels go into the shared index
+            self._index(GLOBAL_OWNER, vectors.shape[1]).add(vectors, [{'label': m['label']} for m in metas])
+
+        with self._lock:
+            self.stats['added'] += len(usable)
+            self.stats['skipped'] += skipped
+        logger.info(f"📚 Indexed {len(usable)} corrections ({skipped} without content)")
+        return {'indexed': len(usable), 'skipped': skipped}
+
+    def _vote(self, neighbours, threshold: float, latest_wins: bool) -> Optional[Dict]:
+        """
+        Label from the neighbours above the threshold
+
+        Args:
+            latest_wins: Use the most recent of the closest corrections (a
+                user re-correcting an email), instead of a similarity-weighted vote
+        """
+        neighbours = [(similarity, meta) for similarity, meta in neighbours if similarity >= threshold]
+        if neighbours and latest_wins:
+            closest = neighbours[0][0]
+            similarity, meta = max(
+                (n for n in neighbours if n[0] >= closest - 1e-4), key=lambda n: n[1].get('added_at', 0)
+            )
+            return {'label': meta['label'], 'similarity': similarity}
+
+        weights, best = {}, {}
+        for similarity, meta in neighbours:
+            weights[meta['label']] = weights.get(meta['label'], 0.0) + similarity
+            best[meta['label']] = max(best.get(meta['label'], 0.0), similarity)
+        if not weights:
+            return None
+        label = max(weights, key=weights.get)
+        return {'label': label, 'similarity': best[label]}
+
+    def _adapter_result(self, head, embedding: np.ndarray) -> Optional[Dict]:
+        """The head's label if it is confident enough"""
+        if len(head.labels) < 2:
+            return None  # one label scores 1.0 for everything
+        scores = head.predict_proba(embedding[None, :])[0]
+        best = int(scores.argmax())
+        if scores[best] < config.ADAPTER_MIN_CONFIDENCE:
+            return None
+        return {
+            'label': head.labels[best],
+            'confidence': round(float(scores[best]), 3),
+            'reasoning': f"Personalised from {head.examples} of your corrections ({scores[best]:.3f})",
+            'model_version': ADAPTER_MODEL_VERSION
+        }
+
+    def lookup(self, api_key_id: str, texts: List[str]) -> List[Optional[Dict]]:
+        """
+        Corrected labels for preprocessed texts that closely match a
+        correction, or the user's adapter head label for texts near them
+
+        Returns:
+            One result dict or None per text; all None while the encoder loads
+        """
+        matches = [None] * len(texts)
+        rows = [i for i, text in enumerate(texts) if text]
+        if not rows or not self.has_corrections(api_key_id):
+            return matches
+        embedder = self._embedder_if_ready()
+        if embedder is None:
+            return matches
+
+        queries = dict(zip(rows, embedder.embed([texts[i] for i in rows])))
+        head = self.adapters.get(api_key_id) if self.adapters is not None else None
+        # A head that only knows one label would give it to every nearby email
+        if head is not None and (head.examples < config.ADAPTER_MIN_EXAMPLES or len(head.labels) < 2):
+            head = None
+
+        for owner, threshold, counter in ((api_key_id, self.threshold, 'user_hits'),
+                                          (GLOBAL_OWNER, self.global_threshold, 'global_hits')):
+            index = self._index(owner)
+            pending = [i for i in rows if matches[i] is None]
+            if index is None or not pending:
+                continue
+            for i, neighbours in zip(pending, index.search(np.stack([queries[i] for i in pending]), self.k)):
+                vote = self._vote(neighbours, threshold, latest_wins=owner != GLOBAL_OWNER)
+                if vote:
+                    matches[i] = {
+                        'label': vote['label'],
+                        'confidence': round(vote['similarity'], 3),
+                        'reasoning': f"Matches a corrected email (similarity {vote['similarity']:.3f})",
+                        'model_version': CORRECTION_MODEL_VERSION,
+                        'correction_scope': 'user' if owner != GLOBAL_OWNER else 'global'
+                    }
+                    hit = counter
+                elif owner != GLOBAL_OWNER and head is not None and neighbours \
+                        and neighbours[0][0] >= config.ADAPTER_MIN_SIMILARITY:
+                    # Close to the user's corrections but not a duplicate: ask their head
+                    matches[i] = self._adapter_result(head, queries[i])
+                    hit = 'adapter_hits'
+                if matches[i]:
+                    with self._lock:
+                        self.stats[hit] += 1
+
+        with self._lock:
+            self.stats['lookups'] += len(texts)
+        return matches
+
+    def get_status(self) -> Dict:
+        global_index = self._index(GLOBAL_OWNER)
+        users_dir = os.path.join(self.root, 'users')
+        return {
+            'encoder': self.encoder,
+            'status': self.status,
+            'error': self.error,
+            'threshold': self.threshold,
+            'global_threshold': self.global_threshold,
+            'global_index': global_index.get_info() if global_index else None,
+            'users': len(os.listdir(users_dir)) if os.path.isdir(users_dir) else 0,
+            'adapters': self.adapters.get_status() if self.adapters is not None else None,
+            **self.stats
+        }
+
+# Global correction index instance
+_corrections_instance = None
+
+def get_correction_index(classifier=None) -> Optional[CorrectionIndex]:
+    """Get singleton correction index (classifier is required on first call)"""
+    global _corrections_instance
+    if _corrections_instance is None and classifier is not None:
+        _corrections_instance = CorrectionIndex(classifier)
+    return _corrections_instance
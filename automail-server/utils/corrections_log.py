@@ -0,0 +1,454 @@
+"""
+Durable corrections log for Automail AI Server
+Every /train correction is appended to a segmented JSONL log. Sealed
+segments are compacted in the background into a columnar snapshot that
+keeps only the latest label per (API key, email id), so training and
+evaluation jobs scan arrays instead of re-parsing JSON.
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional
+import numpy as np
+from config.config import get_config
+
+config = get_config()
+logger = logging.getLogger(__name__)
+
+SEGMENT_PREFIX = 'segment-'
+SNAPSHOT_PREFIX = 'snapshot-'
+META_FILE = 'meta.json'
+
+# Snapshot columns: numeric arrays, dictionary-encoded strings and plain strings
+NUMERIC_COLUMNS = {'seq': np.int64, 'added_at': np.float64}
+DICTIONARY_COLUMNS = ('api_key_id', 'label')
+STRING_COLUMNS = ('email_id', 'subject', 'content')
+
+def _segment_name(first_seq: int) -> str:
+    return f"{SEGMENT_PREFIX}{first_seq:012d}.jsonl"
+
+def _first_seq(name: str) -> int:
+    return int(name[len(SEGMENT_PREFIX):-len('.jsonl')])
+
+def _dedup_key(record: Dict):
+    """Corrections of the same email replace each other; emails without an id are keyed by content"""
+    email_id = record.get('email_id')
+    if not email_id:
+        email_id = '#' + hashlib.sha1(
+            f"{record.get('subject', '')}\n{record.get('content', '')}".encode('utf-8')
+        ).hexdigest()
+    return record.get('api_key_id'), email_id
+
+def latest_records(records: Iterable[Dict]) -> List[Dict]:
+    """The last record of each email, in log order"""
+    latest = {}
+    for record in records:
+        key = _dedup_key(record)
+        latest.pop(key, None)
+        latest[key] = record
+    return list(latest.values())
+
+class StringColumn:
+    """UTF-8 strings stored as one byte array plus offsets"""
+
+    def __init__(self, offsets: np.ndarray, data: np.ndarray):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        return bytes(self.data[self.offsets[index]:self.offsets[index + 1]]).decode('utf-8')
+
+    def __iter__(self) -> Iterator[str]:
+        return (self[i] for i in range(len(self)))
+
+class DictionaryColumn:
+    """Low-cardinality strings stored as int32 codes into a list of values"""
+
+    def __init__(self, codes: np.ndarray, values: List[str]):
+        self.codes = codes
+        self.values = values
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, index: int) -> str:
+        return self.values[self.codes[index]]
+
+    def __iter__(self) -> Iterator[str]:
+        return (self.values[code] for code in self.codes)
+
+def write_columns(path: str, records: List[Dict], last_seq: int = None):
+    """
+    Write records as a columnar snapshot directory
+
+    Each column is a .npy file (memory-mapped when read); the directory is
+    written under a temporary name and renamed into place.
+    """
+    tmp_path = path + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    for name, dtype in NUMERIC_COLUMNS.items():
+        np.save(os.path.join(tmp_path, f"{name}.npy"), np.array([r[name] for r in records], dtype=dtype))
+
+    for name in DICTIONARY_COLUMNS:
+        values = {}
+        codes = np.array([values.setdefault(r.get(name) or '', len(values)) for r in records], dtype=np.int32)
+        np.save(os.path.join(tmp_path, f"{name}.codes.npy"), codes)
+        with open(os.path.join(tmp_path, f"{name}.values.json"), 'w') as f:
+            json.dump(list(values), f)
+
+    for name in STRING_COLUMNS:
+        encoded = [(r.get(name) or '').encode('utf-8') for r in records]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        np.save(os.path.join(tmp_path, f"{name}.offsets.npy"), offsets)
+        np.save(os.path.join(tmp_path, f"{name}.data.npy"), np.frombuffer(b''.join(encoded), dtype=np.uint8))
+
+    with open(os.path.join(tmp_path, META_FILE), 'w') as f:
+        json.dump({
+            'rows': len(records),
+            'last_seq': last_seq if last_seq is not None else max((r['seq'] for r in records), default=0),
+            'created_at': time.time()
+        }, f)
+    os.rename(tmp_path, path)
+
+class CorrectionColumns:
+    """
+    Read-only columnar corrections (a compacted snapshot or an export)
+
+    Columns are attributes: seq and added_at are numpy arrays, api_key_id
+    and label are DictionaryColumns, email_id, subject and content are
+    StringColumns.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+        self.rows = meta['rows']
+        self.last_seq = meta['last_seq']
+
+        for name in NUMERIC_COLUMNS:
+            setattr(self, name, self._load(f"{name}.npy"))
+        for name in DICTIONARY_COLUMNS:
+            with open(os.path.join(path, f"{name}.values.json")) as f:
+                values = json.load(f)
+            setattr(self, name, DictionaryColumn(self._load(f"{name}.codes.npy"), values))
+        for name in STRING_COLUMNS:
+            setattr(self, name, StringColumn(self._load(f"{name}.offsets.npy"), self._load(f"{name}.data.npy")))
+
+    def _load(self, name: str) -> np.ndarray:
+        return np.load(os.path.join(self.path, name), mmap_mode='r')
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def records(self) -> Iterator[Dict]:
+        """Rows as log records"""
+        columns = list(NUMERIC_COLUMNS) + list(DICTIONARY_COLUMNS) + list(STRING_COLUMNS)
+        values = [getattr(self, name) for name in columns]
+        for i in range(self.rows):
+            record = {name: column[i] for name, column in zip(columns, values)}
+            record['seq'] = int(record['seq'])
+            record['added_at'] = float(record['added_at'])
+            yield record
+
+class CorrectionsLog:
+    """
+    Append-only, segmented log of corrections
+
+    Records are JSON lines with a sequence number, written to the active
+    segment <root>/segment-<first seq>.jsonl. An append returns once its
+    records are fsynced; concurrent appends share one fsync (group commit).
+    The active segment is sealed once it reaches segment_bytes, and after
+    compact_segments sealed segments a background compaction merges them
+    into <root>/snapshot-<last seq>/, keeping the latest label per email.
+    """
+
+    def __init__(self, root: str = None, segment_bytes: int = None, compact_segments: int = None):
+        self.root = root or config.CORRECTIONS_LOG_DIR
+        self.segment_bytes = segment_bytes or config.CORRECTIONS_SEGMENT_MB * 1024 * 1024
+        self.compact_segments = compact_segments or config.CORRECTIONS_COMPACT_SEGMENTS
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._sync_cond = threading.Condition()
+        self._written = 0
+        self._synced = 0
+        self._syncing = False
+        self._compacting = False
+        self.stats = {'appended': 0, 'fsyncs': 0, 'rotations': 0, 'compactions': 0, 'last_compaction': None}
+        os.makedirs(self.root, exist_ok=True)
+
+        snapshot = self._snapshot()
+        self._snapshot_rows = len(snapshot) if snapshot else 0
+        self._remove_compacted(snapshot)
+        segments = self._segments()
+        if segments:
+            self._next_seq = self._recover(segments[-1])
+        else:
+            self._next_seq = (snapshot.last_seq if snapshot else 0) + 1
+        self._open_segment(segments[-1] if segments else _segment_name(self._next_seq))
+
+    def _segments(self) -> List[str]:
+        return sorted(name for name in os.listdir(self.root)
+                      if name.startswith(SEGMENT_PREFIX) and name.endswith('.jsonl'))
+
+    def _snapshot(self) -> Optional[CorrectionColumns]:
+        names = sorted(name for name in os.listdir(self.root)
+                       if name.startswith(SNAPSHOT_PREFIX) and not name.endswith('.tmp'))
+        return CorrectionColumns(os.path.join(self.root, names[-1])) if names else None
+
+    def _remove_compacted(self, snapshot: Optional[CorrectionColumns]):
+        """Delete leftovers of a compaction that stopped before cleaning up"""
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.endswith('.tmp') or (name.startswith(SNAPSHOT_PREFIX) and snapshot and path != snapshot.path):
+                shutil.rmtree(path, ignore_errors=True)
+        if snapshot is None:
+            return
+        segments = self._segments()
+        # A segment is covered when the next one starts at or before the snapshot's end
+        for name, following in zip(segments, segments[1:]):
+            if _first_seq(following) - 1 <= snapshot.last_seq:
+                os.remove(os.path.join(self.root, name))
+
+    def _lines(self, name: str, limit: int = None) -> Iterator[bytes]:
+        """Complete, parseable lines of a segment (up to limit bytes)"""
+        with open(os.path.join(self.root, name), 'rb') as f:
+            data = f.read() if limit is None else f.read(limit)
+        for line in data.splitlines(keepends=True):
+            if not line.endswith(b'\n'):
+                break
+            try:
+                json.loads(line)
+            except ValueError:
+                break
+            yield line
+
+    def _read_segment(self, name: str, limit: int = None) -> Iterator[Dict]:
+        return (json.loads(line) for line in self._lines(name, limit))
+
+    def _recover(self, name: str) -> int:
+        """Drop a torn tail from the last segment; returns the next sequence number"""
+        path = os.path.join(self.root, name)
+        next_seq = _first_seq(name)
+        valid_bytes = 0
+        for line in self._lines(name):
+            next_seq = json.loads(line)['seq'] + 1
+            valid_bytes += len(line)
+        if valid_bytes < os.path.getsize(path):
+            logger.warning(f"Truncating torn write at the end of {path}")
+            os.truncate(path, valid_bytes)
+        return next_seq
+
+    def _open_segment(self, name: str):
+        self._active = name
+        self._file = open(os.path.join(self.root, name), 'ab')
+
+    def _rotate(self):
+        """Seal the active segment and start a new one (caller holds the lock)"""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._open_segment(_segment_name(self._next_seq))
+        self.stats['rotations'] += 1
+
+    def append(self, api_key_id: str, corrections: List[Dict]) -> int:
+        """
+        Durably append corrections
+
+        Args:
+            api_key_id: Owner of the corrections
+            corrections: Dicts with 'correct_label' and the email's 'content'
+                (and optional 'subject', 'email_id')
+
+        Returns:
+            Number of corrections logged (those without a label or content are skipped)
+        """
+        now = time.time()
+        usable = [
+            c for c in corrections
+            if isinstance(c.get('correct_label'), str) and c['correct_label']
+            and isinstance(c.get('content'), str) and c['content']
+        ]
+        if not usable:
+            return 0
+
+        with self._lock:
+            lines = []
+            for correction in usable:
+                lines.append(json.dumps({
+                    'seq': self._next_seq,
+                    'api_key_id': api_key_id,
+                    'email_id': str(correction.get('email_id') or ''),
+                    'label': correction['correct_label'],
+                    'subject': correction.get('subject') or '',
+                    'content': correction['content'],
+                    'added_at': now
+                }, separators=(',', ':')) + '\n')
+                self._next_seq += 1
+            self._file.write(''.join(lines).encode('utf-8'))
+            self._file.flush()
+            self._written += 1
+            ticket = self._written
+            self.stats['appended'] += len(lines)
+
+            sealed = 0
+            if self._file.tell() >= self.segment_bytes:
+                self._rotate()
+                sealed = len(self._segments()) - 1
+
+        self._sync(ticket)
+        if sealed >= self.compact_segments:
+            self.compact_in_background()
+        return len(usable)
+
+    def _sync(self, ticket: int):
+        """Group commit: one fsync covers every write made before it started"""
+        with self._sync_cond:
+            while self._synced < ticket and self._syncing:
+                self._sync_cond.wait()
+            if self._synced >= ticket:
+                return
+            self._syncing = True
+
+        target = self._synced
+        try:
+            with self._lock:
+                target = self._written
+                fd = os.dup(self._file.fileno())
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            self.stats['fsyncs'] += 1
+        finally:
+            with self._sync_cond:
+                self._syncing = False
+                self._synced = max(self._synced, target)
+                self._sync_cond.notify_all()
+
+    @property
+    def last_seq(self) -> int:
+        """Sequence number of the newest record (0 when empty)"""
+        return self._next_seq - 1
+
+    def _scan(self, snapshot: Optional[CorrectionColumns], segments: List[str],
+              active_bytes: int = None) -> Iterator[Dict]:
+        """Snapshot rows, then newer records of the given segments (the active one up to active_bytes)"""
+        after = snapshot.last_seq if snapshot else 0
+        if snapshot:
+            yield from snapshot.records()
+        for name in segments:
+            limit = active_bytes if name == self._active else None
+            for record in self._read_segment(name, limit):
+                if record['seq'] > after:
+                    yield record
+
+    def compact(self) -> bool:
+        """
+        Merge the snapshot and all sealed segments into a new snapshot
+
+        Returns:
+            True if there was anything to compact
+        """
+        with self._compact_lock:
+            with self._lock:
+                active = self._active
+                sealed = [name for name in self._segments() if name != active]
+            if not sealed:
+                return False
+
+            started = time.perf_counter()
+            previous = self._snapshot()
+            # Snapshots cover everything before the active segment; they are
+            # built in memory, which is fine for millions of short rows
+            last_seq = _first_seq(active) - 1
+            records = latest_records(self._scan(previous, sealed))
+            write_columns(os.path.join(self.root, f"{SNAPSHOT_PREFIX}{last_seq:012d}"), records, last_seq)
+
+            if previous:
+                shutil.rmtree(previous.path, ignore_errors=True)
+            for name in sealed:
+                os.remove(os.path.join(self.root, name))
+
+            self._snapshot_rows = len(records)
+            self.stats['compactions'] += 1
+            self.stats['last_compaction'] = {
+                'rows': len(records),
+                'segments': len(sealed),
+                'ms': round((time.perf_counter() - started) * 1000, 1),
+                'at': time.time()
+            }
+        logger.info(f"🗜️ Compacted {len(sealed)} correction segments into {len(records)} rows")
+        return True
+
+    def compact_in_background(self) -> bool:
+        """Start a compaction unless one is running"""
+        with self._lock:
+            if self._compacting:
+                return False
+            self._compacting = True
+
+        def target():
+            try:
+                self.compact()
+            except Exception as e:
+                logger.error(f"Corrections compaction failed: {str(e)}")
+            finally:
+                with self._lock:
+                    self._compacting = False
+
+        threading.Thread(target=target, name='corrections-compaction', daemon=True).start()
+        return True
+
+    def latest(self) -> List[Dict]:
+        """The latest correction of every email, in log order"""
+        with self._compact_lock:
+            with self._lock:
+                self._file.flush()
+                segments = self._segments()
+                active_bytes = self._file.tell()
+            return latest_records(self._scan(self._snapshot(), segments, active_bytes))
+
+    def export(self, path: str) -> CorrectionColumns:
+        """
+        Write the latest correction of every email as a columnar directory
+
+        Args:
+            path: Directory to create (must not exist)
+
+        Returns:
+            The exported columns
+        """
+        last_seq = self.last_seq
+        write_columns(path, self.latest(), last_seq)
+        return CorrectionColumns(path)
+
+    def get_status(self) -> Dict:
+        with self._lock:
+            return {
+                'last_seq': self.last_seq,
+                'segments': len(self._segments()),
+                'active_segment_bytes': self._file.tell(),
+                'snapshot_rows': self._snapshot_rows,
+                **self.stats
+            }
+
+# Global corrections log instance
+_log_instance = None
+
+def get_corrections_log() -> CorrectionsLog:
+    """Get singleton corrections log"""
+    global _log_instance
+    if _log_instance is None:
+        _log_instance = CorrectionsLog()
+    return _log_instance
@@ -0,0 +1,253 @@
+"""
+Feature store for Automail AI Server
+Score vectors and embeddings keyed by a hash of the preprocessed email
+text, so an email goes through each model once and classification,
+retraining, indexing and evaluation read the stored vectors instead of
+recomputing them. Rows are float16 and memory-mapped.
+"""
+import os
+import json
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+import numpy as np
+from config.config import get_config
+from utils.model_registry import version_slug
+
+try:
+    import fcntl
+except ImportError:  # Windows: tables are only shared between threads
+    fcntl = None
+
+config = get_config()
+logger = logging.getLogger(__name__)
+
+INFO_FILE = 'info.json'
+ROWS_FILE = 'rows.f16'
+KEYS_FILE = 'keys.bin'
+LOCK_FILE = 'write.lock'
+
+# Truncated SHA-256 of the preprocessed text
+KEY_BYTES = 16
+
+def feature_key(text: str) -> bytes:
+    return hashlib.sha256(text.encode('utf-8')).digest()[:KEY_BYTES]
+
+class FeatureTable:
+    """
+    Append-only float16 feature rows of one model
+
+    Files in the table directory:
+        info.json   row dimension (written with the first row)
+        rows.f16    float16 rows, memory-mapped for reads
+        keys.bin    16-byte key per row; a row exists once its key is written
+        write.lock  locked (flock) by writers, so processes sharing the
+                    table (e.g. the server and bulk_classify.py) append in turn
+
+    A writer holding the lock first reads the keys other processes appended
+    since its last write, then writes rows and keys at the on-disk row count,
+    rows first. A torn tail left by a crash (rows without keys) is cut when
+    the table is opened and otherwise just overwritten by the next append.
+    Rows are flushed but not fsynced: a row lost in a crash is simply
+    computed again. A table stops growing at max_rows, which also bounds
+    its in-memory key index.
+    """
+
+    def __init__(self, path: str, max_rows: int = None):
+        self.path = path
+        self.max_rows = max_rows or config.FEATURE_STORE_MAX_ROWS
+        self.dim = None
+        self._index = {}
+        self._count = 0
+        self._rows = None
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'writes': 0, 'dropped': 0}
+        os.makedirs(path, exist_ok=True)
+
+        with self._file_lock():
+            self._read_info()
+            if self.dim is not None:
+                self._repair()
+                self._refresh()
+
+    @property
+    def _row_bytes(self) -> int:
+        return self.dim * 2
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock on the table across processes (only threads of this one without fcntl)"""
+        with open(os.path.join(self.path, LOCK_FILE), 'a') as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _size(self, name: str) -> int:
+        return os.path.getsize(self._path(name)) if os.path.exists(self._path(name)) else 0
+
+    def _read_info(self):
+        try:
+            with open(self._path(INFO_FILE)) as f:
+                self.dim = json.load(f)['dim']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def _repair(self):
+        """Cut rows without keys and partly written keys (on open, under the file lock)"""
+        count = min(self._size(KEYS_FILE) // KEY_BYTES, self._size(ROWS_FILE) // self._row_bytes)
+        for name, size in ((KEYS_FILE, count * KEY_BYTES), (ROWS_FILE, count * self._row_bytes)):
+            if self._size(name) > size:
+                os.truncate(self._path(name), size)
+
+    def _refresh(self):
+        """Index keys appended since the last read, by this or another process (under the file lock)"""
+        count = self._size(KEYS_FILE) // KEY_BYTES
+        if count <= self._count:
+            return
+        with open(self._path(KEYS_FILE), 'rb') as f:
+            f.seek(self._count * KEY_BYTES)
+            keys = f.read((count - self._count) * KEY_BYTES)
+        for i in range(count - self._count):
+            self._index.setdefault(keys[i * KEY_BYTES:(i + 1) * KEY_BYTES], self._count + i)
+        self._count = count
+
+    def _map(self):
+        self._rows = np.memmap(self._path(ROWS_FILE), dtype=np.float16, mode='r',
+                               shape=(self._count, self.dim)) if self._count else None
+
+    def _write_at(self, name: str, offset: int, data: bytes):
+        with open(os.open(self._path(name), os.O_RDWR | os.O_CREAT, 0o644), 'r+b') as f:
+            f.seek(offset)
+            f.write(data)
+
+    def get(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Stored float32 rows for preprocessed texts (None where missing)"""
+        keys = [feature_key(text) for text in texts]
+        with self._lock:
+            rows = [self._index.get(key) for key in keys]
+            found = [row for row in rows if row is not None]
+            if found and (self._rows is None or max(found) >= len(self._rows)):
+                # The mapping only grows when a row past its end is read
+                self._map()
+            values = np.asarray(self._rows[found], dtype=np.float32) if found else None
+            self.stats['hits'] += len(found)
+            self.stats['misses'] += len(rows) - len(found)
+
+        results, position = [], 0
+        for row in rows:
+            if row is None:
+                results.append(None)
+            else:
+                results.append(values[position])
+                position += 1
+        return results
+
+    def put(self, texts: List[str], vectors: np.ndarray):
+        """Store rows for texts that have none yet"""
+        vectors = np.asarray(vectors)
+        new = {}
+        for text, vector in zip(texts, vectors):
+            key = feature_key(text)
+            if key not in self._index:
+                new[key] = vector
+        if not new:
+            return
+
+        with self._lock, self._file_lock():
+            if self.dim is None:
+                self._read_info()
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                with open(self._path(INFO_FILE), 'w') as f:
+                    json.dump({'dim': self.dim}, f)
+            self._refresh()
+            new = {key: vector for key, vector in new.items() if key not in self._index}
+            room = max(0, self.max_rows - self._count)
+            if len(new) > room:
+                self.stats['dropped'] += len(new) - room
+                new = dict(list(new.items())[:room])
+            if not new:
+                return
+
+            # Rows first, then keys, both at the row count every process agrees on
+            count = self._count
+            self._write_at(ROWS_FILE, count * self._row_bytes,
+                           np.asarray(list(new.values()), dtype=np.float16).reshape(-1, self.dim).tobytes())
+            self._write_at(KEYS_FILE, count * KEY_BYTES, b''.join(new))
+
+            for i, key in enumerate(new):
+                self._index[key] = count + i
+            self._count += len(new)
+            self.stats['writes'] += len(new)
+
+    def get_or_compute(self, texts: List[str], compute: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """
+        Rows for texts, calling compute only for the ones not stored yet
+
+        Args:
+            texts: Preprocessed texts
+            compute: Returns a (texts, dim) array for a list of texts
+
+        Returns:
+            (texts, dim) float32 array
+        """
+        rows = self.get(texts)
+        missing = [i for i, row in enumerate(rows) if row is None]
+        if missing:
+            computed = np.asarray(compute([texts[i] for i in missing]), dtype=np.float32)
+            self.put([texts[i] for i in missing], computed)
+            for i, row in zip(missing, computed):
+                rows[i] = row
+        return np.stack(rows) if rows else np.zeros((0, self.dim or 0), dtype=np.float32)
+
+    def get_info(self) -> Dict:
+        return {'rows': len(self), 'dim': self.dim, 'max_rows': self.max_rows, **self.stats}
+
+class FeatureStore:
+    """
+    Feature tables under <root>/<kind>/<name>
+
+    Kinds are 'scores' (label probability vectors of a classifier) and
+    'embeddings' (sentence encoder vectors). Names identify everything the
+    vectors depend on, e.g. the model version and its labels.
+    """
+
+    def __init__(self, root: str = None):
+        self.root = root or config.FEATURE_STORE_DIR
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    def table(self, kind: str, name: str) -> FeatureTable:
+        with self._lock:
+            table = self._tables.get((kind, name))
+            if table is None:
+                table = FeatureTable(os.path.join(self.root, kind, version_slug(name)))
+                self._tables[(kind, name)] = table
+            return table
+
+    def get_status(self) -> Dict:
+        with self._lock:
+            tables = dict(self._tables)
+        return {f"{kind}/{name}": table.get_info() for (kind, name), table in tables.items()}
+
+# Global feature store instance
+_feature_store_instance = None
+
+def get_feature_store() -> FeatureStore:
+    """Get singleton feature store"""
+    global _feature_store_instance
+    if _feature_store_instance is None:
+        _feature_store_instance = FeatureStore()
+    return _feature_store_instance
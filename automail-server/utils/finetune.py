@@ -0,0 +1,236 @@
+"""
+Background fine-tuning for Automail AI Server
+Fine-tunes the active model on the corrections log in a
+separate, niced process (finetune.py) with capped threads, so serving
+latency is unaffected. Jobs checkpoint as they train and register their
+result in the model registry as a new version.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import logging
+import threading
+import subprocess
+from typing import Dict, Optional
+from config.config import get_config
+from utils.classifier import DEFAULT_MODEL_VERSION, LABEL_MAPPING
+from utils.corrections_log import CorrectionsLog, get_corrections_log
+
+config = get_config()
+logger = logging.getLogger(__name__)
+
+STATE_FILE = 'state.json'
+JOB_FILE = 'job.json'
+STATUS_FILE = 'status.json'
+DATA_DIR = 'corrections'
+LOG_FILE = 'train.log'
+
+# Job states after which nothing is left to run
+FINISHED_STATES = ('published', 'trained', 'failed')
+
+# Backends whose models can be fine-tuned (prototype encoders have no head)
+TRAINABLE_BACKENDS = ('eager', 'compiled', 'student')
+
+SCRIPT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'finetune.py')
+
+# Corrections use API labels ("Work"); the models are trained on zero-shot labels
+ZERO_SHOT_LABELS = {api_label: label for label, api_label in LABEL_MAPPING.items()}
+
+def _read_json(path: str) -> Optional[Dict]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_json(path: str, data: Dict):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+class FineTuneRunner:
+    """
+    Starts and tracks fine-tuning jobs
+
+    Once FINETUNE_MIN_CORRECTIONS corrections have been logged since the
+    last job (or on an admin call), a job exports the latest correction of
+    every email into <root>/jobs/<job id>/ and runs finetune.py on the
+    export. The script writes its progress to the job's status.json; a
+    job interrupted by a restart continues from its last checkpoint when
+    the server comes back.
+    """
+
+    def __init__(self, classifier, log: CorrectionsLog = None, root: str = None, min_corrections: int = None):
+        self.classifier = classifier
+        self.log = log or get_corrections_log()
+        self.root = root or config.FINETUNE_DIR
+        self.min_corrections = min_corrections or config.FINETUNE_MIN_CORRECTIONS
+        self.jobs_dir = os.path.join(self.root, 'jobs')
+        self._lock = threading.Lock()
+        self._process = None
+        self.job_dir = None
+        os.makedirs(self.jobs_dir, exist_ok=True)
+
+        state = _read_json(os.path.join(self.root, STATE_FILE)) or {}
+        self._consumed_seq = state.get('consumed_seq', 0)
+
+        # Show the most recent job until a new one starts
+        jobs = sorted(os.listdir(self.jobs_dir))
+        if jobs:
+            self.job_dir = os.path.join(self.jobs_dir, jobs[-1])
+
+    @property
+    def pending(self) -> int:
+        """Corrections logged since the last job started"""
+        return self.log.last_seq - self._consumed_seq
+
+    @property
+    def running(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def maybe_start(self) -> Optional[Dict]:
+        """Start a job if enough corrections arrived since the last one"""
+        if not config.FINETUNE_ENABLED or self.pending < self.min_corrections or self.running:
+            return None
+        try:
+            return self.start(reason='threshold')
+        except (RuntimeError, ValueError) as e:
+            logger.warning(f"Fine-tuning not started: {str(e)}")
+            return None
+
+    def start(self, reason: str = 'admin') -> Dict:
+        """
+        Export the corrections and start fine-tuning the active model
+
+        Returns:
+            The job description
+
+        Raises:
+            RuntimeError: if a job is already running
+            ValueError: if there is nothing to train on or the active
+                backend cannot be fine-tuned
+        """
+        with self._lock:
+            if self.running:
+                raise RuntimeError('A fine-tuning job is already running')
+
+            # The loaded model, or the one that loads next if it is unloaded
+            base_version = (self.classifier.model_version or self.classifier.registry.active_version
+                            or DEFAULT_MODEL_VERSION)
+            kind = self.classifier.backend_kind(base_version)
+            if kind not in TRAINABLE_BACKENDS:
+                raise ValueError(f"The {kind} backend cannot be fine-tuned")
+
+            job_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+            job_dir = os.path.join(self.jobs_dir, job_id)
+            os.makedirs(job_dir)
+            corrections = self.log.export(os.path.join(job_dir, DATA_DIR))
+            if not len(corrections):
+                shutil.rmtree(job_dir, ignore_errors=True)
+                raise ValueError('No corrections with email content to train on')
+
+            job = {
+                'job_id': job_id,
+                'reason': reason,
+                'base_version': base_version,
+                'backend': kind,
+                'corrections': len(corrections),
+                'last_seq': corrections.last_seq,
+                'epochs': config.FINETUNE_EPOCHS,
+                'batch_size': config.FINETUNE_BATCH_SIZE,
+                'learning_rate': config.FINETUNE_LEARNING_RATE,
+                'checkpoint_steps': config.FINETUNE_CHECKPOINT_STEPS,
+                'created_at': time.time()
+            }
+            _write_json(os.path.join(job_dir, JOB_FILE), job)
+            _write_json(os.path.join(job_dir, STATUS_FILE), {'state': 'queued', 'updated_at': time.time()})
+
+            self._consumed_seq = corrections.last_seq
+            _write_json(os.path.join(self.root, STATE_FILE), {'consumed_seq': self._consumed_seq})
+            self.job_dir = job_dir
+            self._launch(job_dir)
+
+        logger.info(f"🎓 Started fine-tuning job {job_id} on {len(corrections)} corrections ({reason})")
+        return job
+
+    def resume(self) -> bool:
+        """Restart the latest job if the previous process stopped it mid-run"""
+        with self._lock:
+            if self.running or self.job_dir is None:
+                return False
+            status = _read_json(os.path.join(self.job_dir, STATUS_FILE)) or {}
+            if status.get('state') in FINISHED_STATES:
+                return False
+            self._launch(self.job_dir)
+        logger.info(f"♻️ Resuming fine-tuning job {os.path.basename(self.job_dir)}")
+        return True
+
+    def _launch(self, job_dir: str):
+        """Run finetune.py on a job in a niced child process (caller holds the lock)"""
+        env = dict(os.environ)
+        # Cap the child's math libraries before torch is imported
+        for name in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+            env[name] = str(config.FINETUNE_THREADS)
+        env['TOKENIZERS_PARALLELISM'] = 'false'
+
+        command = [
+            sys.executable, SCRIPT_PATH, job_dir,
+            '--threads', str(config.FINETUNE_THREADS),
+            '--nice', str(config.FINETUNE_NICE),
+            '--parent-pid', str(os.getpid())
+        ]
+        log = open(os.path.join(job_dir, LOG_FILE), 'a')
+        self._process = subprocess.Popen(
+            command, cwd=os.path.dirname(SCRIPT_PATH), env=env,
+            stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT
+        )
+        log.close()
+        threading.Thread(target=self._wait, args=(self._process, job_dir),
+                         name='finetune-monitor', daemon=True).start()
+
+    def _wait(self, process: subprocess.Popen, job_dir: str):
+        """Record a job that exited without reporting a final state as failed"""
+        returncode = process.wait()
+        status_path = os.path.join(job_dir, STATUS_FILE)
+        status = _read_json(status_path) or {}
+        if status.get('state') in FINISHED_STATES:
+            logger.info(f"🎓 Fine-tuning job {os.path.basename(job_dir)} {status['state']}"
+                        + (f": {status['version']}" if status.get('version') else ''))
+            return
+        logger.error(f"Fine-tuning job {os.path.basename(job_dir)} exited with code {returncode}")
+        _write_json(status_path, {
+            **status,
+            'state': 'failed',
+            'error': status.get('error') or f"Training process exited with code {returncode}",
+            'updated_at': time.time()
+        })
+
+    def get_status(self) -> Dict:
+        job = None
+        if self.job_dir is not None:
+            job = {
+                **(_read_json(os.path.join(self.job_dir, JOB_FILE)) or {}),
+                **(_read_json(os.path.join(self.job_dir, STATUS_FILE)) or {})
+            }
+        return {
+            'enabled': config.FINETUNE_ENABLED,
+            'running': self.running,
+            'corrections_log': self.log.get_status(),
+            'pending_corrections': self.pending,
+            'min_corrections': self.min_corrections,
+            'job': job
+        }
+
+# Global fine-tuning runner instance
+_finetune_instance = None
+
+def get_finetune_runner(classifier=None) -> Optional[FineTuneRunner]:
+    """Get singleton fine-tuning runner (classifier is required on first call)"""
+    global _finetune_instance
+    if _finetune_instance is None and classifier is not None:
+        _finetune_instance = FineTuneRunner(classifier)
+    return _finetune_instance
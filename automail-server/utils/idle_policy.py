@@ -0,0 +1,102 @@
+"""
+Idle model unloading for Automail AI Server
+Releases the NLI model's weights after a period without model traffic;
+the classifier reloads them from a memory-mapped snapshot on demand
+while the rule tier answers requests
+"""
+import os
+import time
+import logging
+import threading
+from typing import Dict
+from config.config import get_config
+
+config = get_config()
+logger = logging.getLogger(__name__)
+
+# What happens to the weights of an idle model
+IDLE_MODES = ('release', 'mmap')
+
+def rss_bytes() -> int:
+    """Resident set size of this process (Linux), or 0 if unknown"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+class IdlePolicy:
+    """
+    Background monitor that unloads an idle EmailClassifier
+
+    Modes:
+        release: drop the weights entirely; the next request triggers a
+            background reload from the memory-mapped snapshot
+        mmap: rebind the weights to the memory-mapped snapshot so the OS can
+            page them out; the model keeps answering and pages back in on use
+    """
+
+    def __init__(self, classifier, idle_seconds: float = None, mode: str = None,
+                 check_interval: float = None):
+        self.classifier = classifier
+        self.idle_seconds = idle_seconds if idle_seconds is not None else config.IDLE_UNLOAD_SECONDS
+        self.mode = mode or config.IDLE_UNLOAD_MODE
+        self.check_interval = check_interval or max(1.0, min(60.0, self.idle_seconds / 10))
+
+        if self.mode not in IDLE_MODES:
+            raise ValueError(f"IDLE_UNLOAD_MODE must be one of {IDLE_MODES}")
+
+        self._stopping = threading.Event()
+        self._thread = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.idle_seconds > 0
+
+    def check(self) -> bool:
+        """
+        Unload the model if it has been idle long enough
+
+        Returns:
+            True if the model was unloaded or remapped
+        """
+        clf = self.classifier
+        if not clf.is_loaded or clf.is_loading:
+            return False
+        if self.mode == 'mmap' and clf.weights_mapped:
+            return False  # already pageable
+        if time.time() - clf.last_used < self.idle_seconds:
+            return False
+        return clf.unload(self.mode)
+
+    def _loop(self):
+        while not self._stopping.wait(self.check_interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"Idle unload check failed: {str(e)}")
+
+    def start(self):
+        """Start the monitor thread (no-op when disabled or already running)"""
+        if not self.enabled or self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._loop, name='idle-policy', daemon=True)
+        self._thread.start()
+        logger.info(f"💤 Idle unloading after {self.idle_seconds:.0f}s ({self.mode} mode)")
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(self.check_interval + 1)
+            self._thread = None
+
+    def get_status(self) -> Dict:
+        return {
+            'enabled': self.enabled,
+            'mode': self.mode,
+            'idle_seconds': self.idle_seconds,
+            'seconds_since_last_use': round(time.time() - self.classifier.last_used, 1),
+            'rss_bytes': rss_bytes(),
+            **self.classifier.idle_stats
+        }
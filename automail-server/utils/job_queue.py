@@ -0,0 +1,335 @@
+"""
+Durable bulk classification job queue for Automail AI Server
+Jobs and their items live in SQLite so backfills survive process restarts
+"""
+import os
+import json
+import time
+import uuid
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Callable, Dict, List, Optional
+from config.config import get_config
+
+config = get_config()
+logger = logging.getLogger(__name__)
+
+# Item attempts before a failing item is given a Review result
+MAX_ITEM_ATTEMPTS = 3
+
+class JobConflictError(Exception):
+    """Idempotency key reused with a different payload"""
+    pass
+
+class JobQueue:
+    """
+    SQLite-backed queue of bulk classification jobs
+    Background workers claim chunks of pending items and pass them to
+    process_batch(api_key, emails), which must return one result per email
+    """
+
+    def __init__(self, process_batch: Callable[[str, List[Dict]], List[Dict]],
+                 db_path: str = None, workers: int = None, chunk_size: int = None,
+                 poll_interval: float = 1.0):
+        self.process_batch = process_batch
+        self.db_path = db_path or config.JOB_STORE_PATH
+        self.num_workers = workers or config.JOB_WORKERS
+        self.chunk_size = chunk_size or config.JOB_CHUNK_SIZE
+        self.poll_interval = poll_interval
+
+        self._local = threading.local()
+        self._claim_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._workers = []
+
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._create_schema()
+        self._recover()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Get the connection for the current thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _create_schema(self):
+        conn = self._connect()
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    api_key TEXT NOT NULL,
+                    idempotency_key TEXT,
+                    request_hash TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    total INTEGER NOT NULL,
+                    completed INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    UNIQUE (api_key, idempotency_key)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS job_items (
+                    job_id TEXT NOT NULL,
+                    item_index INTEGER NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    result TEXT,
+                    PRIMARY KEY (job_id, item_index)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS job_items_status ON job_items (status)")
+
+    def _recover(self):
+        """Requeue items that were in flight when the previous process stopped"""
+        conn = self._connect()
+        with conn:
+            recovered = conn.execute(
+                "UPDATE job_items SET status = 'pending' WHERE status = 'running'"
+            ).rowcount
+        if recovered:
+            logger.info(f"♻️ Requeued {recovered} interrupted job items")
+
+    def submit(self, api_key: str, emails: List[Dict], idempotency_key: str = None):
+        """
+        Create a job, or return the existing one for a repeated idempotency key
+
+        Args:
+            api_key: Owner of the job
+            emails: List of dicts with 'content' and optional 'subject'
+            idempotency_key: Client supplied key that makes retries safe
+
+        Returns:
+            Tuple of (job info dict, created flag)
+
+        Raises:
+            JobConflictError: if the key was already used for a different payload
+        """
+        request_hash = hashlib.sha256(
+            json.dumps(emails, sort_keys=True).encode('utf-8')
+        ).hexdigest()
+
+        conn = self._connect()
+        if idempotency_key:
+            row = conn.execute(
+                "SELECT job_id, request_hash FROM jobs WHERE api_key = ? AND idempotency_key = ?",
+                (api_key, idempotency_key)
+            ).fetchone()
+            if row:
+                if row[1] != request_hash:
+                    raise JobConflictError('Idempotency key was already used for a different request')
+                return self.get_job(api_key, row[0]), False
+
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT INTO jobs VALUES (?, ?, ?, ?, 'queued', ?, 0, ?, ?)",
+                    (job_id, api_key, idempotency_key, request_hash, len(emails), now, now)
+                )
+                conn.executemany(
+                    "INSERT INTO job_items (job_id, item_index, payload, status) VALUES (?, ?, ?, 'pending')",
+                    ((job_id, i, json.dumps(email)) for i, email in enumerate(emails))
+                )
+        except sqlite3.IntegrityError:
+            # A concurrent request with the same idempotency key won the race
+            return self.submit(api_key, emails, idempotency_key)
+
+        logger.info(f"📥 Queued job {job_id} with {len(emails)} emails")
+        self._wakeup.set()
+        return self.get_job(api_key, job_id), True
+
+    def get_job(self, api_key: str, job_id: str) -> Optional[Dict]:
+        """Get job progress, or None if the job does not exist for this key"""
+        row = self._connect().execute(
+            "SELECT job_id, idempotency_key, status, total, completed, created_at, updated_at "
+            "FROM jobs WHERE job_id = ? AND api_key = ?",
+            (job_id, api_key)
+        ).fetchone()
+        if row is None:
+            return None
+
+        total, completed = row[3], row[4]
+        return {
+            'job_id': row[0],
+            'idempotency_key': row[1],
+            'status': row[2],
+            'total': total,
+            'completed': completed,
+            'progress': round(completed / total, 4) if total else 1.0,
+            'created_at': row[5],
+            'updated_at': row[6]
+        }
+
+    def get_results(self, api_key: str, job_id: str, offset: int = 0, limit: int = 100) -> Optional[List[Dict]]:
+        """
+        Get one page of item results in submission order
+        Items that are not finished yet are reported with their status only
+        """
+        if self.get_job(api_key, job_id) is None:
+            return None
+
+        rows = self._connect().execute(
+            "SELECT item_index, status, result FROM job_items "
+            "WHERE job_id = ? AND item_index >= ? ORDER BY item_index LIMIT ?",
+            (job_id, offset, limit)
+        ).fetchall()
+
+        page = []
+        for item_index, status, result in rows:
+            entry = {'index': item_index, 'status': status}
+            if result:
+                entry.update(json.loads(result))
+            page.append(entry)
+        return page
+
+    def _claim(self) -> Optional[tuple]:
+        """Claim up to chunk_size pending items of the oldest job with work left"""
+        conn = self._connect()
+        with self._claim_lock, conn:
+            row = conn.execute(
+                "SELECT job_id FROM job_items WHERE status = 'pending' ORDER BY rowid LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+
+            job_id = row[0]
+            items = conn.execute(
+                "SELECT item_index, payload FROM job_items "
+                "WHERE job_id = ? AND status = 'pending' ORDER BY item_index LIMIT ?",
+                (job_id, self.chunk_size)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE job_items SET status = 'running', attempts = attempts + 1 "
+                "WHERE job_id = ? AND item_index = ?",
+                ((job_id, item_index) for item_index, _ in items)
+            )
+            conn.execute(
+                "UPDATE jobs SET status = 'running', updated_at = ? WHERE job_id = ? AND status = 'queued'",
+                (time.time(), job_id)
+            )
+            api_key = conn.execute("SELECT api_key FROM jobs WHERE job_id = ?", (job_id,)).fetchone()[0]
+
+        return job_id, api_key, [(item_index, json.loads(payload)) for item_index, payload in items]
+
+    def _complete(self, job_id: str, finished: List[tuple], only_running: bool = False):
+        """Record results; items already finished by another worker are not counted twice"""
+        status_filter = "status = 'running'" if only_running else "status != 'done'"
+        conn = self._connect()
+        with conn:
+            done = 0
+            for item_index, result in finished:
+                done += conn.execute(
+                    "UPDATE job_items SET status = 'done', result = ? "
+                    f"WHERE job_id = ? AND item_index = ? AND {status_filter}",
+                    (json.dumps(result), job_id, item_index)
+                ).rowcount
+            conn.execute(
+                "UPDATE jobs SET completed = completed + ?, updated_at = ?, "
+                "status = CASE WHEN completed + ? >= total THEN 'completed' ELSE status END "
+                "WHERE job_id = ?",
+                (done, time.time(), done, job_id)
+            )
+
+    def _release(self, job_id: str, item_indices: List[int]):
+        """Return items to the queue after a failed attempt, or fail them for good"""
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "UPDATE job_items SET status = 'pending' "
+                "WHERE job_id = ? AND item_index = ? AND status = 'running' AND attempts < ?",
+                ((job_id, item_index, MAX_ITEM_ATTEMPTS) for item_index in item_indices)
+            )
+
+        # Anything still running has used up its attempts
+        self._complete(job_id, [
+            (item_index, {'label': 'Review', 'confidence': 0.1, 'reasoning': 'Classification failed repeatedly'})
+            for item_index in item_indices
+        ], only_running=True)
+
+    def process_next(self) -> bool:
+        """
+        Process one chunk of queued work
+
+        Returns:
+            True if a chunk was processed, False if the queue was empty
+        """
+        claimed = self._claim()
+        if claimed is None:
+            return False
+
+        job_id, api_key, items = claimed
+        emails = [payload for _, payload in items]
+        try:
+            results = self.process_batch(api_key, emails)
+            self._complete(job_id, [(item_index, result) for (item_index, _), result in zip(items, results)])
+        except Exception as e:
+            logger.error(f"Job {job_id} chunk failed: {str(e)}")
+            self._release(job_id, [item_index for item_index, _ in items])
+        return True
+
+    def _worker_loop(self):
+        while not self._stopping.is_set():
+            try:
+                if self.process_next():
+                    continue
+            except Exception as e:
+                logger.error(f"Job worker error: {str(e)}")
+
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def start(self):
+        """Start background workers (safe to call repeatedly)"""
+        if self._workers:
+            return
+
+        self._stopping.clear()
+        for i in range(self.num_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f'job-worker-{i}', daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        logger.info(f"Started {self.num_workers} bulk job worker(s)")
+
+    def stop(self, timeout: float = 5.0):
+        """Stop background workers; unfinished items resume on the next start"""
+        self._stopping.set()
+        self._wakeup.set()
+        for worker in self._workers:
+            worker.join(timeout)
+        self._workers = []
+
+    def get_stats(self) -> Dict:
+        """Get queue depth information"""
+        counts = dict(self._connect().execute(
+            "SELECT status, COUNT(*) FROM job_items GROUP BY status"
+        ).fetchall())
+        return {
+            'workers': len(self._workers),
+            'pending_items': counts.get('pending', 0),
+            'running_items': counts.get('running', 0),
+            'done_items': counts.get('done', 0)
+        }
+
+# Global queue instance
+_queue_instance = None
+
+def get_job_queue(process_batch: Callable[[str, List[Dict]], List[Dict]] = None) -> JobQueue:
+    """Get singleton job queue instance (process_batch is required on first call)"""
+    global _queue_instance
+    if _queue_instance is None:
+        _queue_instance = JobQueue(process_batch)
+    return _queue_instance
@@ -0,0 +1,151 @@
+"""
+Link domain hints for Automail AI Server
+URLs removed during preprocessing are reduced to their hosts and matched
+against a reversed-label trie of domains with a known category (shops,
+banks, social networks, ...). An email whose links mostly point at one
+category gets that label without running the classification model.
+"""
+import json
+import logging
+from collections import Counter
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+from config.config import get_config
+
+config = get_config()
+logger = logging.getLogger(__name__)
+
+# Version tag recorded for results answered from link domains
+LINK_MODEL_VERSION = 'link-domains'
+
+# Public suffixes with two labels, so shop.co.uk registers as shop.co.uk and not co.uk
+MULTI_PART_SUFFIXES = {
+    'co.uk', 'org.uk', 'ac.uk', 'gov.uk', 'com.au', 'net.au', 'org.au', 'co.nz', 'co.jp', 'ne.jp',
+    'co.in', 'co.kr', 'co.za', 'com.br', 'com.mx', 'com.cn', 'com.hk', 'com.sg', 'com.tr', 'com.ar'
+}
+
+# Built-in category domains; LINK_DOMAINS_PATH adds to or overrides them
+DEFAULT_LINK_DOMAINS = {
+    'Shopping': [
+        'amazon.com', 'amazon.co.uk', 'amazon.de', 'ebay.com', 'etsy.com', 'walmart.com', 'target.com',
+        'bestbuy.com', 'aliexpress.com', 'temu.com', 'shein.com', 'wayfair.com', 'ikea.com', 'myshopify.com'
+    ],
+    'Finance': [
+        'paypal.com', 'chase.com', 'bankofamerica.com', 'wellsfargo.com', 'citi.com', 'capitalone.com',
+        'americanexpress.com', 'discover.com', 'venmo.com', 'stripe.com', 'wise.com', 'revolut.com',
+        'coinbase.com', 'robinhood.com', 'fidelity.com', 'schwab.com', 'vanguard.com', 'intuit.com'
+    ],
+    'Social-Media': [
+        'facebook.com', 'facebookmail.com', 'instagram.com', 'twitter.com', 'x.com', 'linkedin.com',
+        'tiktok.com', 'reddit.com', 'redditmail.com', 'pinterest.com', 'snapchat.com', 'threads.net'
+    ],
+    'Travel': [
+        'booking.com', 'expedia.com', 'airbnb.com', 'hotels.com', 'kayak.com', 'tripadvisor.com',
+        'delta.com', 'united.com', 'aa.com', 'southwest.com', 'ryanair.com', 'easyjet.com'
+    ],
+    'Technical': ['github.com', 'gitlab.com', 'atlassian.net', 'stackoverflow.com', 'aws.amazon.com'],
+    'Entertainment': ['netflix.com', 'spotify.com', 'youtube.com', 'twitch.tv', 'hulu.com', 'disneyplus.com'],
+    'Education': ['coursera.org', 'udemy.com', 'edx.org', 'khanacademy.org', 'duolingo.com'],
+    'Newsletters': ['substack.com', 'beehiiv.com']
+}
+
+def link_host(url: str) -> Optional[str]:
+    """Lowercase host of a URL without a leading www., or None"""
+    try:
+        host = urlsplit(url).hostname
+    except ValueError:
+        return None
+    if not host or '.' not in host:
+        return None
+    return host[4:] if host.startswith('www.') else host
+
+def registrable_domain(host: str) -> str:
+    """The domain a host was registered under, e.g. mail.shop.co.uk -> shop.co.uk"""
+    labels = host.split('.')
+    size = 3 if len(labels) > 2 and '.'.join(labels[-2:]) in MULTI_PART_SUFFIXES else 2
+    return '.'.join(labels[-size:])
+
+class DomainTrie:
+    """
+    Domains keyed by their labels in reverse (com -> amazon -> aws)
+    A host matches its longest listed suffix, so aws.amazon.com can carry
+    a different label than amazon.com
+    """
+
+    # Node key holding the label of the domain ending at that node (labels are never empty)
+    _LABEL = ''
+
+    def __init__(self, domains: Dict[str, str]):
+        self.root = {}
+        for domain, label in domains.items():
+            node = self.root
+            for part in reversed(domain.lower().strip('.').split('.')):
+                node = node.setdefault(part, {})
+            node[self._LABEL] = label
+        self.size = len(domains)
+
+    def match(self, host: str) -> Optional[str]:
+        node, label = self.root, None
+        for part in reversed(host.split('.')):
+            node = node.get(part)
+            if node is None:
+                break
+            label = node.get(self._LABEL, label)
+        return label
+
+def load_link_domains(path: str = None) -> Dict[str, str]:
+    """Built-in category domains plus a JSON file of {"domain": "Label"}"""
+    # Imported here because the classifier imports this module
+    from utils.classifier import LABEL_MAPPING
+    labels = set(LABEL_MAPPING.values())
+    domains = {domain: label for label, items in DEFAULT_LINK_DOMAINS.items() for domain in items}
+    path = path if path is not None else config.LINK_DOMAINS_PATH
+    if path:
+        try:
+            with open(path) as f:
+                extra = json.load(f)
+            unknown = sorted({label for label in extra.values() if label not in labels})
+            if unknown:
+                logger.warning(f"Ignoring link domains with unknown labels: {', '.join(unknown)}")
+            domains.update({domain.lower(): label for domain, label in extra.items() if label in labels})
+        except (OSError, ValueError, AttributeError) as e:
+            logger.error(f"Failed to load link domains from {path}: {str(e)}")
+    return domains
+
+class LinkHints:
+    """Labels emails whose links mostly point at domains of one category"""
+
+    def __init__(self, domains: Dict[str, str] = None, min_links: int = None, min_share: float = None):
+        self.trie = DomainTrie(domains if domains is not None else load_link_domains())
+        self.min_links = min_links or config.LINK_HINT_MIN_LINKS
+        self.min_share = min_share or config.LINK_HINT_MIN_SHARE
+        self.stats = {'emails': 0, 'hits': 0}
+
+    def result(self, hosts: List[str]) -> Optional[Dict]:
+        """
+        Hint result for the hosts of an email's links
+
+        Returns:
+            A result dict if at least min_links links, and min_share of all
+            links, point at one category; otherwise None
+        """
+        self.stats['emails'] += 1
+        labels = Counter(label for label in map(self.trie.match, hosts) if label)
+        if not labels:
+            return None
+        label, count = labels.most_common(1)[0]
+        share = count / len(hosts)
+        if count < self.min_links or share < self.min_share:
+            return None
+
+        self.stats['hits'] += 1
+        domains = sorted({registrable_domain(host) for host in hosts if self.trie.match(host) == label})
+        return {
+            'label': label,
+            'confidence': round(min(0.95, share), 3),
+            'reasoning': f"{count} of {len(hosts)} links point to {label} domains ({', '.join(domains[:3])})",
+            'model_version': LINK_MODEL_VERSION
+        }
+
+    def get_info(self) -> Dict:
+        return {'enabled': config.LINK_HINTS_ENABLED, 'domains': self.trie.size, **self.stats}
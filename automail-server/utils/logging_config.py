@@ -30,7 +30,10 @@ class ColorFormatter(logging.Formatter):
         return super().format(record)
 
 def setup_logging():
-    """Configure logging for the application"""
+    """
+    Configure logging for the application
+    Called explicitly by the server entry point; importing this module has no side effects
+    """
     
     # Create root logger
     root_logger = logging.getLogger()
@@ -50,19 +53,20 @@ def setup_logging():
     console_handler.setFormatter(console_format)
     root_logger.addHandler(console_handler)
     
-    # File handler for persistent logging
-    try:
-        file_handler = logging.FileHandler('automail-server.log')
-        file_handler.setLevel(logging.INFO)
-        
-        file_format = logging.Formatter(
-            fmt='%(asctime)s | %(levelname)-8s | %(name)s | %(funcName)s:%(lineno)d | %(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S'
-        )
-        file_handler.setFormatter(file_format)
-        root_logger.addHandler(file_handler)
-    except Exception as e:
-        print(f"Warning: Could not set up file logging: {e}")
+    # File handler for persistent logging (disabled when LOG_FILE is empty)
+    if config.LOG_FILE:
+        try:
+            file_handler = logging.FileHandler(config.LOG_FILE)
+            file_handler.setLevel(logging.INFO)
+            
+            file_format = logging.Formatter(
+                fmt='%(asctime)s | %(levelname)-8s | %(name)s | %(funcName)s:%(lineno)d | %(message)s',
+                datefmt='%Y-%m-%d %H:%M:%S'
+            )
+            file_handler.setFormatter(file_format)
+            root_logger.addHandler(file_handler)
+        except Exception as e:
+            print(f"Warning: Could not set up file logging: {e}")
     
     # Set specific logger levels
     logging.getLogger('werkzeug').setLevel(logging.WARNING)  # Reduce Flask noise
@@ -142,6 +146,3 @@ def log_security_event(event_type, details, client_info=None):
         logger.warning(message)
     else:
         logger.info(message)
-
-# Configure logging on import
-setup_logging() 
\ No newline at end of file
@@ -0,0 +1,108 @@
+"""
+Long email handling for Automail AI Server
+The model reads a fixed window of preprocessed text. An email longer than
+that is scored on a bounded number of chunks (its head, the windows with
+the most category keywords, and its tail) in the same batch as other
+emails, and the chunk scores are pooled into one score vector.
+"""
+import re
+from typing import Dict, Iterable, List
+import numpy as np
+from config.config import get_config
+
+config = get_config()
+
+# The head chunk (subject and first paragraph) counts this many times the others in the pooled scores
+HEAD_WEIGHT = 2.0
+
+# Subject characters repeated in front of every chunk after the head
+SUBJECT_PREFIX_CHARS = 100
+
+WORD_PATTERN = re.compile(r'[a-z]+')
+
+def pool_scores(scores: np.ndarray) -> np.ndarray:
+    """
+    One score vector from the chunk scores of an email
+
+    Args:
+        scores: (chunks, labels) array whose first row is the head chunk
+
+    Returns:
+        Weighted mean of the rows; a single row is returned unchanged
+    """
+    if len(scores) == 1:
+        return scores[0]
+    weights = np.ones(len(scores), dtype=np.float32)
+    weights[0] = HEAD_WEIGHT
+    return ((scores * weights[:, None]).sum(axis=0) / weights.sum()).astype(scores.dtype)
+
+class LongEmailChunker:
+    """
+    Picks the model inputs of a preprocessed email
+
+    The first window is the head, exactly as preprocess_email_content cuts
+    it. The rest of the text is split into windows aligned to its end, and
+    keyword hits are counted for each in one pass over its words. The
+    chunks are the head, then the densest keyword window, then the tail,
+    then the next densest windows, up to max_chunks. Chunks after the head
+    start with the subject. A long email therefore costs at most
+    max_chunks short ones, however long it is.
+    """
+
+    def __init__(self, keywords: Iterable[str], window: int, max_chunks: int = None):
+        keywords = {keyword.lower() for keyword in keywords}
+        self.words = {keyword for keyword in keywords if ' ' not in keyword}
+        self.phrases = {keyword for keyword in keywords if keyword.count(' ') == 1}
+        self.window = window
+        self.max_chunks = max(1, max_chunks or config.LONG_EMAIL_MAX_CHUNKS)
+        self.stats = {'long_emails': 0, 'chunks': 0}
+
+    def _keyword_hits(self, text: str, size: int, offset: int, count: int) -> List[int]:
+        """Keyword hits per window of text; window i starts at offset + i * size"""
+        hits = [0] * count
+        previous = None
+        for match in WORD_PATTERN.finditer(text.lower()):
+            word = match.group()
+            if word in self.words or (previous is not None and f"{previous} {word}" in self.phrases):
+                hits[max(0, (match.start() - offset) // size)] += 1
+            previous = word
+        return hits
+
+    def chunks(self, text: str, subject: str = '') -> List[str]:
+        """
+        Model inputs for a preprocessed, untruncated email text
+
+        Args:
+            text: Preprocessed text (subject and body) before truncation
+            subject: Original subject, repeated in front of later chunks
+
+        Returns:
+            Up to max_chunks texts of at most window characters, head first
+        """
+        head = text[:self.window].strip()
+        rest = text[self.window:]
+        if self.max_chunks == 1 or not rest.strip():
+            return [head]
+
+        prefix = ' '.join(subject.split())[:SUBJECT_PREFIX_CHARS]
+        size = self.window - len(prefix) - 1 if prefix else self.window
+        count = -(-len(rest) // size)
+        offset = len(rest) - count * size
+        hits = self._keyword_hits(rest, size, offset, count)
+
+        tail = count - 1
+        dense = sorted((i for i in range(tail) if hits[i]), key=lambda i: (-hits[i], i))
+        picked = dense[:1] + [tail] + dense[1:]
+
+        chunks = [head]
+        for i in picked[:self.max_chunks - 1]:
+            part = rest[max(0, offset + i * size):offset + (i + 1) * size].strip()
+            if part:
+                chunks.append(f"{prefix} {part}" if prefix else part)
+
+        self.stats['long_emails'] += 1
+        self.stats['chunks'] += len(chunks)
+        return chunks
+
+    def get_info(self) -> Dict:
+        return {'enabled': config.LONG_EMAIL_ENABLED, 'max_chunks': self.max_chunks, 'window': self.window, **self.stats}
@@ -0,0 +1,171 @@
+"""
+Local model registry for Automail AI Server
+Versioned model artifacts under MODEL_CACHE_DIR/registry, plus the
+activation history used for hot swaps and rollback
+"""
+import os
+import re
+import json
+import time
+import shutil
+import logging
+import threading
+from typing import Dict, List, Optional
+from config.config import get_config
+
+config = get_config()
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = 'manifest.json'
+STATE_FILE = 'registry.json'
+
+def version_slug(version: str) -> str:
+    """Directory name for a version (hub ids contain slashes)"""
+    return re.sub(r'[^A-Za-z0-9._-]+', '--', version)
+
+class ModelRegistry:
+    """
+    Versioned model artifacts on local disk
+
+    A version is either a copy of a local model directory saved with
+    save_pretrained (e.g. a fine-tuned model), stored under
+    <root>/<version>/model, or a Hugging Face hub id loaded through the
+    regular model cache. Every version has a manifest; registry.json
+    records the active version and the activation history.
+    """
+
+    def __init__(self, root: str = None):
+        self.root = root or os.path.join(config.MODEL_CACHE_DIR, 'registry')
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def _version_dir(self, version: str) -> str:
+        return os.path.join(self.root, version_slug(version))
+
+    def _write_json(self, path: str, data: Dict):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def _read_state(self) -> Dict:
+        try:
+            with open(os.path.join(self.root, STATE_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'active': None, 'history': []}
+
+    def register(self, version: str, source: str, metadata: Dict = None) -> Dict:
+        """
+        Add a version to the registry
+
+        Args:
+            version: Version tag stamped on results produced by this model
+            source: Local model directory (copied into the registry) or hub id
+            metadata: Extra manifest fields, e.g. training metrics
+
+        Returns:
+            The version's manifest
+        """
+        with self._lock:
+            version_dir = self._version_dir(version)
+            if os.path.exists(os.path.join(version_dir, MANIFEST_FILE)):
+                raise ValueError(f"Model version {version} is already registered")
+
+            os.makedirs(version_dir, exist_ok=True)
+            if os.path.isdir(source):
+                model_dir = os.path.join(version_dir, 'model')
+                if os.path.abspath(source) != os.path.abspath(model_dir):
+                    shutil.copytree(source, model_dir, dirs_exist_ok=True)
+                location = {'kind': 'local', 'path': model_dir}
+            else:
+                location = {'kind': 'hub', 'path': source}
+
+            manifest = {
+                'version': version,
+                'source': source,
+                **location,
+                'registered_at': time.time(),
+                'metadata': metadata or {}
+            }
+            self._write_json(os.path.join(version_dir, MANIFEST_FILE), manifest)
+
+        logger.info(f"📚 Registered model version {version}")
+        return manifest
+
+    def get(self, version: str) -> Optional[Dict]:
+        """Manifest of a registered version, or None"""
+        try:
+            with open(os.path.join(self._version_dir(version), MANIFEST_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def resolve(self, version: str) -> str:
+        """
+        Path or hub id to load a version from
+        Unregistered versions are treated as hub ids
+        """
+        manifest = self.get(version)
+        return manifest['path'] if manifest else version
+
+    def list_versions(self) -> List[Dict]:
+        """All registered manifests, oldest first"""
+        manifests = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name, MANIFEST_FILE)
+            if os.path.isfile(path):
+                try:
+                    with open(path) as f:
+                        manifests.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        return sorted(manifests, key=lambda manifest: manifest.get('registered_at', 0))
+
+    @property
+    def active_version(self) -> Optional[str]:
+        return self._read_state()['active']
+
+    @property
+    def previous_version(self) -> Optional[str]:
+        """Version that was active before the current one"""
+        history = self._read_state()['history']
+        return history[-2] if len(history) >= 2 else None
+
+    def set_active(self, version: str, rollback: bool = False):
+        """
+        Record a version as active
+
+        Args:
+            rollback: Drop the current version from the history instead of
+                appending, so repeated rollbacks keep walking back
+        """
+        with self._lock:
+            state = self._read_state()
+            history = state['history']
+            if rollback and len(history) >= 2 and history[-2] == version:
+                history.pop()
+            elif not history or history[-1] != version:
+                history.append(version)
+            state.update({'active': version, 'history': history, 'updated_at': time.time()})
+            self._write_json(os.path.join(self.root, STATE_FILE), state)
+
+    def get_status(self) -> Dict:
+        state = self._read_state()
+        return {
+            'root': self.root,
+            'active': state['active'],
+            'previous': self.previous_version,
+            'history': state['history'],
+            'versions': self.list_versions()
+        }
+
+# Global registry instance
+_registry_instance = None
+
+def get_model_registry() -> ModelRegistry:
+    """Get singleton model registry instance"""
+    global _registry_instance
+    if _registry_instance is None:
+        _registry_instance = ModelRegistry()
+    return _registry_instance
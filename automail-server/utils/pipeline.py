@@ -0,0 +1,274 @@
+"""
+Staged inference pipeline for Automail AI Server
+Runs preprocess, tokenize, infer and postprocess in separate threads
+connected by bounded queues, so the Python-heavy stages for the next
+batch overlap with the forward pass (which releases the GIL) of the current one
+"""
+import time
+import queue
+import logging
+import threading
+from typing import Dict, Iterable, Iterator, List
+import numpy as np
+from config.config import get_config
+from utils.long_email import pool_scores
+
+config = get_config()
+logger = logging.getLogger(__name__)
+
+STAGES = ('preprocess', 'tokenize', 'infer', 'postprocess')
+
+# Marks the end of the input in a stage queue
+_END = object()
+
+class _Failure:
+    """Carries an exception from a stage thread to the consumer"""
+
+    def __init__(self, error: Exception):
+        self.error = error
+
+class PipelineStats:
+    """
+    Thread-safe cumulative per-stage timings
+    Utilisation is busy time divided by the wall time of the runs
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.wall_seconds = 0.0
+        self.items = 0
+        self.busy = {stage: 0.0 for stage in STAGES}
+        self.batches = {stage: 0 for stage in STAGES}
+
+    def record(self, wall_seconds: float, items: int, busy: Dict[str, float], batches: Dict[str, int]):
+        with self._lock:
+            self.runs += 1
+            self.wall_seconds += wall_seconds
+            self.items += items
+            for stage in STAGES:
+                self.busy[stage] += busy[stage]
+                self.batches[stage] += batches[stage]
+
+    def as_dict(self) -> Dict:
+        with self._lock:
+            wall = self.wall_seconds
+            return {
+                'runs': self.runs,
+                'items': self.items,
+                'wall_seconds': round(wall, 3),
+                'stages': {
+                    stage: {
+                        'batches': self.batches[stage],
+                        'busy_seconds': round(self.busy[stage], 3),
+                        'utilization': round(self.busy[stage] / wall, 3) if wall else 0.0
+                    }
+                    for stage in STAGES
+                }
+            }
+
+class InferencePipeline:
+    """
+    One pass of emails through the classifier stages
+
+    The classifier provides preprocess_email_content, tokenize, forward and
+    postprocess; a feeder thread groups the input into batches and every
+    stage runs in its own thread. Results are yielded in input order.
+    With a feature table (see utils/feature_store.py) texts whose score
+    vectors are stored skip tokenisation and the forward pass. A screen
+    function, screen(content, subject) -> (texts, result or None), replaces
+    preprocessing and answers emails it has a result for without the model;
+    an email it returns several texts (chunks) for is scored on all of them
+    in the same forward pass, and their scores are pooled (see utils/long_email.py).
+    Preprocessed input is either texts or the (texts, result) pairs of a
+    screen function that ran elsewhere (e.g. in a parsing process).
+    """
+
+    def __init__(self, classifier, batch_size: int = None, queue_size: int = None,
+                 preprocessed: bool = False, ramp_up: bool = False, stats: PipelineStats = None,
+                 features=None, screen=None):
+        self.classifier = classifier
+        self.batch_size = batch_size or config.INFERENCE_BATCH_SIZE
+        self.queue_size = queue_size or config.PIPELINE_QUEUE_SIZE
+        self.preprocessed = preprocessed
+        self.ramp_up = ramp_up
+        self.stats = stats
+        self.features = features
+        self.screen = screen
+
+        self._stop = threading.Event()
+        self._busy = {stage: 0.0 for stage in STAGES}
+        self._batches = {stage: 0 for stage in STAGES}
+
+    # Stage functions: each takes and returns a batch dict
+
+    def _preprocess(self, batch: Dict) -> Dict:
+        if self.preprocessed:
+            # Texts, or (texts, result) pairs a screen function already returned
+            screened = [item if isinstance(item, tuple) else ([item], None) for item in batch['items']]
+        elif self.screen is not None:
+            screened = [self.screen(email.get('content', ''), email.get('subject', '')) for email in batch['items']]
+        else:
+            screened = [
+                ([self.classifier.preprocess_email_content(email.get('content', ''), email.get('subject', ''))], None)
+                for email in batch['items']
+            ]
+        chunks = [texts for texts, _ in screened]
+        batch['answered'] = {i: result for i, (_, result) in enumerate(screened) if result}
+
+        # Model inputs: the non-empty chunks of every email the model answers, and the email of each
+        batch['count'] = len(chunks)
+        batch['texts'], batch['owners'] = [], []
+        for i, texts in enumerate(chunks):
+            if i in batch['answered']:
+                continue
+            for text in texts:
+                if text:
+                    batch['texts'].append(text)
+                    batch['owners'].append(i)
+        batch['positions'] = list(range(len(batch['texts'])))
+        batch['cached'] = {}
+        if self.features is not None and batch['positions']:
+            rows = self.features.get([batch['texts'][i] for i in batch['positions']])
+            batch['cached'] = {i: row for i, row in zip(batch['positions'], rows) if row is not None}
+            batch['positions'] = [i for i in batch['positions'] if i not in batch['cached']]
+        return batch
+
+    def _tokenize(self, batch: Dict) -> Dict:
+        if batch['positions']:
+            batch['encoded'] = self.classifier.tokenize([batch['texts'][i] for i in batch['positions']])
+        return batch
+
+    def _infer(self, batch: Dict) -> Dict:
+        if batch['positions']:
+            batch['scores'] = self.classifier.forward(batch.pop('encoded'))
+        return batch
+
+    def _postprocess(self, batch: Dict) -> List[Dict]:
+        results = [batch['answered'].get(i) for i in range(batch['count'])]
+        rows = batch['cached']
+        if batch['positions']:
+            if self.features is not None:
+                self.features.put([batch['texts'][i] for i in batch['positions']], batch['scores'])
+            rows.update(zip(batch['positions'], batch['scores']))
+        if rows:
+            # Chunk rows in input order, pooled per email
+            chunk_rows = {}
+            for position, owner in enumerate(batch['owners']):
+                chunk_rows.setdefault(owner, []).append(rows[position])
+            owners = list(chunk_rows)
+            scores = np.stack([pool_scores(np.stack(chunk_rows[owner])) for owner in owners])
+            for owner, result in zip(owners, self.classifier.postprocess(scores)):
+                results[owner] = result
+
+        for i, result in enumerate(results):
+            if result is None:
+                results[i] = {
+                    'label': 'Review',
+                    'confidence': 0.1,
+                    'reasoning': 'Empty or invalid email content',
+                    'model_version': self.classifier.model_version
+                }
+        return results
+
+    # Plumbing
+
+    def _put(self, q: queue.Queue, item) -> bool:
+        """Blocking put that gives up once the pipeline is stopped"""
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q: queue.Queue):
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _feed(self, items: Iterable, out_q: queue.Queue):
+        """Group the input into batches; with ramp_up the first batches are small for a fast first result"""
+        size = 1 if self.ramp_up else self.batch_size
+        batch = []
+        try:
+            for item in items:
+                batch.append(item)
+                if len(batch) >= size:
+                    if not self._put(out_q, {'items': batch}):
+                        return
+                    batch = []
+                    size = min(size * 2, self.batch_size)
+            if batch:
+                self._put(out_q, {'items': batch})
+        except Exception as e:
+            self._put(out_q, _Failure(e))
+        self._put(out_q, _END)
+
+    def _run_stage(self, name: str, fn, in_q: queue.Queue, out_q: queue.Queue):
+        while True:
+            batch = self._get(in_q)
+            if batch is _END or isinstance(batch, _Failure):
+                self._put(out_q, batch)
+                if batch is _END:
+                    return
+                continue
+
+            start = time.perf_counter()
+            try:
+                batch = fn(batch)
+            except Exception as e:
+                batch = _Failure(e)
+            self._busy[name] += time.perf_counter() - start
+            self._batches[name] += 1
+
+            if not self._put(out_q, batch):
+                return
+
+    def run(self, items: Iterable) -> Iterator[Dict]:
+        """
+        Classify items, yielding one result per item in input order
+
+        Raises:
+            The first exception raised by the input iterator or any stage
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(STAGES) + 1)]
+        stage_fns = (self._preprocess, self._tokenize, self._infer, self._postprocess)
+
+        threads = [threading.Thread(target=self._feed, args=(items, queues[0]), name='pipeline-feed', daemon=True)]
+        for i, (name, fn) in enumerate(zip(STAGES, stage_fns)):
+            threads.append(threading.Thread(
+                target=self._run_stage, args=(name, fn, queues[i], queues[i + 1]),
+                name=f'pipeline-{name}', daemon=True
+            ))
+
+        start = time.perf_counter()
+        count = 0
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                results = self._get(queues[-1])
+                if results is _END:
+                    break
+                if isinstance(results, _Failure):
+                    raise results.error
+                count += len(results)
+                yield from results
+        finally:
+            # Also reached when the consumer stops early (e.g. client disconnect)
+            self._stop.set()
+            if self.stats is not None:
+                self.stats.record(time.perf_counter() - start, count, self._busy, self._batches)
+
+    def get_stats(self) -> Dict:
+        """Busy time per stage for this run"""
+        return {
+            stage: {'batches': self._batches[stage], 'busy_seconds': round(self._busy[stage], 3)}
+            for stage in STAGES
+        }
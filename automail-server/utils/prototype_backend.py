@@ -0,0 +1,166 @@
+"""
+Embedding prototype backend for Automail AI Server
+Embeds each email once with a small sentence encoder and scores it against
+one prototype vector per label, so a whole batch is scored with a single
+matrix multiply instead of one NLI pass per label hypothesis
+"""
+import os
+import json
+import logging
+import threading
+from typing import Dict, List, Tuple
+import numpy as np
+from config.config import get_config
+from utils.classifier import LABEL_MAPPING, ModelBackend
+
+config = get_config()
+logger = logging.getLogger(__name__)
+
+# Examples may be labelled with API labels ("Work") or zero-shot labels
+_ZERO_SHOT_LABELS = {api_label: label for label, api_label in LABEL_MAPPING.items()}
+
+def load_examples(path: str) -> List[Tuple[str, str]]:
+    """
+    Labelled example emails from a JSONL file of {"label": ..., "text": ...}
+
+    Returns:
+        (zero-shot label, text) pairs; unknown labels and bad lines are skipped
+    """
+    examples = []
+    if not path or not os.path.exists(path):
+        return examples
+
+    with open(path) as f:
+        for line in f:
+            try:
+                item = json.loads(line)
+            except ValueError:
+                continue
+            label = _ZERO_SHOT_LABELS.get(item.get('label'), item.get('label'))
+            if label in LABEL_MAPPING and item.get('text'):
+                examples.append((label, item['text']))
+    return examples
+
+def cosine_scores(embeddings: np.ndarray, prototypes: np.ndarray, temperature: float) -> np.ndarray:
+    """
+    Label probabilities for unit-length embeddings
+
+    Args:
+        embeddings: (texts, dim) unit vectors
+        prototypes: (labels, dim) unit vectors
+        temperature: Softmax temperature over the cosine similarities
+
+    Returns:
+        (texts, labels) array whose rows sum to 1
+    """
+    logits = (embeddings @ prototypes.T) / temperature
+    logits -= logits.max(axis=1, keepdims=True)
+    scores = np.exp(logits)
+    return scores / scores.sum(axis=1, keepdims=True)
+
+class PrototypeBackend(ModelBackend):
+    """
+    ModelBackend for sentence encoders (e.g. sentence-transformers/all-MiniLM-L6-v2)
+
+    Each label's prototype is the normalised mean embedding of its
+    description (the zero-shot label text) and any stored examples,
+    computed when the backend loads.
+    """
+
+    kind = 'prototype'
+
+    def __init__(self, version: str, source: str, model, tokenizer, device,
+                 examples_path: str = None, temperature: float = None, embedding_features=None):
+        super().__init__(version, source, model, tokenizer, device)
+        self.embedding_features = embedding_features
+        self.classification_labels = list(LABEL_MAPPING)
+        self.hypotheses = []
+        self.examples_path = examples_path or config.PROTOTYPE_EXAMPLES_PATH
+        self.temperature = temperature or config.PROTOTYPE_TEMPERATURE
+        self._lock = threading.Lock()
+        self.rebuild_prototypes()
+
+    @staticmethod
+    def auto_model(transformers):
+        return transformers.AutoModel
+
+    def tokenize(self, texts: List[str]):
+        """Tokenisation stage: one sequence per text"""
+        return self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=config.PROTOTYPE_MAX_LENGTH,
+            return_tensors='pt'
+        )
+
+    def _logits(self, model, encoded):
+        # Mean-pool token embeddings, ignoring padding
+        hidden = model(**encoded)[0]
+        mask = encoded['attention_mask'].unsqueeze(-1).to(hidden.dtype)
+        return (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+
+    def _scores(self, torch, logits):
+        return torch.nn.functional.normalize(logits.float(), dim=-1)
+
+    def embed(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        """Unit-length embeddings, shape (texts, dim); stored ones are read, not recomputed"""
+        def compute(texts):
+            return np.concatenate([
+                super(PrototypeBackend, self).forward(self.tokenize(texts[start:start + batch_size]))
+                for start in range(0, len(texts), batch_size)
+            ])
+        if self.embedding_features is None:
+            return compute(texts)
+        return self.embedding_features.get_or_compute(texts, compute)
+
+    def forward(self, encoded) -> np.ndarray:
+        """
+        Inference stage: one encoder pass, then one matrix multiply
+
+        Returns:
+            Array of shape (texts, labels) with label probabilities
+        """
+        embeddings = super().forward(encoded)
+        return cosine_scores(embeddings, self.prototypes, self.temperature)
+
+    def postprocess(self, scores: np.ndarray) -> List[Dict]:
+        """Postprocessing stage: API results with the full score vector"""
+        results = super().postprocess(scores)
+        for result, row in zip(results, scores):
+            best = int(row.argmax())
+            result['reasoning'] = f'Embedding prototype similarity: {self.classification_labels[best]} ({row[best]:.3f})'
+            result['scores'] = {
+                LABEL_MAPPING[label]: round(float(score), 4)
+                for label, score in zip(self.classification_labels, row)
+            }
+        return results
+
+    def rebuild_prototypes(self):
+        """Recompute every prototype from the label descriptions and the examples file"""
+        examples = load_examples(self.examples_path)
+        with self._lock:
+            self._sums = self.embed(self.classification_labels)
+            self._counts = np.ones(len(self.classification_labels))
+            self._add(examples)
+        logger.info(f"🧭 Built {len(self.classification_labels)} label prototypes from {len(examples)} examples")
+
+    def _add(self, examples: List[Tuple[str, str]]):
+        """Accumulate example embeddings into the per-label sums (caller holds the lock)"""
+        if examples:
+            rows = [self.classification_labels.index(label) for label, _ in examples]
+            np.add.at(self._sums, rows, self.embed([text for _, text in examples]))
+            np.add.at(self._counts, rows, 1)
+        means = self._sums / self._counts[:, None]
+        self.prototypes = means / np.linalg.norm(means, axis=1, keepdims=True)
+
+    def get_info(self) -> Dict:
+        return {
+            **super().get_info(),
+            'temperature': self.temperature,
+            'examples_path': self.examples_path,
+            'examples_per_label': {
+                LABEL_MAPPING[label]: int(count) - 1
+                for label, count in zip(self.classification_labels, self._counts)
+            }
+        }
@@ -0,0 +1,204 @@
+"""
+Persistent classification result store for Automail AI Server
+Remembers previous answers per API key so inbox re-scans can skip inference
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional
+from config.config import get_config
+
+config = get_config()
+logger = logging.getLogger(__name__)
+
+# SQLite caps the number of bound parameters per statement
+_LOOKUP_CHUNK_SIZE = 500
+
+def compute_content_hash(content: str, subject: str = "") -> str:
+    """
+    Hash email content the same way clients are expected to
+
+    Args:
+        content: Email body content
+        subject: Email subject line
+
+    Returns:
+        Hex encoded SHA-256 of subject and content
+    """
+    payload = f"{subject or ''}\n{content or ''}".encode('utf-8')
+    return hashlib.sha256(payload).hexdigest()
+
+class ResultStore:
+    """
+    Embedded SQLite store of classification results
+    Keyed by API key, message ID and content hash; WAL mode allows
+    concurrent readers while a request thread writes
+
+    model_version is the tier or model that produced a result, and
+    serving_model the model that was serving when it was stored. They
+    differ for answers given ahead of the model (senders, spam, threads,
+    corrections), which stay valid until the serving model changes.
+    """
+
+    def __init__(self, db_path: str = None):
+        self.db_path = db_path or config.RESULT_STORE_PATH
+        self._local = threading.local()
+
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._create_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Get the connection for the current thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _create_schema(self):
+        conn = self._connect()
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    api_key TEXT NOT NULL,
+                    message_id TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    result TEXT NOT NULL,
+                    model_version TEXT NOT NULL,
+                    updated_at REAL NOT NULL,
+                    serving_model TEXT,
+                    PRIMARY KEY (api_key, message_id, content_hash)
+                )
+            """)
+            # Stores created before serving_model existed: their results count as their own model's
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(results)")]
+            if 'serving_model' not in columns:
+                conn.execute("ALTER TABLE results ADD COLUMN serving_model TEXT")
+
+    def put(self, api_key: str, message_id: str, content_hash: str, result: Dict,
+            serving_model: str = None):
+        """
+        Store a classification result, replacing older content versions
+        of the same message
+        """
+        self.put_many(api_key, [(message_id, content_hash, result, serving_model)])
+
+    def put_many(self, api_key: str, entries: List[tuple]):
+        """
+        Store several (message_id, content_hash, result, serving_model) entries in one transaction
+        A serving_model of None means the result's own model_version
+        """
+        if not entries:
+            return
+
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            for message_id, content_hash, result, serving_model in entries:
+                conn.execute(
+                    "DELETE FROM results WHERE api_key = ? AND message_id = ? AND content_hash != ?",
+                    (api_key, message_id, content_hash)
+                )
+                model_version = result.get('model_version') or 'unknown'
+                conn.execute(
+                    "INSERT OR REPLACE INTO results "
+                    "(api_key, message_id, content_hash, result, model_version, updated_at, serving_model) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        api_key, message_id, content_hash,
+                        json.dumps(_storable(result)),
+                        model_version,
+                        now,
+                        serving_model or model_version
+                    )
+                )
+
+    def get(self, api_key: str, message_id: str, content_hash: str,
+            model_version: str = None) -> Optional[Dict]:
+        """Get a stored result, optionally only if produced by model_version"""
+        known, _ = self.sync(api_key, [{'message_id': message_id, 'content_hash': content_hash}], model_version)
+        return known[0] if known else None
+
+    def sync(self, api_key: str, messages: List[Dict], model_version: str = None):
+        """
+        Split client (message_id, content_hash) pairs into known and unknown
+
+        Args:
+            api_key: Scope of the lookup
+            messages: List of dicts with 'message_id' and 'content_hash'
+            model_version: Only treat results stored while this model was serving as known
+
+        Returns:
+            Tuple of (known results, pairs that need classifying)
+        """
+        stored = {}
+        message_ids = list({m['message_id'] for m in messages})
+        conn = self._connect()
+
+        for start in range(0, len(message_ids), _LOOKUP_CHUNK_SIZE):
+            chunk = message_ids[start:start + _LOOKUP_CHUNK_SIZE]
+            placeholders = ','.join('?' * len(chunk))
+            query = (
+                f"SELECT message_id, content_hash, result, model_version FROM results "
+                f"WHERE api_key = ? AND message_id IN ({placeholders})"
+            )
+            params = [api_key] + chunk
+            if model_version:
+                query += " AND COALESCE(serving_model, model_version) = ?"
+                params.append(model_version)
+
+            for message_id, content_hash, result, version in conn.execute(query, params):
+                stored[(message_id, content_hash)] = (result, version)
+
+        known = []
+        unknown = []
+        for message in messages:
+            key = (message['message_id'], message['content_hash'])
+            if key in stored:
+                result, version = stored[key]
+                entry = json.loads(result)
+                entry.update({
+                    'message_id': key[0],
+                    'content_hash': key[1],
+                    'model_version': version
+                })
+                known.append(entry)
+            else:
+                unknown.append({'message_id': key[0], 'content_hash': key[1]})
+
+        return known, unknown
+
+    def get_stats(self) -> Dict:
+        """Get store size information"""
+        conn = self._connect()
+        count = conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        return {
+            'path': self.db_path,
+            'stored_results': count
+        }
+
+def _storable(result: Dict) -> Dict:
+    """Drop per-request metadata that should not be replayed from the store"""
+    return {
+        key: value for key, value in result.items()
+        if key not in ('processing_time', 'timestamp', 'server_version', 'message_id', 'content_hash')
+    }
+
+# Global store instance
+_store_instance = None
+
+def get_result_store() -> ResultStore:
+    """Get singleton result store instance"""
+    global _store_instance
+    if _store_instance is None:
+        _store_instance = ResultStore()
+    return _store_instance
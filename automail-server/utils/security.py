@@ -3,6 +3,7 @@ Security utilities for Automail AI Server
 Handles API key validation, rate limiting, and request security
 """
 import time
+import hashlib
 import logging
 from functools import wraps
 from typing import Dict, Optional
@@ -90,6 +91,44 @@ def get_client_identifier() -> str:
     # Fallback to IP address
     return f"ip_{request.environ.get('HTTP_X_FORWARDED_FOR', request.environ.get('REMOTE_ADDR', 'unknown'))}"
 
+def get_api_key_id(api_key: str = None) -> str:
+    """
+    Get a stable, non-reversible identifier for an API key
+    Used to scope stored per-user data without persisting the key itself
+    
+    Args:
+        api_key: API key (defaults to the X-API-Key header of the current request)
+        
+    Returns:
+        Short hex digest identifying the key
+    """
+    if api_key is None:
+        api_key = request.headers.get('X-API-Key', '')
+    
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]
+
+def validate_email_object(email, position: int) -> Optional[str]:
+    """
+    Validate a single email object from a batch or stream
+    
+    Args:
+        email: Parsed email object
+        position: 1-based position used in error messages
+        
+    Returns:
+        Error message if validation fails, None if valid
+    """
+    if not isinstance(email, dict):
+        return f"Email {position} must be an object with content and subject"
+    
+    if 'content' not in email:
+        return f"Email {position} missing required field: content"
+        
+    if not isinstance(email['content'], str):
+        return f"Email {position} content must be a string"
+    
+    return None
+
 def validate_json_input(data: Dict, required_fields: list) -> Optional[str]:
     """
     Validate JSON input data with proper email handling
@@ -124,20 +163,28 @@ def validate_json_input(data: Dict, required_fields: list) -> Optional[str]:
                 
             # Validate each email object
             for i, email in enumerate(field_value):
-                if not isinstance(email, dict):
-                    return f"Email {i+1} must be an object with content and subject"
-                
-                if 'content' not in email:
-                    return f"Email {i+1} missing required field: content"
-                    
-                if not isinstance(email['content'], str):
-                    return f"Email {i+1} content must be a string"
+                error_message = validate_email_object(email, i + 1)
+                if error_message:
+                    return error_message
                     
         elif field == 'corrections':
             # For training endpoint - validate corrections array
             if not isinstance(field_value, list):
                 return f"Field '{field}' must be an array"
                 
+        elif field == 'messages':
+            # For delta sync - validate (message_id, content_hash) pairs
+            if not isinstance(field_value, list):
+                return f"Field '{field}' must be an array"
+            
+            for i, message in enumerate(field_value):
+                if not isinstance(message, dict):
+                    return f"Message {i+1} must be an object with message_id and content_hash"
+                
+                for key in ('message_id', 'content_hash'):
+                    if not isinstance(message.get(key), str) or not message[key]:
+                        return f"Message {i+1} missing required field: {key}"
+                
         else:
             # Standard string fields (content, subject, prompt, etc.)
             if not field_value and field_value != "":  # Allow empty strings
@@ -220,6 +267,25 @@ def require_api_key(f):
     
     return decorated_function
 
+def require_admin_key(f):
+    """
+    Decorator to restrict operational endpoints to the admin API key
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        api_key = request.headers.get('X-API-Key')
+        
+        if not api_key or api_key != config.ADMIN_API_KEY:
+            logger.warning(f"Rejected admin request from {request.remote_addr}")
+            return jsonify({
+                'error': 'Invalid admin key',
+                'message': 'This endpoint requires the admin API key'
+            }), 401
+        
+        return f(*args, **kwargs)
+    
+    return decorated_function
+
 def validate_request_data(required_fields: list):
     """
     Decorator to validate JSON request data
@@ -246,9 +312,9 @@ def validate_request_data(required_fields: list):
                         'message': error_message
                     }), 400
                 
-                # Sanitize input fields
+                # Sanitize input fields (arrays are validated item by item above)
                 for field in required_fields:
-                    if field in data:
+                    if field in data and isinstance(data[field], str):
                         data[field] = sanitize_input(data[field])
                 
                 # Store sanitized data in request context
@@ -0,0 +1,268 @@
+"""
+Sender index for Automail AI Server
+Label distributions per sender address and domain, per API key plus a
+global one. Most mail comes from senders whose label never changes, so an
+email from a sender with a confident distribution is answered without
+running the classification model.
+"""
+import os
+import time
+import hashlib
+import logging
+import threading
+from email.utils import parseaddr
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from config.config import get_config
+from utils.classifier import LABEL_MAPPING, RULE_BASED_MODEL_VERSION
+from utils.link_domains import LINK_MODEL_VERSION
+from utils.thread_state import THREAD_MODEL_VERSION
+
+config = get_config()
+logger = logging.getLogger(__name__)
+
+# Version tag recorded for results answered from the sender index
+SENDER_MODEL_VERSION = 'sender-index'
+
+# Labels the index counts; Review and custom labels are ignored
+SENDER_LABELS = list(dict.fromkeys(LABEL_MAPPING.values()))
+
+GLOBAL_OWNER = 'global'
+
+def parse_sender(sender) -> Optional[Tuple[str, str]]:
+    """
+    Normalised (address, domain) of a From value such as 'Ann <ann@example.com>'
+
+    Returns:
+        None if the value holds no usable address
+    """
+    if not isinstance(sender, str):
+        return None
+    address = parseaddr(sender)[1].strip().lower()
+    local, _, domain = address.rpartition('@')
+    if not local or not domain or '.' not in domain:
+        return None
+    return address, domain
+
+def _key(owner: str, value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(f"{owner}\n{value}".encode('utf-8'), digest_size=8).digest(), 'little')
+
+class SenderIndex:
+    """
+    Decaying label counts in a fixed-capacity hash table
+
+    Every entry is one row of a (capacity, labels) float32 count matrix,
+    found through a dict from a 64-bit hash of owner and address (or
+    domain). Counts halve every SENDER_HALF_LIFE_DAYS; decay is applied
+    lazily when a row is touched. When the table is full the entries with
+    the least decayed weight are evicted. Lookups try the caller's
+    address, then their domain, then the global address and domain: the
+    first level with enough weight (SENDER_MIN_WEIGHT for addresses,
+    SENDER_DOMAIN_MIN_WEIGHT for domains) decides, and answers only if
+    its dominant label has at least SENDER_MIN_SHARE of it.
+    """
+
+    def __init__(self, path: str = None, capacity: int = None, half_life_days: float = None,
+                 min_weight: float = None, domain_min_weight: float = None, min_share: float = None):
+        self.path = path if path is not None else config.SENDER_INDEX_PATH
+        self.capacity = capacity or config.SENDER_INDEX_CAPACITY
+        self.half_life = (half_life_days or config.SENDER_HALF_LIFE_DAYS) * 86400
+        self.min_weight = min_weight or config.SENDER_MIN_WEIGHT
+        self.domain_min_weight = domain_min_weight or config.SENDER_DOMAIN_MIN_WEIGHT
+        self.min_share = min_share or config.SENDER_MIN_SHARE
+        self.label_ids = {label: i for i, label in enumerate(SENDER_LABELS)}
+
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._keys = np.zeros(self.capacity, dtype=np.uint64)
+        self._counts = np.zeros((self.capacity, len(SENDER_LABELS)), dtype=np.float32)
+        self._updated = np.zeros(self.capacity, dtype=np.float64)
+        self._free = list(range(self.capacity - 1, -1, -1))
+        self._dirty = False
+        self._saved_at = time.time()
+        self._saving = False
+        self.stats = {'lookups': 0, 'user_hits': 0, 'global_hits': 0, 'updates': 0, 'evicted': 0}
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def _decay(self, rows, now: float):
+        """Bring rows' counts forward to now (caller holds the lock)"""
+        factor = 0.5 ** (np.maximum(now - self._updated[rows], 0.0) / self.half_life)
+        self._counts[rows] *= factor[..., None].astype(np.float32)
+        self._updated[rows] = now
+
+    def _evict(self, now: float):
+        """Free the entries with the least decayed weight (caller holds the lock)"""
+        rows = np.fromiter(self._slots.values(), dtype=np.int64)
+        weights = self._counts[rows].sum(axis=1) * 0.5 ** ((now - self._updated[rows]) / self.half_life)
+        # Rows touched by the current update stay
+        weights[self._updated[rows] >= now] = np.inf
+        count = max(1, len(rows) // 16)
+        for row in rows[np.argpartition(weights, count - 1)[:count]]:
+            del self._slots[int(self._keys[row])]
+            self._counts[row] = 0
+            self._free.append(int(row))
+        self.stats['evicted'] += count
+
+    def _row(self, key: int, now: float) -> int:
+        row = self._slots.get(key)
+        if row is None:
+            if not self._free:
+                self._evict(now)
+            row = self._free.pop()
+            self._slots[key] = row
+            self._keys[row] = key
+            self._updated[row] = now
+        return row
+
+    def update(self, api_key_id: str, sender, label: str, weight: float = 1.0,
+               domain: bool = True, now: float = None) -> bool:
+        """
+        Count one email from sender as label for the caller and globally
+
+        Args:
+            weight: Number of emails this one counts as
+            domain: Also count it for the sender's domain
+
+        Returns:
+            False if the sender or label cannot be indexed
+        """
+        parsed = parse_sender(sender)
+        label_id = self.label_ids.get(label)
+        if parsed is None or label_id is None:
+            return False
+
+        now = now or time.time()
+        with self._lock:
+            for owner in (api_key_id, GLOBAL_OWNER):
+                for value in (parsed if domain else parsed[:1]):
+                    row = self._row(_key(owner, value), now)
+                    self._decay(row, now)
+                    self._counts[row, label_id] += weight
+            self.stats['updates'] += 1
+            self._dirty = True
+        self._maybe_save()
+        return True
+
+    def update_from_results(self, api_key_id: str, emails: List[Dict], results: List[Dict]) -> int:
+        """Count model results; answers from the index itself, the rules, link hints or thread state are skipped"""
+        updated = 0
+        for email, result in zip(emails, results):
+            if not result or result.get('model_version') in (
+                SENDER_MODEL_VERSION, RULE_BASED_MODEL_VERSION, LINK_MODEL_VERSION, THREAD_MODEL_VERSION
+            ):
+                continue
+            updated += self.update(api_key_id, email.get('sender'), result.get('label'))
+        return updated
+
+    def lookup(self, api_key_id: str, sender, now: float = None) -> Optional[Dict]:
+        """
+        The dominant label of a known sender
+
+        Returns:
+            A result dict, or None when the model has to answer
+        """
+        parsed = parse_sender(sender)
+        if parsed is None:
+            return None
+
+        now = now or time.time()
+        with self._lock:
+            self.stats['lookups'] += 1
+            for owner in (api_key_id, GLOBAL_OWNER):
+                for value, min_weight in zip(parsed, (self.min_weight, self.domain_min_weight)):
+                    row = self._slots.get(_key(owner, value))
+                    if row is None:
+                        continue
+                    self._decay(row, now)
+                    counts = self._counts[row]
+                    total = float(counts.sum())
+                    if total < min_weight:
+                        continue
+
+                    best = int(counts.argmax())
+                    share = float(counts[best]) / total
+                    if share < self.min_share:
+                        return None
+                    scope = 'user' if owner != GLOBAL_OWNER else 'global'
+                    self.stats[f'{scope}_hits'] += 1
+                    return {
+                        'label': SENDER_LABELS[best],
+                        'confidence': round(share, 3),
+                        'reasoning': f"Known sender: {share:.0%} of {total:.0f} recent emails from {value} were {SENDER_LABELS[best]}",
+                        'model_version': SENDER_MODEL_VERSION,
+                        'sender_scope': scope
+                    }
+        return None
+
+    # Persistence: the index is derived data, so it is saved at most every
+    # SENDER_SAVE_SECONDS and a crash only loses the latest counts
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path) as data:
+                keys, counts, updated = data['keys'], data['counts'], data['updated']
+                if counts.shape[1] != len(SENDER_LABELS):
+                    raise ValueError('label set changed')
+            keep = np.argsort(-counts.sum(axis=1))[:self.capacity]
+            for row, i in enumerate(keep):
+                self._slots[int(keys[i])] = row
+            self._keys[:len(keep)] = keys[keep]
+            self._counts[:len(keep)] = counts[keep]
+            self._updated[:len(keep)] = updated[keep]
+            self._free = list(range(self.capacity - 1, len(keep) - 1, -1))
+            logger.info(f"📇 Loaded sender index with {len(keep)} entries")
+        except Exception as e:
+            logger.error(f"Failed to load sender index {self.path}: {str(e)}")
+
+    def _maybe_save(self):
+        if self._saving or not self.path or time.time() - self._saved_at < config.SENDER_SAVE_SECONDS:
+            return
+        self._saving = True
+        threading.Thread(target=self.save, name='sender-index-save', daemon=True).start()
+
+    def save(self):
+        """Write the index to its path (atomically)"""
+        try:
+            with self._lock:
+                if not self._dirty:
+                    return
+                rows = np.fromiter(self._slots.values(), dtype=np.int64)
+                keys, counts, updated = self._keys[rows], self._counts[rows], self._updated[rows]
+                self._dirty = False
+
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, keys=keys, counts=counts, updated=updated)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"Failed to save sender index: {str(e)}")
+        finally:
+            self._saved_at = time.time()
+            self._saving = False
+
+    def get_status(self) -> Dict:
+        with self._lock:
+            return {
+                'enabled': config.SENDER_INDEX_ENABLED,
+                'entries': len(self._slots),
+                'capacity': self.capacity,
+                **self.stats
+            }
+
+# Global sender index instance
+_sender_index_instance = None
+
+def get_sender_index() -> SenderIndex:
+    """Get singleton sender index"""
+    global _sender_index_instance
+    if _sender_index_instance is None:
+        _sender_index_instance = SenderIndex()
+    return _sender_index_instance
@@ -0,0 +1,249 @@
+"""
+Shadow evaluation for Automail AI Server
+Copies a sample of /classify traffic to a candidate model that runs in a
+low-priority background thread, and records how often it agrees with the
+primary model and how fast it is. The request path never waits on it.
+"""
+import os
+import time
+import queue
+import random
+import logging
+import threading
+from collections import deque
+from typing import Dict, Optional
+from config.config import get_config
+
+config = get_config()
+logger = logging.getLogger(__name__)
+
+# Latency samples kept per model for percentiles
+LATENCY_WINDOW = 1000
+
+def _percentiles(values) -> Dict:
+    ordered = sorted(values)
+    if not ordered:
+        return {'count': 0, 'mean_ms': None, 'p50_ms': None, 'p95_ms': None}
+
+    def pick(fraction):
+        return round(ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))], 1)
+
+    return {
+        'count': len(ordered),
+        'mean_ms': round(sum(ordered) / len(ordered), 1),
+        'p50_ms': pick(0.5),
+        'p95_ms': pick(0.95)
+    }
+
+def _lower_thread_priority():
+    """Make the calling thread the first to yield the CPU (Linux: per-thread nice)"""
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+    except (AttributeError, OSError):
+        pass
+
+class ShadowEvaluator:
+    """
+    Compares a candidate backend against the primary on sampled traffic
+
+    The candidate is any backend with classify(texts) and version (see
+    EmailClassifier.load_backend). Sampled inputs go into a bounded queue;
+    when it is full they are dropped rather than slowing the request.
+
+    Latency is compared like for like: the worker times the primary
+    backend's classify and the candidate's on the same text, one after the
+    other, so request overheads (prescreening, batching, other emails)
+    are not counted against the primary.
+    """
+
+    def __init__(self, classifier, sample_rate: float = None, queue_size: int = None,
+                 max_load: float = None, max_age_seconds: float = 300.0):
+        self.classifier = classifier
+        self.sample_rate = config.SHADOW_SAMPLE_RATE if sample_rate is None else sample_rate
+        self.max_load = max_load or config.SHADOW_MAX_LOAD
+        self.max_age_seconds = max_age_seconds
+
+        self.candidate = None
+        self.status = 'idle'
+        self.error = None
+        self._queue = queue.Queue(maxsize=queue_size or config.SHADOW_QUEUE_SIZE)
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._lock:
+            self.counters = {'sampled': 0, 'dropped': 0, 'expired': 0, 'compared': 0, 'agreed': 0, 'errors': 0}
+            self.confusion = {}
+            self.primary_latency = deque(maxlen=LATENCY_WINDOW)
+            self.candidate_latency = deque(maxlen=LATENCY_WINDOW)
+            self.started_at = time.time()
+
+    @property
+    def active(self) -> bool:
+        return self.candidate is not None and self.status == 'running'
+
+    def submit(self, content: str, subject: str, primary_result: Dict):
+        """Maybe copy a classified request to the shadow queue (never blocks)"""
+        if not self.active or random.random() >= self.sample_rate:
+            return
+        # Only model answers are a meaningful baseline
+        if primary_result.get('model_version') != self.classifier.model_version:
+            return
+
+        try:
+            self._queue.put_nowait((time.time(), content, subject, primary_result['label'], primary_result['model_version']))
+            with self._lock:
+                self.counters['sampled'] += 1
+        except queue.Full:
+            with self._lock:
+                self.counters['dropped'] += 1
+
+    def _has_spare_cpu(self) -> bool:
+        """Primary idle and the machine's load below max_load per CPU"""
+        if time.time() - self.classifier.last_used < 0.05:
+            return False
+        try:
+            return os.getloadavg()[0] / (os.cpu_count() or 1) < self.max_load
+        except OSError:
+            return True
+
+    def _evaluate(self, content: str, subject: str, primary_label: str, primary_version: str):
+        # Skip samples whose model was swapped out or unloaded since
+        primary = self.classifier.backend
+        text = self.classifier.preprocess_email_content(content, subject)
+        if primary is None or primary.version != primary_version or not text:
+            return
+
+        start = time.perf_counter()
+        primary.classify([text])
+        primary_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        candidate_label = self.candidate.classify([text])[0]['label']
+        candidate_ms = (time.perf_counter() - start) * 1000
+
+        with self._lock:
+            self.counters['compared'] += 1
+            self.counters['agreed'] += candidate_label == primary_label
+            row = self.confusion.setdefault(primary_label, {})
+            row[candidate_label] = row.get(candidate_label, 0) + 1
+            self.primary_latency.append(primary_ms)
+            self.candidate_latency.append(candidate_ms)
+
+    def _loop(self):
+        _lower_thread_priority()
+        while not self._stopping.is_set():
+            try:
+                queued_at, content, subject, primary_label, primary_version = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+            # Wait for spare CPU; stale samples are not worth the work
+            while not self._stopping.is_set() and not self._has_spare_cpu():
+                if time.time() - queued_at > self.max_age_seconds:
+                    break
+                time.sleep(0.2)
+            if time.time() - queued_at > self.max_age_seconds:
+                with self._lock:
+                    self.counters['expired'] += 1
+                continue
+            if self._stopping.is_set():
+                break
+
+            try:
+                self._evaluate(content, subject, primary_label, primary_version)
+            except Exception as e:
+                logger.error(f"Shadow evaluation failed: {str(e)}")
+                with self._lock:
+                    self.counters['errors'] += 1
+
+    def start(self, version: str, sample_rate: float = None) -> bool:
+        """
+        Load a candidate version in the background and start shadowing
+
+        Returns:
+            False if a candidate is already loading
+        """
+        if self.status == 'loading':
+            return False
+        self.stop()
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+        self.status = 'loading'
+        self.error = None
+
+        def target():
+            try:
+                self.candidate = self.classifier.load_backend(version)
+                self.reset_stats()
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._loop, name='shadow-eval', daemon=True)
+                self._thread.start()
+                self.status = 'running'
+                logger.info(f"👥 Shadowing {self.sample_rate:.0%} of /classify traffic with {version}")
+            except Exception as e:
+                logger.error(f"Failed to load shadow candidate {version}: {str(e)}")
+                self.candidate = None
+                self.status = 'failed'
+                self.error = str(e)
+
+        threading.Thread(target=target, name='shadow-loader', daemon=True).start()
+        return True
+
+    def stop(self):
+        """Stop shadowing and release the candidate"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(5)
+            self._thread = None
+        self.candidate = None
+        if self.status != 'loading':
+            self.status = 'idle'
+        while not self._queue.empty():
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+
+    def get_report(self) -> Dict:
+        """Agreement, per-label agreement, confusion matrix and latency comparison"""
+        with self._lock:
+            counters = dict(self.counters)
+            confusion = {label: dict(row) for label, row in self.confusion.items()}
+            primary = _percentiles(self.primary_latency)
+            candidate = _percentiles(self.candidate_latency)
+
+        per_label = {
+            label: {
+                'count': sum(row.values()),
+                'agreement': round(row.get(label, 0) / sum(row.values()), 4)
+            }
+            for label, row in confusion.items()
+        }
+        compared = counters['compared']
+        return {
+            'status': self.status,
+            'error': self.error,
+            'primary_version': self.classifier.model_version,
+            'candidate_version': self.candidate.version if self.candidate else None,
+            'sample_rate': self.sample_rate,
+            'queue_depth': self._queue.qsize(),
+            'since': self.started_at,
+            **counters,
+            'agreement_rate': round(counters['agreed'] / compared, 4) if compared else None,
+            'per_label': per_label,
+            'confusion': confusion,
+            'latency': {'primary': primary, 'candidate': candidate}
+        }
+
+# Global evaluator instance
+_shadow_instance = None
+
+def get_shadow_evaluator(classifier=None) -> Optional[ShadowEvaluator]:
+    """Get singleton shadow evaluator (classifier is required on first call)"""
+    global _shadow_instance
+    if _shadow_instance is None and classifier is not None:
+        _shadow_instance = ShadowEvaluator(classifier)
+    return _shadow_instance
@@ -0,0 +1,325 @@
+"""
+Spam pre-screen for Automail AI Server
+Bloom filters of confirmed spam content fingerprints and blocked sender
+domains. Emails that hit a filter are labelled Spam without running the
+classification model. The filters are rebuilt in the background from
+Spam corrections and imported lists, and swapped in atomically.
+"""
+import os
+import re
+import math
+import time
+import hashlib
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+from config.config import get_config
+from utils.corrections_log import CorrectionsLog, get_corrections_log
+from utils.sender_index import parse_sender
+
+config = get_config()
+logger = logging.getLogger(__name__)
+
+# Version tag recorded for results answered by the pre-screen
+SPAM_FILTER_MODEL_VERSION = 'spam-filter'
+
+# Imported list files in SPAM_LISTS_DIR, one entry per line
+DOMAINS_SUFFIX = '.domains'
+FINGERPRINTS_SUFFIX = '.fingerprints'
+
+LIST_NAME_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+def content_fingerprint(text: str) -> str:
+    """
+    Fingerprint of a preprocessed email text
+    Case, whitespace and digits (order numbers, tracking ids) are ignored
+    """
+    normalized = re.sub(r'\d+', '0', ' '.join(text.lower().split()))
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+def sender_keys(sender) -> List[str]:
+    """The sender's address, domain and parent domains, e.g. a@x.spam.example -> x.spam.example, spam.example"""
+    parsed = parse_sender(sender)
+    if parsed is None:
+        return []
+    address, domain = parsed
+    labels = domain.split('.')
+    return [address] + ['.'.join(labels[i:]) for i in range(len(labels) - 1)]
+
+def _normalize_list_entry(entry: str) -> str:
+    entry = entry.strip().lower()
+    for prefix in ('*.', '@'):
+        if entry.startswith(prefix):
+            entry = entry[len(prefix):]
+    return entry
+
+class BloomFilter:
+    """
+    Bit-array set membership with no false negatives
+
+    Sized for capacity items at error_rate false positives (about 29 bits
+    per item at 1e-6, so a million entries take 3.6 MB). Bit positions
+    come from double hashing of a 128-bit BLAKE2 digest.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(capacity, 1)
+        self.bits_count = max(64, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.hash_count = max(1, int(round(self.bits_count / capacity * math.log(2))))
+        self.bits = np.zeros((self.bits_count + 7) // 8, dtype=np.uint8)
+        self.count = 0
+
+    def _positions(self, items: List[str]) -> np.ndarray:
+        digests = np.frombuffer(
+            b''.join(hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest() for item in items),
+            dtype=np.uint64
+        ).reshape(-1, 2)
+        steps = np.arange(self.hash_count, dtype=np.uint64)
+        # uint64 arithmetic wraps, which is fine for hashing
+        return (digests[:, :1] + steps * digests[:, 1:]) % np.uint64(self.bits_count)
+
+    def add_many(self, items: List[str]):
+        if not items:
+            return
+        positions = self._positions(items).ravel()
+        np.bitwise_or.at(self.bits, positions >> np.uint64(3), (1 << (positions & np.uint64(7))).astype(np.uint8))
+        self.count += len(items)
+
+    def contains_many(self, items: List[str]) -> List[bool]:
+        if not items:
+            return []
+        positions = self._positions(items)
+        hits = self.bits[positions >> np.uint64(3)] & (1 << (positions & np.uint64(7))).astype(np.uint8)
+        return hits.all(axis=1).tolist()
+
+    @classmethod
+    def build(cls, items: Iterable[str], error_rate: float) -> 'BloomFilter':
+        items = list(dict.fromkeys(items))
+        # Small sets get the bits of 1024 entries, or their hash count would fill the array
+        bloom = cls(max(len(items), 1024), error_rate)
+        for start in range(0, len(items), 100000):
+            bloom.add_many(items[start:start + 100000])
+        return bloom
+
+    def get_info(self) -> Dict:
+        return {'entries': self.count, 'bytes': int(self.bits.nbytes), 'hashes': self.hash_count}
+
+class SpamFilters:
+    """One immutable generation of filters (replaced as a whole)"""
+
+    def __init__(self, fingerprints: BloomFilter, senders: BloomFilter, sources: tuple):
+        self.fingerprints = fingerprints
+        self.senders = senders
+        self.sources = sources
+        self.built_at = time.time()
+
+class SpamPrescreen:
+    """
+    Labels known spam before inference
+
+    Filters hold the fingerprints of emails whose latest correction is
+    Spam, plus the entries of imported lists: <name>.domains files (sender
+    domains or addresses) and <name>.fingerprints files (content
+    fingerprints) in SPAM_LISTS_DIR. A background thread rebuilds them
+    when a source changes; requests keep using the previous generation
+    until the new one is assigned.
+    """
+
+    def __init__(self, classifier, log: CorrectionsLog = None, lists_dir: str = None, error_rate: float = None):
+        self.classifier = classifier
+        self.log = log or get_corrections_log()
+        self.lists_dir = lists_dir or config.SPAM_LISTS_DIR
+        self.error_rate = error_rate or config.SPAM_FILTER_ERROR_RATE
+        self.filters = None
+        self._rebuild_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self.stats = {'checks': 0, 'fingerprint_hits': 0, 'sender_hits': 0, 'rebuilds': 0, 'last_rebuild': None}
+        os.makedirs(self.lists_dir, exist_ok=True)
+
+    def _list_files(self) -> List[str]:
+        return sorted(
+            name for name in os.listdir(self.lists_dir)
+            if name.endswith(DOMAINS_SUFFIX) or name.endswith(FINGERPRINTS_SUFFIX)
+        )
+
+    def _sources(self) -> tuple:
+        """What the filters are built from; a rebuild is due when it changes"""
+        files = []
+        for name in self._list_files():
+            stat = os.stat(os.path.join(self.lists_dir, name))
+            files.append((name, stat.st_mtime, stat.st_size))
+        return self.log.last_seq, tuple(files)
+
+    def _read_list(self, name: str) -> Iterable[str]:
+        with open(os.path.join(self.lists_dir, name)) as f:
+            for line in f:
+                entry = _normalize_list_entry(line.split('#', 1)[0])
+                if entry:
+                    yield entry
+
+    def rebuild(self) -> bool:
+        """
+        Build new filters from the current sources and swap them in
+
+        Returns:
+            False if the sources have not changed since the last build
+        """
+        with self._rebuild_lock:
+            sources = self._sources()
+            if self.filters is not None and self.filters.sources == sources:
+                return False
+
+            started = time.perf_counter()
+            fingerprints = [
+                content_fingerprint(self.classifier.preprocess_email_content(record['content'], record['subject']))
+                for record in self.log.latest() if record['label'] == 'Spam'
+            ]
+            confirmed = len(fingerprints)
+            senders = []
+            for name, _, _ in sources[1]:
+                target = senders if name.endswith(DOMAINS_SUFFIX) else fingerprints
+                target.extend(self._read_list(name))
+
+            self.filters = SpamFilters(
+                BloomFilter.build(fingerprints, self.error_rate),
+                BloomFilter.build(senders, self.error_rate),
+                sources
+            )
+            self.stats['rebuilds'] += 1
+            self.stats['last_rebuild'] = {
+                'confirmed_spam': confirmed,
+                'fingerprints': self.filters.fingerprints.count,
+                'senders': self.filters.senders.count,
+                'ms': round((time.perf_counter() - started) * 1000, 1),
+                'at': time.time()
+            }
+        logger.info(f"🛡️ Rebuilt spam filters: {self.filters.fingerprints.count} fingerprints, "
+                    f"{self.filters.senders.count} senders")
+        return True
+
+    def start(self):
+        """Build the filters and keep them current in a background thread (once per process)"""
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._loop, name='spam-filter', daemon=True)
+        self._thread.start()
+
+    def request_rebuild(self):
+        """Rebuild soon instead of at the next interval"""
+        self._wake.set()
+
+    def _loop(self):
+        while True:
+            try:
+                self.rebuild()
+            except Exception as e:
+                logger.error(f"Spam filter rebuild failed: {str(e)}")
+            self._wake.wait(config.SPAM_FILTER_REBUILD_SECONDS)
+            self._wake.clear()
+
+    def check(self, emails: List[Dict]) -> List[Optional[Dict]]:
+        """
+        Spam results for emails that hit a filter
+
+        Args:
+            emails: Dicts with 'content' and optional 'subject' and 'sender'
+
+        Returns:
+            One result dict or None per email
+        """
+        if self._thread is None:
+            self.start()
+        filters = self.filters
+        if filters is None:
+            return [None] * len(emails)
+
+        keys = [sender_keys(email.get('sender')) for email in emails]
+        flat = [key for email_keys in keys for key in email_keys]
+        blocked = iter(filters.senders.contains_many(flat) if filters.senders.count else [False] * len(flat))
+        texts = [self.classifier.preprocess_email_content(email.get('content', ''), email.get('subject', ''))
+                 for email in emails]
+        known = filters.fingerprints.contains_many([content_fingerprint(text) for text in texts]) \
+            if filters.fingerprints.count else [False] * len(emails)
+
+        results = []
+        for email_keys, text, fingerprint_hit in zip(keys, texts, known):
+            hits = [key for key in email_keys if next(blocked)]
+            if hits:
+                results.append(self._result(f"Sender on a spam blocklist ({hits[-1]})"))
+                self.stats['sender_hits'] += 1
+            elif fingerprint_hit and text:
+                results.append(self._result('Matches a confirmed spam email'))
+                self.stats['fingerprint_hits'] += 1
+            else:
+                results.append(None)
+        self.stats['checks'] += len(emails)
+        return results
+
+    @staticmethod
+    def _result(reasoning: str) -> Dict:
+        return {
+            'label': 'Spam',
+            'confidence': 0.99,
+            'reasoning': reasoning,
+            'model_version': SPAM_FILTER_MODEL_VERSION
+        }
+
+    def import_list(self, name: str, domains: List[str] = None, fingerprints: List[str] = None) -> Dict:
+        """
+        Store an imported list and schedule a rebuild
+
+        Args:
+            name: List name; an existing list of that name is replaced
+            domains: Sender domains or addresses
+            fingerprints: content_fingerprint values
+
+        Returns:
+            Number of entries stored per kind
+
+        Raises:
+            ValueError: for an invalid name or entries
+        """
+        if not isinstance(name, str) or not LIST_NAME_PATTERN.match(name):
+            raise ValueError('name must be 1-64 letters, digits, dashes or underscores')
+
+        counts = {}
+        for suffix, entries in ((DOMAINS_SUFFIX, domains), (FINGERPRINTS_SUFFIX, fingerprints)):
+            if entries is None:
+                continue
+            if not isinstance(entries, list) or not all(isinstance(entry, str) for entry in entries):
+                raise ValueError(f"{suffix[1:]} must be an array of strings")
+            entries = [entry for entry in map(_normalize_list_entry, entries) if entry and '\n' not in entry]
+            path = os.path.join(self.lists_dir, name + suffix)
+            with open(path + '.tmp', 'w') as f:
+                f.write(''.join(entry + '\n' for entry in entries))
+            os.replace(path + '.tmp', path)
+            counts[suffix[1:]] = len(entries)
+
+        self.request_rebuild()
+        logger.info(f"🛡️ Imported spam list {name}: {counts}")
+        return counts
+
+    def get_status(self) -> Dict:
+        filters = self.filters
+        return {
+            'enabled': config.SPAM_FILTER_ENABLED,
+            'lists': self._list_files(),
+            'fingerprints': filters.fingerprints.get_info() if filters else None,
+            'senders': filters.senders.get_info() if filters else None,
+            'built_at': filters.built_at if filters else None,
+            **self.stats
+        }
+
+# Global spam pre-screen instance
+_prescreen_instance = None
+
+def get_spam_prescreen(classifier=None) -> Optional[SpamPrescreen]:
+    """Get singleton spam pre-screen (classifier is required on first call)"""
+    global _prescreen_instance
+    if _prescreen_instance is None and classifier is not None:
+        _prescreen_instance = SpamPrescreen(classifier)
+    return _prescreen_instance
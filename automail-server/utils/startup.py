@@ -0,0 +1,54 @@
+"""
+Startup timing for Automail AI Server
+Records how long each import group and startup milestone takes so
+regressions in cold-start time are visible from /health
+"""
+import os
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict
+
+def _process_start_time() -> float:
+    """Wall-clock time the process started (Linux), or now as a fallback"""
+    try:
+        with open('/proc/self/stat') as f:
+            # Field 22 is the start time in clock ticks after boot; the command
+            # name (field 2) may contain spaces, so split after its closing paren
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - uptime + start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return time.time()
+
+PROCESS_START = _process_start_time()
+
+_lock = threading.Lock()
+_imports = {}
+_milestones = {}
+
+@contextmanager
+def track_import(name: str):
+    """Time an import group, e.g. `with track_import('flask'): import flask`"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        with _lock:
+            _imports[name] = _imports.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+def mark(milestone: str):
+    """Record the first time a startup milestone is reached"""
+    with _lock:
+        _milestones.setdefault(milestone, (time.time() - PROCESS_START) * 1000)
+
+def get_startup_report() -> Dict:
+    """Import durations and milestone offsets from process start, in milliseconds"""
+    with _lock:
+        return {
+            'process_start': PROCESS_START,
+            'uptime_ms': round((time.time() - PROCESS_START) * 1000, 1),
+            'imports_ms': {name: round(ms, 1) for name, ms in sorted(_imports.items(), key=lambda item: -item[1])},
+            'milestones_ms': {name: round(ms, 1) for name, ms in sorted(_milestones.items(), key=lambda item: item[1])}
+        }
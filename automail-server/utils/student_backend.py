@@ -0,0 +1,56 @@
+"""
+Distilled student backend for Automail AI Server
+Serves a small encoder with a 16-way classification head trained on the
+zero-shot model's label distributions (see distill_student.py): one
+forward pass per email instead of one per label hypothesis
+"""
+import logging
+from typing import Dict, List
+from config.config import get_config
+from utils.classifier import LABEL_MAPPING, ModelBackend
+
+config = get_config()
+logger = logging.getLogger(__name__)
+
+# Head order of students trained by distill_student.py
+STUDENT_LABELS = list(LABEL_MAPPING)
+
+def student_label_config() -> Dict:
+    """from_pretrained arguments that give a base encoder the student head"""
+    return {
+        'num_labels': len(STUDENT_LABELS),
+        'id2label': dict(enumerate(STUDENT_LABELS)),
+        'label2id': {label: idx for idx, label in enumerate(STUDENT_LABELS)}
+    }
+
+class StudentBackend(ModelBackend):
+    """
+    ModelBackend for single-pass sequence classifiers
+
+    The head's labels are the zero-shot labels, so postprocessing (label
+    mapping and the low-confidence Review rule) is shared with the teacher.
+    """
+
+    kind = 'student'
+
+    def __init__(self, version: str, source: str, model, tokenizer, device):
+        super().__init__(version, source, model, tokenizer, device)
+        id2label = {int(idx): label for idx, label in model.config.id2label.items()}
+        self.classification_labels = [id2label[idx] for idx in range(len(id2label))]
+        unknown = [label for label in self.classification_labels if label not in LABEL_MAPPING]
+        if unknown:
+            raise ValueError(f"{version} is not a distilled student (unknown labels: {unknown[:3]})")
+        self.hypotheses = []
+
+    def tokenize(self, texts: List[str]):
+        """Tokenisation stage: one sequence per text, no hypotheses"""
+        return self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=config.STUDENT_MAX_LENGTH,
+            return_tensors='pt'
+        )
+
+    def _scores(self, torch, logits):
+        return torch.softmax(logits.float(), dim=-1)
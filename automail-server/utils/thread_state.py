@@ -0,0 +1,216 @@
+"""
+Thread state for Automail AI Server
+Replies in a thread rarely change its label. The last label of each
+thread is kept with a SimHash fingerprint of the email it came from, and a
+new message that stays close to that fingerprint reuses the label instead
+of running the classification model.
+"""
+import re
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import numpy as np
+from config.config import get_config
+from utils.classifier import RULE_BASED_MODEL_VERSION
+
+config = get_config()
+logger = logging.getLogger(__name__)
+
+# Version tag recorded for results answered from thread state
+THREAD_MODEL_VERSION = 'thread-state'
+
+# Replies with fewer content words than this ("Thanks!", "See you then") never diverge from their thread
+SHORT_REPLY_WORDS = 5
+
+# Bits per fingerprint; unrelated texts differ in about half of them
+FINGERPRINT_BITS = 128
+
+# Words too common to say anything about what a message is about
+STOP_WORDS = frozenset(
+    'the and for you your are was were this that with from have has had will would could should can our not '
+    'but all any about into out over then than them they their there what when which who how its just also '
+    'been being here more some such only very'.split()
+)
+
+WORD_PATTERN = re.compile(r'[a-z]+')
+
+def content_words(text: str) -> List[str]:
+    """Distinct words of three or more letters, without stop words and numbers"""
+    return sorted({word for word in WORD_PATTERN.findall(text.lower()) if len(word) > 2 and word not in STOP_WORDS})
+
+def simhash(words: List[str]) -> int:
+    """
+    SimHash of a word list: every word votes on each bit with its hash
+    Texts sharing most of their words differ in few bits
+    """
+    if not words:
+        return 0
+    size = FINGERPRINT_BITS // 8
+    digests = np.frombuffer(
+        b''.join(hashlib.blake2b(word.encode('utf-8'), digest_size=size).digest() for word in words),
+        dtype=np.uint8
+    ).reshape(len(words), size)
+    votes = (np.unpackbits(digests, axis=1, bitorder='little').astype(np.int32) * 2 - 1).sum(axis=0)
+    return int.from_bytes(np.packbits(votes > 0, bitorder='little').tobytes(), 'little')
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+def thread_id_of(item: Dict) -> Optional[str]:
+    thread_id = item.get('thread_id')
+    return thread_id if isinstance(thread_id, str) and thread_id else None
+
+class ThreadStateStore:
+    """
+    Last label per (API key, thread) in an LRU bounded by capacity
+
+    Entries are ordered by their last use, so the oldest sit at the front:
+    entries idle for THREAD_STATE_TTL_DAYS are dropped from there, and the
+    least recently used one goes when the store is full. A message reuses
+    its thread's label when the thread was labelled with at least
+    THREAD_MIN_CONFIDENCE and the message is a short reply or within
+    THREAD_MAX_DISTANCE bits of the thread's fingerprint. After
+    THREAD_MAX_REUSE reused messages the next one is classified again.
+    """
+
+    def __init__(self, classifier, capacity: int = None, ttl_days: float = None, max_distance: int = None,
+                 min_confidence: float = None, max_reuse: int = None):
+        self.classifier = classifier
+        self.capacity = capacity or config.THREAD_STATE_CAPACITY
+        self.ttl = (ttl_days or config.THREAD_STATE_TTL_DAYS) * 86400
+        self.max_distance = max_distance if max_distance is not None else config.THREAD_MAX_DISTANCE
+        self.min_confidence = min_confidence if min_confidence is not None else config.THREAD_MIN_CONFIDENCE
+        self.max_reuse = max_reuse if max_reuse is not None else config.THREAD_MAX_REUSE
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'lookups': 0, 'hits': 0, 'diverged': 0, 'refreshed': 0, 'updates': 0, 'evicted': 0, 'expired': 0}
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def _fingerprint(self, email: Dict):
+        """(fingerprint, content word count) of an email's preprocessed body"""
+        # The subject is shared by the whole thread, so only the body can diverge
+        words = content_words(self.classifier.preprocess_email_content(email.get('content', '')))
+        return simhash(words), len(words)
+
+    def _expire(self, now: float):
+        """Drop entries idle for longer than the TTL (caller holds the lock)"""
+        while self._states:
+            key, state = next(iter(self._states.items()))
+            if now - state['updated'] <= self.ttl:
+                break
+            del self._states[key]
+            self.stats['expired'] += 1
+
+    def _put(self, key: tuple, state: Dict, now: float):
+        """Insert or refresh an entry and evict the least recently used (caller holds the lock)"""
+        self._states.pop(key, None)
+        self._states[key] = state
+        self._expire(now)
+        while len(self._states) > self.capacity:
+            self._states.popitem(last=False)
+            self.stats['evicted'] += 1
+
+    def check(self, api_key_id: str, emails: List[Dict], now: float = None) -> List[Optional[Dict]]:
+        """
+        Thread labels for emails that continue a known thread without diverging
+
+        Args:
+            emails: Dicts with 'content' and optional 'subject' and 'thread_id'
+
+        Returns:
+            One result dict or None per email
+        """
+        now = now or time.time()
+        results = []
+        for email in emails:
+            thread_id = thread_id_of(email)
+            result = None
+            if thread_id is not None:
+                result = self._lookup((api_key_id, thread_id), email, now)
+            results.append(result)
+        return results
+
+    def _lookup(self, key: tuple, email: Dict, now: float) -> Optional[Dict]:
+        fingerprint, words = self._fingerprint(email)
+        with self._lock:
+            self.stats['lookups'] += 1
+            self._expire(now)
+            state = self._states.get(key)
+            if state is None or state['confidence'] < self.min_confidence:
+                return None
+            if state['reused'] >= self.max_reuse:
+                self.stats['refreshed'] += 1
+                return None
+
+            distance = hamming(fingerprint, state['fingerprint'])
+            if words >= SHORT_REPLY_WORDS and distance > self.max_distance:
+                self.stats['diverged'] += 1
+                return None
+
+            state['reused'] += 1
+            state['updated'] = now
+            self._states.move_to_end(key)
+            self.stats['hits'] += 1
+            return {
+                'label': state['label'],
+                'confidence': state['confidence'],
+                'reasoning': f"Reply in a thread labelled {state['label']}",
+                'model_version': THREAD_MODEL_VERSION
+            }
+
+    def update(self, api_key_id: str, email: Dict, label: str, confidence: float, now: float = None) -> bool:
+        """
+        Make label the state of the email's thread, fingerprinted from this email
+
+        Returns:
+            False if the email has no thread_id or content, or no label
+        """
+        thread_id = thread_id_of(email)
+        if thread_id is None or not isinstance(label, str) or not label or not isinstance(email.get('content'), str):
+            return False
+
+        fingerprint, _ = self._fingerprint(email)
+        now = now or time.time()
+        with self._lock:
+            self._put((api_key_id, thread_id), {
+                'label': label,
+                'confidence': float(confidence or 0.0),
+                'fingerprint': fingerprint,
+                'reused': 0,
+                'updated': now
+            }, now)
+            self.stats['updates'] += 1
+        return True
+
+    def update_from_results(self, api_key_id: str, emails: List[Dict], results: List[Dict]) -> int:
+        """Record classified thread messages; answers from the thread state itself or the rules are skipped"""
+        updated = 0
+        for email, result in zip(emails, results):
+            if not result or result.get('model_version') in (THREAD_MODEL_VERSION, RULE_BASED_MODEL_VERSION):
+                continue
+            updated += self.update(api_key_id, email, result.get('label'), result.get('confidence'))
+        return updated
+
+    def get_status(self) -> Dict:
+        with self._lock:
+            return {
+                'enabled': config.THREAD_STATE_ENABLED,
+                'threads': len(self._states),
+                'capacity': self.capacity,
+                **self.stats
+            }
+
+# Global thread state instance
+_thread_state_instance = None
+
+def get_thread_state(classifier=None) -> Optional[ThreadStateStore]:
+    """Get singleton thread state store (classifier is required on first call)"""
+    global _thread_state_instance
+    if _thread_state_instance is None and classifier is not None:
+        _thread_state_instance = ThreadStateStore(classifier)
+    return _thread_state_instance
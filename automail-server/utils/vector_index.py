@@ -0,0 +1,274 @@
+"""
+On-disk vector index for Automail AI Server
+Append-only cosine-similarity search over unit vectors: exact (brute
+force) while the index is small, inverted-file (IVF) once it grows.
+Vectors are memory-mapped, so opening an index costs almost nothing.
+"""
+import os
+import json
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from config.config import get_config
+
+config = get_config()
+logger = logging.getLogger(__name__)
+
+INFO_FILE = 'index.json'
+VECTORS_FILE = 'vectors.f32'
+META_FILE = 'meta.jsonl'
+IVF_FILE = 'ivf.npz'
+
+class VectorIndex:
+    """
+    Append-only index of unit vectors with one metadata dict per row
+
+    Files in the index directory:
+        index.json   vector dimension
+        vectors.f32  raw float32 rows, memory-mapped for search
+        meta.jsonl   one JSON object per row; a row exists once its line does
+        ivf.npz      IVF centroids and row assignments (large indexes only)
+
+    Brute force scores every row with one matrix multiply. Past
+    ivf_threshold rows, rows are clustered into about sqrt(n) lists and a
+    query only scores the rows of its nprobe closest lists. New rows join
+    their closest list; the clustering is retrained in a background thread
+    when the index doubles, and searches use the previous lists (or brute
+    force) until it is done. Lists are arrays that are replaced, never
+    changed, so a search reads them without copying.
+    """
+
+    def __init__(self, path: str, dim: int = None, ivf_threshold: int = None, nprobe: int = None):
+        self.path = path
+        self.ivf_threshold = ivf_threshold or config.KNN_IVF_THRESHOLD
+        self.nprobe = nprobe or config.KNN_NPROBE
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+        info_path = os.path.join(path, INFO_FILE)
+        if os.path.exists(info_path):
+            with open(info_path) as f:
+                self.dim = json.load(f)['dim']
+        elif dim:
+            self.dim = dim
+            with open(info_path, 'w') as f:
+                json.dump({'dim': dim}, f)
+        else:
+            raise ValueError(f"{path} is not an index and no dimension was given")
+
+        # Rows whose vectors were written but whose metadata was not are dropped
+        self.meta = []
+        meta_path = os.path.join(path, META_FILE)
+        if os.path.exists(meta_path):
+            valid_bytes = 0
+            with open(meta_path, 'rb') as f:
+                for line in f:
+                    try:
+                        if not line.endswith(b'\n'):
+                            raise ValueError("torn write")
+                        self.meta.append(json.loads(line))
+                    except ValueError:
+                        break
+                    valid_bytes += len(line)
+            # Drop a partially written last line so appends start cleanly
+            if valid_bytes < os.path.getsize(meta_path):
+                os.truncate(meta_path, valid_bytes)
+        vectors_path = os.path.join(path, VECTORS_FILE)
+        stored_rows = os.path.getsize(vectors_path) // self._row_bytes if os.path.exists(vectors_path) else 0
+        del self.meta[stored_rows:]
+
+        self._vectors = self._map()
+        self._centroids = None
+        self._lists = None
+        self._trained_rows = 0
+        self._training = None
+        self._load_ivf()
+
+    @property
+    def _row_bytes(self) -> int:
+        return self.dim * 4
+
+    def __len__(self) -> int:
+        return len(self.meta)
+
+    def _map(self) -> Optional[np.ndarray]:
+        if not self.meta:
+            return None
+        return np.memmap(os.path.join(self.path, VECTORS_FILE), dtype=np.float32, mode='r',
+                         shape=(len(self.meta), self.dim))
+
+    def _load_ivf(self):
+        try:
+            ivf = np.load(os.path.join(self.path, IVF_FILE))
+        except (OSError, ValueError):
+            return
+        assignments = ivf['assignments']
+        if len(assignments) > len(self):
+            return  # written for rows that were dropped; retrain below
+        self._centroids = ivf['centroids']
+        self._trained_rows = int(ivf['trained_rows'])
+        lists = [np.flatnonzero(assignments == c) for c in range(len(self._centroids))]
+        # Rows added after the last save join their closest list
+        self._lists = self._assigned(self._centroids, lists, np.arange(len(assignments), len(self)))
+
+    @staticmethod
+    def _save_ivf(path: str, centroids: np.ndarray, lists: List[np.ndarray], trained_rows: int):
+        assignments = np.empty(sum(len(rows) for rows in lists), dtype=np.int32)
+        for c, rows in enumerate(lists):
+            assignments[rows] = c
+        tmp_path = os.path.join(path, IVF_FILE + '.tmp.npz')
+        np.savez(tmp_path, centroids=centroids, assignments=assignments, trained_rows=trained_rows)
+        os.replace(tmp_path, os.path.join(path, IVF_FILE))
+
+    def _assigned(self, centroids: np.ndarray, lists: List[np.ndarray], rows: np.ndarray) -> List[np.ndarray]:
+        """New lists with rows added to the list of their closest centroid"""
+        lists = list(lists)
+        for start in range(0, len(rows), 4096):
+            chunk = rows[start:start + 4096]
+            closest = (np.asarray(self._vectors[chunk]) @ centroids.T).argmax(axis=1)
+            for c in np.unique(closest):
+                lists[c] = np.concatenate([lists[c], chunk[closest == c]])
+        return lists
+
+    def _train_ivf(self, rows: int, iterations: int = 10) -> Tuple[np.ndarray, List[np.ndarray]]:
+        """Spherical k-means on a sample of the first rows; returns centroids and lists"""
+        n_lists = max(2, int(np.sqrt(rows)))
+        rng = np.random.default_rng(rows)
+        sample = np.asarray(self._vectors[np.sort(rng.choice(rows, min(rows, n_lists * 64), replace=False))])
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)]
+        for _ in range(iterations):
+            closest = (sample @ centroids.T).argmax(axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, closest, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # Empty clusters keep their previous centroid
+            centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+
+        centroids = centroids.astype(np.float32)
+        empty = [np.empty(0, dtype=np.int64) for _ in range(n_lists)]
+        return centroids, self._assigned(centroids, empty, np.arange(rows))
+
+    def _train_in_background(self):
+        """Recluster all rows in a thread unless one is running (caller holds the lock)"""
+        if self._training is not None and self._training.is_alive():
+            return
+        rows = len(self)
+
+        def target():
+            try:
+                centroids, lists = self._train_ivf(rows)
+                with self._lock:
+                    # Rows added while training join their closest list
+                    lists = self._assigned(centroids, lists, np.arange(rows, len(self)))
+                    self._centroids, self._lists, self._trained_rows = centroids, lists, rows
+                self._save_ivf(self.path, centroids, lists, rows)
+                logger.info(f"🗂️ Built {len(centroids)}-list IVF index over {rows} vectors in {self.path}")
+            except Exception as e:
+                logger.error(f"IVF training failed for {self.path}: {str(e)}")
+
+        self._training = threading.Thread(target=target, name='vector-index-training', daemon=True)
+        self._training.start()
+
+    def wait_for_training(self, timeout: float = None):
+        """Block until a background reclustering is done"""
+        training = self._training
+        if training is not None:
+            training.join(timeout)
+
+    def add(self, vectors: np.ndarray, metas: List[Dict]):
+        """
+        Append unit vectors and their metadata
+
+        Args:
+            vectors: (rows, dim) array
+            metas: One JSON-serialisable dict per row
+        """
+        if len(vectors) != len(metas):
+            raise ValueError("Each vector needs one metadata entry")
+        if not metas:
+            return
+
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        with self._lock:
+            first_row = len(self)
+            vectors_path = os.path.join(self.path, VECTORS_FILE)
+            with open(vectors_path, 'ab') as f:
+                f.truncate(first_row * self._row_bytes)
+                f.write(vectors.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            with open(os.path.join(self.path, META_FILE), 'a') as f:
+                for meta in metas:
+                    f.write(json.dumps(meta) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+            self.meta.extend(metas)
+            self._vectors = self._map()
+
+            # New rows are not saved to the IVF file; reopening assigns them again
+            if self._centroids is not None:
+                self._lists = self._assigned(self._centroids, self._lists, np.arange(first_row, len(self)))
+            if len(self) >= self.ivf_threshold and len(self) >= 2 * self._trained_rows:
+                self._train_in_background()
+
+    def search(self, queries: np.ndarray, k: int = 5) -> List[List[Tuple[float, Dict]]]:
+        """
+        Nearest rows by cosine similarity
+
+        Args:
+            queries: (queries, dim) unit vectors
+            k: Neighbours per query
+
+        Returns:
+            Per query, up to k (similarity, metadata) pairs, most similar first
+        """
+        # meta is only appended to, and rows past the snapshot of vectors are never read
+        with self._lock:
+            vectors, meta = self._vectors, self.meta
+            centroids, lists = self._centroids, self._lists
+
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        if vectors is None:
+            return [[] for _ in queries]
+
+        results = []
+        if centroids is None:
+            similarities = queries @ vectors.T
+            for row in similarities:
+                results.append(self._top(row, np.arange(len(row)), k, meta))
+            return results
+
+        probes = np.argsort(-(queries @ centroids.T), axis=1)[:, :self.nprobe]
+        for query, probe in zip(queries, probes):
+            candidates = np.concatenate([lists[c] for c in probe])
+            results.append(self._top(vectors[candidates] @ query, candidates, k, meta))
+        return results
+
+    def sample(self, count: int, seed: int = None) -> Tuple[np.ndarray, List[Dict]]:
+        """Up to count random rows, e.g. to replay old examples during an online update"""
+        with self._lock:
+            vectors, meta = self._vectors, self.meta
+        if vectors is None:
+            return np.zeros((0, self.dim), dtype=np.float32), []
+        rows = np.sort(np.random.default_rng(seed).choice(len(meta), min(count, len(meta)), replace=False))
+        return np.asarray(vectors[rows]), [meta[row] for row in rows]
+
+    @staticmethod
+    def _top(similarities: np.ndarray, rows: np.ndarray, k: int, meta: List[Dict]) -> List[Tuple[float, Dict]]:
+        if len(similarities) > k:
+            best = np.argpartition(-similarities, k)[:k]
+        else:
+            best = np.arange(len(similarities))
+        best = best[np.argsort(-similarities[best])]
+        return [(float(similarities[i]), meta[rows[i]]) for i in best]
+
+    def get_info(self) -> Dict:
+        return {
+            'rows': len(self),
+            'dim': self.dim,
+            'mode': 'ivf' if self._centroids is not None else 'brute-force',
+            'lists': len(self._centroids) if self._centroids is not None else 0,
+            'training': self._training is not None and self._training.is_alive()
+        }